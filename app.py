@@ -1,31 +1,18 @@
 # app.py
 
 import os
+import sys
+import json
+import time
 import logging
-from flask import Flask, request, jsonify
 from dotenv import load_dotenv
-from zoom_utils import (
-    validate_zoom_webhook,
-    download_recording
-)
-from slack_utils import get_all_public_channels, ensure_default_channel_exists, join_slack_channel, post_to_slack
-from openai_utils import (
-    transcribe_audio,
-    generate_summary,
-    determine_slack_channel
-)
-import json
-
-# Define the default Slack channel name
-DEFAULT_CHANNEL_NAME = "bot-lost-meeting-recordings"
 
-# Load environment variables from .env file only if not on Heroku
+# Load environment variables from .env file only if not on Heroku. This runs before the
+# project modules are imported, since they read their settings at import time.
 if os.getenv('DYNO') is None:
     load_dotenv()
 
-# Configure logging to stdout
-import sys
-
+# Configure logging to stdout, once for the whole app
 LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
 logging.basicConfig(
     level=LOG_LEVEL,
@@ -36,19 +23,129 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Checked up front so a misconfigured dyno fails at boot; the clients are built lazily
+REQUIRED_ENVIRONMENT = (
+    'ZOOM_WEBHOOK_SECRET_TOKEN',
+    'ZOOM_CLIENT_ID',
+    'ZOOM_CLIENT_SECRET',
+    'OPENAI_API_KEY',
+    'SLACK_BOT_TOKEN'
+)
+missing_environment = [name for name in REQUIRED_ENVIRONMENT if not os.getenv(name)]
+if missing_environment:
+    logger.error(f"Missing environment variables: {', '.join(missing_environment)}.")
+    raise EnvironmentError(f"{', '.join(missing_environment)} must be set.")
+
+from flask import Flask, Response, request, jsonify
+from zoom_utils import validate_zoom_webhook, build_url_validation_response, select_recording_segments, get_valid_zoom_access_token
+from pipeline import process_recording, zoom_transcript_delay
+from slack_utils import channel_directory
+from slack_sdk.signature import SignatureVerifier
+from job_queue import JobQueue
+from dedup_store import DedupStore, recording_event_key
+from job_store import JobStore
+from scratch_space import scratch_space
+import metrics
+
 app = Flask(__name__)
 
 ZOOM_WEBHOOK_SECRET_TOKEN = os.getenv('ZOOM_WEBHOOK_SECRET_TOKEN')
 
-if not ZOOM_WEBHOOK_SECRET_TOKEN:
-    logger.error("ZOOM_WEBHOOK_SECRET_TOKEN is not set in environment variables.")
-    raise EnvironmentError("ZOOM_WEBHOOK_SECRET_TOKEN is required.")
+# Events that deliver a meeting's recording files. Accounts with cloud transcription
+# also get recording.transcript_completed once Zoom's transcript is ready.
+RECORDING_EVENTS = ('recording.completed', 'recording.transcript_completed')
+
+# Optional: lets Slack channel events update the cached channel directory
+SLACK_SIGNING_SECRET = os.getenv('SLACK_SIGNING_SECRET')
+slack_signature_verifier = SignatureVerifier(SLACK_SIGNING_SECRET) if SLACK_SIGNING_SECRET else None
+
+# Recently accepted recording events, used to drop Zoom redeliveries
+processed_events = DedupStore()
+
+# Durable per-stage checkpoints, so retried and interrupted jobs skip finished work
+job_store = JobStore()
+
+# Delay before a failed job is retried, doubled for each later attempt
+JOB_RETRY_DELAY_SECONDS = float(os.getenv('JOB_RETRY_DELAY_SECONDS', '60'))
+
+def run_recording_job(record):
+    """
+    Runs the pipeline for a queued job record and checkpoints its outcome. A
+    failed job is requeued with exponential backoff from its first incomplete
+    stage until it has used JOB_MAX_ATTEMPTS, since Zoom does not redeliver an
+    event that was acknowledged. After the last attempt the dedup key is
+    forgotten, so a later redelivery from Zoom can still retry it. A job waiting
+    for Zoom's transcript is requeued until it is ready instead of holding a worker.
+    """
+    try:
+        delay = zoom_transcript_delay(record.job, record)
+    except Exception as e:
+        logger.exception(f"Failed to check for Zoom's transcript; continuing without it: {e}")
+        delay = 0
+    if delay:
+        job_queue.submit(record, delay=delay)
+        return
+
+    success = False
+    error = None
+    try:
+        if record.resumed:
+            # The webhook's download token may have expired while the job was interrupted
+            record.job['download_token'] = get_valid_zoom_access_token()
+        success = process_recording(record.job, record)
+    except Exception as e:
+        error = str(e)
+        raise
+    finally:
+        retry = None if success else job_store.retry(record, error)
+        if retry is not None:
+            job_queue.submit(retry, delay=JOB_RETRY_DELAY_SECONDS * 2 ** (record.attempts - 1))
+        else:
+            job_store.finish(record, success, error)
+            if not success:
+                processed_events.discard(record.event_key)
+
+def resume_interrupted_jobs():
+    """
+    Deletes expired job records and stale scratch files, and requeues jobs that
+    were interrupted, e.g. by a restart, in this worker process.
+    """
+    scratch_space.sweep_stale()
+    job_store.collect_garbage()
+    for record in job_store.claim_stale():
+        processed_events.add_if_absent(record.event_key)
+        if not job_queue.submit(record):
+            job_store.finish(record, False, "Job queue is full.")
+
+# Background workers that run the recording pipeline outside the request
+job_queue = JobQueue(run_recording_job, on_start=resume_interrupted_jobs)
+
+def warm_up():
+    """
+    Loads the slow imports and the read-only caches ahead of the first webhook.
+
+    Under gunicorn --preload this runs once in the master, so every worker starts
+    with them already in memory, shared copy-on-write. It creates no clients,
+    connections or threads, none of which would survive the fork.
+    """
+    import openai_utils
+
+    openai_utils.get_channel_index()
+    openai_utils.count_tokens("")
+    import openai  # noqa: F401
+    import httpx  # noqa: F401
+
+@app.before_request
+def start_job_workers():
+    # Starts the workers, and resumes interrupted jobs, once per worker process
+    job_queue.start()
+    metrics.start_runtime_publisher()
 
 @app.route('/zoom-webhook', methods=['POST'])
 def zoom_webhook():
     try:
-        data = request.get_json()
-        if not data:
+        payload = request.get_data()
+        if not payload:
             logger.warning("Invalid request: No data provided.")
             return jsonify({'message': 'Invalid request: No data provided'}), 400
 
@@ -59,27 +156,35 @@ def zoom_webhook():
             logger.warning("Invalid request: Missing signature or timestamp headers.")
             return jsonify({'message': 'Invalid request: Missing signature or timestamp headers.'}), 400
 
-        # Reconstruct the payload as a JSON string without spaces
-        payload = json.dumps(data, separators=(',', ':'))
-
-        # Validate request from Zoom
+        # Validate request from Zoom on the raw body, before any JSON parsing
         if not validate_zoom_webhook(ZOOM_WEBHOOK_SECRET_TOKEN, zoom_signature, zoom_timestamp, payload):
             logger.warning("Unauthorized request: Validation failed.")
             return jsonify({'message': 'Unauthorized'}), 401
 
+        try:
+            data = json.loads(payload)
+        except ValueError:
+            logger.warning("Invalid request: Body is not valid JSON.")
+            return jsonify({'message': 'Invalid request: Body is not valid JSON'}), 400
+
         event = data.get('event')
-        if event == 'recording.completed':
+        if event == 'endpoint.url_validation':
+            plain_token = data.get('payload', {}).get('plainToken')
+            if not plain_token:
+                return jsonify({'message': 'Invalid request: Missing plainToken'}), 400
+            logger.info("Answered Zoom endpoint URL validation challenge.")
+            return jsonify(build_url_validation_response(ZOOM_WEBHOOK_SECRET_TOKEN, plain_token)), 200
+
+        if event in RECORDING_EVENTS:
             recording_info = data['payload']['object']
-            meeting_topic = recording_info.get('topic', 'No topic')
             meeting_id = str(recording_info.get('id'))  # Ensure it's string
             meeting_uuid = recording_info.get('uuid')  # UUID
-            host_email = recording_info.get('host_email', 'No host email provided')
 
             if not meeting_id or not meeting_uuid:
                 logger.warning("Invalid request: Missing meeting ID or UUID.")
                 return jsonify({'message': 'Invalid request: Missing meeting ID or UUID'}), 400
 
-            logger.info(f"Processing recording.completed event for Meeting ID: {meeting_id}")
+            logger.info(f"Received {event} event for Meeting ID: {meeting_id}")
 
             # Extract download_token from top-level
             download_token = data.get('download_token', "")
@@ -93,136 +198,50 @@ def zoom_webhook():
                 logger.warning(f"No recordings found in webhook payload for Meeting ID: {meeting_id}")
                 return jsonify({'message': 'No recordings available in payload.'}), 200
 
-            # Iterate through recording files to find the desired one (e.g., MP4)
-            recording_url = None
-            for file in recording_files:
-                if file.get('file_type') == 'MP4':  # Adjust as needed
-                    recording_url = file.get('download_url')
-                    break
-
-            if not recording_url:
+            # Pick Zoom's transcript of each segment, or else its cheapest audio (audio-only M4A before MP4)
+            segment_files = select_recording_segments(recording_files)
+            if not segment_files:
                 logger.error("Recording URL not found in webhook payload.")
                 return jsonify({'message': 'Recording URL is missing.'}), 400
 
-            # Additional Meeting Details
-            start_time = recording_info.get('start_time', 'Unknown DateTime')
-            if 'T' in start_time and 'Z' in start_time:
-                meeting_date = start_time.split('T')[0]
-                meeting_time = start_time.split('T')[1].split('Z')[0]
-            else:
-                meeting_date = "Unknown Date"
-                meeting_time = "Unknown Time"
-
-            duration = recording_info.get('duration', 'Unknown Duration')
-
-            # Download the recording using download_token
-            recording_file_path = download_recording(recording_url, download_token)
-            if not recording_file_path:
-                logger.error("Failed to download recording.")
-                return jsonify({'message': 'Failed to download recording.'}), 400
-
-            # Transcribe the recording
-            transcript = transcribe_audio(recording_file_path)
-            if not transcript:
-                logger.warning("Transcription failed.")
-                transcript = "No transcription available."
-
-            # Generate summary using OpenAI
-            meeting_summary = generate_summary(
-                transcript=transcript,
-                meeting_title=meeting_topic,
-                host_email=host_email,
-                meeting_id=meeting_id,
-                meeting_date=meeting_date,
-                meeting_time=meeting_time,
-                duration=duration
-            )
-            if not meeting_summary:
-                logger.warning("Summary generation failed.")
-                meeting_summary = {
-                    "meeting_details": {
-                        "title": meeting_topic,
-                        "date_time": f"{meeting_date} at {meeting_time}",
-                        "host_email": host_email,
-                        "meeting_id": meeting_id,
-                        "duration": duration
-                    },
-                    "share_details": {
-                        "play_url": "No play URL available.",
-                        "password": "No password available."
-                    },
-                    "meeting_summary": {
-                        "summary_overview": "No overview available.",
-                        "main_topics": [],
-                        "action_items": []
-                    }
-                }
-
-            # Incorporate Share Details (Play URL and Password)
-            share_details = {
-                "play_url": recording_url,
-                "password": recording_info.get('recording_play_passcode', 'No password available.')
+            # Reject redeliveries of an event that is already queued or processed
+            event_key = recording_event_key(meeting_uuid, recording_files)
+            if not processed_events.add_if_absent(event_key):
+                logger.info(f"Ignoring duplicate {event} event for Meeting ID: {meeting_id}")
+                return jsonify({'message': 'Duplicate event ignored.'}), 200
+
+            # Record the job durably, or pick up an earlier attempt at its first incomplete stage
+            job = {
+                'event_key': event_key,
+                'recording_info': recording_info,
+                'recording_files': segment_files,
+                'download_token': download_token,
+                'received_at': time.time()
             }
-
-            # Update share_details in meeting_summary
-            meeting_summary['share_details'] = share_details
-
-            # Fetch all public channels from Slack
-            public_channels = get_all_public_channels()
-
-            # Determine Slack channel using OpenAI
-            slack_channel_id = determine_slack_channel(meeting_topic, meeting_summary.get('meeting_summary', {}), public_channels)
-            if not slack_channel_id:
-                logger.warning(f"No suitable Slack channel found. Attempting to use default channel '{DEFAULT_CHANNEL_NAME}'.")
-                slack_channel_id = ensure_default_channel_exists(DEFAULT_CHANNEL_NAME)
-                if not slack_channel_id:
-                    logger.error("Failed to find or create the default Slack channel. Cannot post the meeting summary.")
-                    return jsonify({'message': 'Failed to post the meeting summary to Slack.'}), 500
-
-            # Join the Slack channel if not already a member
-            joined = join_slack_channel(slack_channel_id)
-            if not joined:
-                logger.error(f"Failed to join Slack channel ID '{slack_channel_id}'. Cannot post the meeting summary.")
-                return jsonify({'message': 'Failed to join Slack channel.'}), 500
-
-            # Prepare the summary message using structured data
-            summary = meeting_summary.get('meeting_summary', {})
-            recording_summary = (
-                f"*Meeting Title & Basic Details:*\n"
-                f"- **Title:** {meeting_summary['meeting_details']['title']}\n"
-                f"- **Date & Time:** {meeting_summary['meeting_details']['date_time']}\n"
-                f"- **Host Email:** {meeting_summary['meeting_details']['host_email']}\n"
-                f"- **Meeting ID:** {meeting_summary['meeting_details']['meeting_id']}\n\n"
-                f"*Share Details:*\n"
-                f"- **Play URL:** {meeting_summary['share_details']['play_url']}\n"
-                f"- **Password:** {meeting_summary['share_details']['password']}\n\n"
-                f"*Meeting Summary:*\n"
-                f"- **Brief Overview:** {summary.get('summary_overview', 'No overview available.')}\n"
-                f"- **Main Topics Discussed:**\n"
-            )
-
-            # Add main topics
-            for topic in summary.get('main_topics', []):
-                recording_summary += f"  - **{topic['topic']}** (Timestamp: {topic['timestamp']})\n"
-
-            # Add action items
-            recording_summary += "\n- **Action Items:**\n"
-            for action in summary.get('action_items', []):
-                recording_summary += f"  - **{action['action_item']}** (Responsible: {action['responsible']})\n"
-
-            # Post to Slack
-            success = post_to_slack(slack_channel_id, recording_summary)
-            if success:
-                logger.info(f"Posted meeting summary to Slack channel ID '{slack_channel_id}'.")
-            else:
-                logger.error(f"Failed to post meeting summary to Slack channel ID '{slack_channel_id}'.")
-
-            # Clean up the downloaded recording file
+            record = None
             try:
-                os.remove(recording_file_path)
-                logger.info(f"Removed temporary recording file: {recording_file_path}")
+                # Only one event per meeting is posted, so a transcript arriving later does not post it twice
+                record = job_store.begin(event_key, job, meeting_uuid=meeting_uuid)
+                if not record:
+                    logger.info(f"Recording for Meeting ID {meeting_id} is already posted or in progress.")
+                    return jsonify({'message': 'Duplicate event ignored.'}), 200
+
+                # Hand the expensive pipeline off to the background workers
+                if not job_queue.submit(record):
+                    job_store.finish(record, False, "Job queue is full.")
+                    processed_events.discard(event_key)
+                    return jsonify({'message': 'Server busy, please retry later.'}), 503
             except Exception as e:
-                logger.warning(f"Failed to remove temporary file: {recording_file_path}. Error: {e}")
+                # The event was not queued, so Zoom's retry of it must not be dropped as a duplicate
+                processed_events.discard(event_key)
+                if record is not None:
+                    try:
+                        job_store.finish(record, False, str(e))
+                    except Exception:
+                        logger.exception(f"Failed to release job {event_key} after an error.")
+                raise
+
+            logger.info(f"Queued recording for Meeting ID: {meeting_id}")
 
     except Exception as e:
         logger.exception(f"Error processing Zoom webhook: {e}")
@@ -230,6 +249,35 @@ def zoom_webhook():
 
     return jsonify({'message': 'Event received'}), 200
 
+@app.route('/slack-events', methods=['POST'])
+def slack_events():
+    """
+    Receives Slack Events API callbacks and keeps the channel directory cache current.
+    """
+    if not SLACK_SIGNING_SECRET:
+        return jsonify({'message': 'Slack events are not configured.'}), 404
+
+    if not slack_signature_verifier.is_valid_request(request.get_data(), request.headers):
+        logger.warning("Unauthorized Slack event: Signature validation failed.")
+        return jsonify({'message': 'Unauthorized'}), 401
+
+    data = request.get_json(silent=True) or {}
+    if data.get('type') == 'url_verification':
+        return jsonify({'challenge': data.get('challenge')}), 200
+
+    if data.get('type') == 'event_callback':
+        channel_directory.apply_event(data.get('event', {}))
+
+    return jsonify({'message': 'Event received'}), 200
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """
+    Exposes per-stage latency, throughput and resource metrics in the Prometheus text format.
+    """
+    body, content_type = metrics.render()
+    return Response(body, headers={'Content-Type': content_type})
+
 @app.route('/', methods=['GET'])
 def index():
     return "The Zoom to Slack integration app is running successfully!", 200
@@ -0,0 +1,283 @@
+# audio_utils.py
+
+import os
+import re
+import bisect
+import shutil
+import logging
+import threading
+import subprocess
+from scratch_space import scratch_space
+
+logger = logging.getLogger(__name__)
+
+# Paths to the ffmpeg tools used for audio processing
+FFMPEG_BINARY = os.getenv('FFMPEG_BINARY', 'ffmpeg')
+FFPROBE_BINARY = os.getenv('FFPROBE_BINARY', 'ffprobe')
+
+# Transcode recordings to small mono 16 kHz audio before they are sent to Whisper
+TRANSCODE_AUDIO = os.getenv('TRANSCODE_AUDIO', 'true').lower() == 'true'
+TRANSCODE_FORMAT = os.getenv('TRANSCODE_FORMAT', 'opus').lower()
+TRANSCODE_BITRATE = os.getenv('TRANSCODE_BITRATE', '24k')
+
+# Cut long silences out of the audio before transcription; timestamps are mapped back
+TRIM_SILENCE = os.getenv('TRIM_SILENCE', 'true').lower() == 'true'
+SILENCE_THRESHOLD_DB = float(os.getenv('SILENCE_THRESHOLD_DB', '-35'))
+SILENCE_MIN_SECONDS = float(os.getenv('SILENCE_MIN_SECONDS', '3'))
+SILENCE_PADDING_SECONDS = float(os.getenv('SILENCE_PADDING_SECONDS', '0.5'))
+SILENCE_MAX_CUTS = int(os.getenv('SILENCE_MAX_CUTS', '500'))
+
+# Encoder arguments and the file extension Whisper recognizes for each output format
+TRANSCODE_FORMATS = {
+    'opus': ('ogg', ['-c:a', 'libopus', '-application', 'voip', '-f', 'ogg']),
+    'mp3': ('mp3', ['-c:a', 'libmp3lame', '-f', 'mp3']),
+}
+
+def ffmpeg_available():
+    """
+    Returns:
+        bool: True if both ffmpeg and ffprobe are on the PATH.
+    """
+    return bool(shutil.which(FFMPEG_BINARY) and shutil.which(FFPROBE_BINARY))
+
+def probe_duration(file_path):
+    """
+    Reads the duration of a media file with ffprobe.
+
+    Parameters:
+        file_path (str): The path to the media file.
+
+    Returns:
+        float or None: The duration in seconds, or None if it cannot be determined.
+    """
+    try:
+        result = subprocess.run(
+            [
+                FFPROBE_BINARY, '-v', 'error',
+                '-show_entries', 'format=duration',
+                '-of', 'default=noprint_wrappers=1:nokey=1',
+                file_path
+            ],
+            capture_output=True,
+            text=True,
+            check=True
+        )
+        return float(result.stdout.strip())
+    except (subprocess.CalledProcessError, ValueError, OSError) as e:
+        logger.error(f"Failed to probe duration of {file_path}: {e}")
+        return None
+
+def extract_segment(file_path, start, duration):
+    """
+    Extracts a mono 16 kHz MP3 segment of the audio track to a scratch file.
+
+    Parameters:
+        file_path (str): The path to the source media file.
+        start (float): The segment start, in seconds.
+        duration (float): The segment length, in seconds.
+
+    Returns:
+        str or None: The path to the segment file, or None if extraction fails.
+    """
+    # 64 kbit/s is 8000 bytes per second of audio
+    segment_path = scratch_space.create(".mp3", expected_bytes=int(duration * 8000))
+    try:
+        subprocess.run(
+            [
+                FFMPEG_BINARY, '-nostdin', '-v', 'error', '-y',
+                '-ss', f"{start:.3f}", '-t', f"{duration:.3f}",
+                '-i', file_path,
+                '-vn', '-ac', '1', '-ar', '16000', '-b:a', '64k',
+                segment_path
+            ],
+            capture_output=True,
+            check=True
+        )
+        return segment_path
+    except (subprocess.CalledProcessError, OSError) as e:
+        logger.error(f"Failed to extract audio segment at {start:.0f}s from {file_path}: {e}")
+        scratch_space.release(segment_path)
+        return None
+
+def transcode_extension(audio_format=TRANSCODE_FORMAT):
+    """
+    Returns:
+        str: The file extension of transcoded audio, e.g. 'ogg' for Opus.
+    """
+    return TRANSCODE_FORMATS[audio_format][0]
+
+def _run_ffmpeg(arguments, output=None, input_path=None, input_stream=None):
+    """
+    Runs ffmpeg on one input, streaming its stdout into output. The input is read
+    from input_path, or fed through ffmpeg's stdin from input_stream.
+
+    Returns:
+        tuple: (return code, stderr text); the return code is None if ffmpeg could not start.
+    """
+    command = [FFMPEG_BINARY, '-hide_banner', '-nostats', '-i', input_path or 'pipe:0', *arguments]
+    try:
+        process = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE if input_path is None else subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
+        )
+    except OSError as e:
+        return None, str(e)
+
+    stderr = []
+
+    def feed():
+        try:
+            for chunk in iter(lambda: input_stream.read(1024 * 1024), b''):
+                process.stdin.write(chunk)
+        except (BrokenPipeError, ValueError):
+            pass  # ffmpeg stopped reading; its exit status reports why
+        finally:
+            try:
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+
+    # stdin and stderr are serviced by threads so that no pipe can fill up and block ffmpeg
+    threads = [threading.Thread(target=lambda: stderr.append(process.stderr.read()), daemon=True)]
+    if input_path is None:
+        threads.append(threading.Thread(target=feed, daemon=True))
+    for thread in threads:
+        thread.start()
+    try:
+        for chunk in iter(lambda: process.stdout.read(64 * 1024), b''):
+            if output is not None:
+                output.write(chunk)
+    except Exception:
+        process.kill()
+        raise
+    finally:
+        process.wait()
+        for thread in threads:
+            thread.join()
+        process.stdout.close()
+        process.stderr.close()
+    return process.returncode, b''.join(stderr).decode('utf-8', 'replace')
+
+def detect_speech_spans(input_path=None, input_stream=None):
+    """
+    Finds the parts of a recording that are not silence, using ffmpeg's silencedetect
+    filter. Silences shorter than SILENCE_MIN_SECONDS are kept, and SILENCE_PADDING_SECONDS
+    of each removed silence is kept on either side so words are not clipped.
+
+    Parameters:
+        input_path (str, optional): The path to the media file.
+        input_stream (file object, optional): A readable source, used when there is no path.
+
+    Returns:
+        list of tuple or None: (start, end) seconds of each span to keep, in order, where
+            the last end is None if the span runs to the end of the recording. None if
+            detection fails.
+    """
+    returncode, stderr = _run_ffmpeg(
+        ['-vn', '-ac', '1', '-af', f"silencedetect=noise={SILENCE_THRESHOLD_DB}dB:d={SILENCE_MIN_SECONDS}", '-f', 'null', '-'],
+        input_path=input_path,
+        input_stream=input_stream
+    )
+    if returncode != 0:
+        logger.error(f"ffmpeg failed to detect silence in {input_path or 'the recording'}: {stderr.strip()[-500:]}")
+        return None
+
+    silences = []
+    for match in re.finditer(r'silence_(start|end): (-?[\d.]+)', stderr):
+        if match.group(1) == 'start':
+            silences.append([max(0.0, float(match.group(2))), None])
+        elif silences and silences[-1][1] is None:
+            silences[-1][1] = float(match.group(2))
+
+    removed = []
+    for start, end in silences:
+        # A silence at the very start needs no padding before it; one running to the end none after
+        cut_start = start + SILENCE_PADDING_SECONDS if start > 0 else 0.0
+        cut_end = end - SILENCE_PADDING_SECONDS if end is not None else None
+        if cut_end is None or cut_end > cut_start:
+            removed.append((cut_start, cut_end))
+    if len(removed) > SILENCE_MAX_CUTS:
+        # Very long filter expressions are slow to parse; only the longest silences are cut
+        removed = sorted(removed, key=lambda cut: float('inf') if cut[1] is None else cut[1] - cut[0])[-SILENCE_MAX_CUTS:]
+        removed.sort()
+
+    spans = []
+    position = 0.0
+    for cut_start, cut_end in removed:
+        if cut_start > position:
+            spans.append((position, cut_start))
+        if cut_end is None:
+            return spans
+        position = cut_end
+    spans.append((position, None))
+    return spans
+
+def build_offset_map(spans):
+    """
+    Maps the timeline of audio cut down to the given spans back to the original one.
+
+    Parameters:
+        spans (list of tuple): (start, end) seconds of the kept spans, as returned by detect_speech_spans.
+
+    Returns:
+        list of tuple: (trimmed start, original start, original end) of each span, in order.
+    """
+    offset_map = []
+    trimmed_start = 0.0
+    for start, end in spans:
+        offset_map.append((trimmed_start, start, end))
+        if end is not None:
+            trimmed_start += end - start
+    return offset_map
+
+def to_original_time(offset_map, seconds, is_end=False):
+    """
+    Converts a time in trimmed audio to the same moment in the original recording.
+    A time on the boundary between two spans maps to the end of the earlier span
+    when is_end is set, and to the start of the later one otherwise.
+    """
+    if not offset_map:
+        return seconds
+    starts = [entry[0] for entry in offset_map]
+    index = (bisect.bisect_left(starts, seconds) if is_end else bisect.bisect_right(starts, seconds)) - 1
+    trimmed_start, original_start, original_end = offset_map[max(0, index)]
+    original = original_start + max(0.0, seconds - trimmed_start)
+    return min(original, original_end) if original_end is not None else original
+
+def transcode_audio(output, input_path=None, input_stream=None, audio_format=TRANSCODE_FORMAT, bitrate=TRANSCODE_BITRATE, spans=None):
+    """
+    Transcodes the audio track to mono 16 kHz Opus or MP3, streaming the result
+    from ffmpeg's stdout into output as it is encoded. The source is read from
+    input_path, or fed through ffmpeg's stdin from input_stream.
+
+    Parameters:
+        output: A writable object that receives the encoded audio.
+        input_path (str, optional): The path to the source media file.
+        input_stream (file object, optional): A readable source, used when there is no path.
+        audio_format (str): A key of TRANSCODE_FORMATS.
+        bitrate (str): The target bitrate, e.g. '24k'.
+        spans (list of tuple, optional): (start, end) seconds to keep; everything else is cut.
+
+    Returns:
+        bool: True if ffmpeg succeeded.
+    """
+    _, codec_args = TRANSCODE_FORMATS[audio_format]
+    filters = []
+    if spans:
+        selection = '+'.join(
+            f"between(t,{start:.3f},{end:.3f})" if end is not None else f"gte(t,{start:.3f})"
+            for start, end in spans
+        )
+        filters = ['-af', f"aselect='{selection}',asetpts=N/SR/TB"]
+    returncode, stderr = _run_ffmpeg(
+        ['-v', 'error', '-vn', *filters, '-ac', '1', '-ar', '16000', '-b:a', bitrate, *codec_args, 'pipe:1'],
+        output=output,
+        input_path=input_path,
+        input_stream=input_stream
+    )
+    if returncode != 0:
+        logger.error(f"ffmpeg failed to transcode {input_path or 'the recording'}: {stderr.strip()}")
+        return False
+    return True
@@ -0,0 +1,221 @@
+# backfill.py
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+from datetime import date, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+# Load environment variables from .env file only if not on Heroku
+if os.getenv('DYNO') is None:
+    load_dotenv()
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+logging.basicConfig(
+    level=LOG_LEVEL,
+    format='%(asctime)s %(levelname)s %(name)s %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+logger = logging.getLogger('backfill')
+
+from zoom_utils import list_users, list_recordings, select_recording_segments, get_valid_zoom_access_token
+from dedup_store import recording_event_key
+from pipeline import process_recording
+from job_store import JobStore
+from scratch_space import scratch_space
+
+# Zoom's recordings API accepts at most one month per request
+WINDOW_DAYS = 30
+
+# Shared with the webhook, so a meeting is posted once and retries resume from its checkpoints
+job_store = JobStore()
+
+class Checkpoint:
+    """
+    Progress of a backfill run, saved to a JSON file after every change so an
+    interrupted run resumes where it stopped.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.completed_events = set()
+        self.completed_windows = set()
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                state = json.load(f)
+            self.completed_events = set(state.get('completed_events', []))
+            self.completed_windows = set(state.get('completed_windows', []))
+            logger.info(f"Resuming from {path}: {len(self.completed_events)} meetings and {len(self.completed_windows)} windows done.")
+
+    def _save(self):
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump({
+                'completed_events': sorted(self.completed_events),
+                'completed_windows': sorted(self.completed_windows)
+            }, f)
+        os.replace(temp_path, self.path)
+
+    def mark_event(self, event_key):
+        with self._lock:
+            self.completed_events.add(event_key)
+            self._save()
+
+    def mark_window(self, window_key):
+        with self._lock:
+            self.completed_windows.add(window_key)
+            self._save()
+
+class Throughput:
+    """
+    Counts processed meetings and bytes for progress reports.
+    """
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.succeeded = 0
+        self.failed = 0
+        self.skipped = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    def record(self, success, file_size):
+        with self._lock:
+            if success:
+                self.succeeded += 1
+                self.bytes += file_size or 0
+            else:
+                self.failed += 1
+
+    def skip(self):
+        with self._lock:
+            self.skipped += 1
+
+    def report(self):
+        elapsed = max(time.monotonic() - self.started_at, 1e-9)
+        logger.info(
+            f"Backfill progress: {self.succeeded} processed, {self.failed} failed, {self.skipped} skipped "
+            f"in {elapsed:.0f}s ({self.succeeded / elapsed * 60:.2f} meetings/min, "
+            f"{self.bytes / elapsed / 1024 / 1024:.2f} MB/s of recordings)."
+        )
+
+def date_windows(start, end, days=WINDOW_DAYS):
+    """
+    Splits [start, end] into consecutive windows of at most `days` days.
+
+    Yields:
+        tuple: (window_start, window_end) dates, inclusive.
+    """
+    window_start = start
+    while window_start <= end:
+        window_end = min(window_start + timedelta(days=days - 1), end)
+        yield window_start, window_end
+        window_start = window_end + timedelta(days=1)
+
+def run_job(meeting, segment_files, event_key, checkpoint, throughput):
+    # Fetch the token when the job starts so that queued jobs never hold an expired one
+    job = {
+        'event_key': event_key,
+        'recording_info': meeting,
+        'recording_files': segment_files,
+        'download_token': get_valid_zoom_access_token()
+    }
+    record = job_store.begin(event_key, job, meeting_uuid=meeting.get('uuid'))
+    if not record:
+        logger.info(f"Meeting ID {meeting.get('id')} is already posted or in progress; skipping.")
+        throughput.skip()
+        return True
+
+    success = False
+    error = None
+    try:
+        success = process_recording(job, record)
+    except Exception as e:
+        logger.exception(f"Error backfilling Meeting ID {meeting.get('id')}: {e}")
+        error = str(e)
+    finally:
+        job_store.finish(record, success, error)
+    if success:
+        checkpoint.mark_event(event_key)
+    throughput.record(success, sum(recording_file.get('file_size') or 0 for recording_file in segment_files))
+    return success
+
+def backfill(start, end, user_ids, concurrency, checkpoint, dry_run=False):
+    """
+    Runs every cloud recording in the date range through the pipeline.
+
+    Parameters:
+        start (date): The first day to backfill.
+        end (date): The last day to backfill.
+        user_ids (list of str): Zoom user IDs, or None for every active user.
+        concurrency (int): The number of meetings processed at once.
+        checkpoint (Checkpoint): Progress of this and earlier runs.
+        dry_run (bool): List the meetings that would be processed without processing them.
+
+    Returns:
+        Throughput: The run's counters.
+    """
+    throughput = Throughput()
+    users = [{'id': user_id} for user_id in user_ids] if user_ids else list_users()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for user in users:
+            for window_start, window_end in date_windows(start, end):
+                window_key = f"{user['id']}:{window_start.isoformat()}:{window_end.isoformat()}"
+                if window_key in checkpoint.completed_windows:
+                    continue
+
+                futures = []
+                for meeting in list_recordings(user['id'], window_start.isoformat(), window_end.isoformat()):
+                    recording_files = meeting.get('recording_files', [])
+                    event_key = recording_event_key(meeting.get('uuid'), recording_files)
+                    segment_files = select_recording_segments(recording_files)
+                    if event_key in checkpoint.completed_events or not segment_files:
+                        throughput.skip()
+                        continue
+                    if user.get('email'):
+                        meeting.setdefault('host_email', user['email'])
+                    if dry_run:
+                        logger.info(f"Would process Meeting ID {meeting.get('id')} ({meeting.get('topic')}) from {meeting.get('start_time')}.")
+                        continue
+                    futures.append(executor.submit(run_job, meeting, segment_files, event_key, checkpoint, throughput))
+
+                # Only completed windows are skipped on resume, so failed meetings are retried
+                results = [future.result() for future in futures]
+                if not dry_run and all(results):
+                    checkpoint.mark_window(window_key)
+                throughput.report()
+    return throughput
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backfill historical Zoom cloud recordings into Slack.")
+    parser.add_argument('--from', dest='start', required=True, type=date.fromisoformat, help="First day, YYYY-MM-DD.")
+    parser.add_argument('--to', dest='end', default=date.today(), type=date.fromisoformat, help="Last day, YYYY-MM-DD (default: today).")
+    parser.add_argument('--user', dest='users', action='append', help="Zoom user ID or email; repeat for several (default: all active users).")
+    parser.add_argument('--concurrency', type=int, default=int(os.getenv('BACKFILL_CONCURRENCY', '2')), help="Meetings processed at once.")
+    parser.add_argument('--checkpoint', default='backfill_checkpoint.json', help="Progress file used to resume an interrupted run.")
+    parser.add_argument('--dry-run', action='store_true', help="List the meetings that would be processed.")
+    args = parser.parse_args(argv)
+
+    if args.start > args.end:
+        parser.error("--from must not be after --to.")
+
+    scratch_space.sweep_stale()
+    checkpoint = Checkpoint(args.checkpoint)
+    try:
+        throughput = backfill(args.start, args.end, args.users, max(1, args.concurrency), checkpoint, args.dry_run)
+    except KeyboardInterrupt:
+        logger.warning(f"Backfill interrupted; progress is saved in {args.checkpoint}.")
+        return 130
+    throughput.report()
+    return 1 if throughput.failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,408 @@
+# benchmark.py
+
+import os
+import sys
+import json
+import hmac
+import time
+import atexit
+import shutil
+import timeit
+import hashlib
+import logging
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+import threading
+from types import SimpleNamespace
+from datetime import datetime, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Benchmarks run offline: every client is faked, so the credentials only need to exist,
+# and every on-disk cache lives in a scratch directory that is discarded afterwards.
+BENCHMARK_DIR = tempfile.mkdtemp(prefix='zoomtoslack_benchmark_')
+atexit.register(shutil.rmtree, BENCHMARK_DIR, ignore_errors=True)
+for name in ('ZOOM_WEBHOOK_SECRET_TOKEN', 'ZOOM_CLIENT_ID', 'ZOOM_CLIENT_SECRET', 'OPENAI_API_KEY', 'SLACK_BOT_TOKEN'):
+    os.environ.setdefault(name, 'benchmark')
+os.environ['CHANNEL_INDEX_PATH'] = os.path.join(BENCHMARK_DIR, 'channel_index.npz')
+os.environ['CONTENT_CACHE_DIR'] = os.path.join(BENCHMARK_DIR, 'cache')
+os.environ['ZOOM_TOKEN_CACHE_PATH'] = os.path.join(BENCHMARK_DIR, 'zoom_token.json')
+os.environ['JOB_STORE_PATH'] = os.path.join(BENCHMARK_DIR, 'jobs.sqlite3')
+os.environ['JOB_ARTIFACT_DIR'] = os.path.join(BENCHMARK_DIR, 'jobs')
+os.environ['SCRATCH_DIR'] = os.path.join(BENCHMARK_DIR, 'scratch')
+# The fake clients answer instantly, so the rate limiters must not throttle them
+for name in ('RATE_LIMIT_OPENAI_AUDIO', 'RATE_LIMIT_OPENAI_CHAT', 'RATE_LIMIT_OPENAI_CHAT_TOKENS', 'RATE_LIMIT_OPENAI_EMBEDDINGS'):
+    os.environ[name] = '1e12'
+
+logging.basicConfig(
+    level=os.getenv('LOG_LEVEL', 'WARNING').upper(),
+    format='%(asctime)s %(levelname)s %(name)s %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stderr)
+    ]
+)
+logger = logging.getLogger('benchmark')
+
+import numpy as np
+import openai_utils
+from channel_index import ChannelIndex
+from pipeline import format_slack_message
+from zoom_utils import validate_zoom_webhook, download_recording, stream_recording
+from scratch_space import scratch_space
+
+# tiktoken downloads its encoding on first use, so token counts, and with them how
+# transcripts are chunked, would differ between online and offline runs. Pin the
+# four-characters-per-token estimate so every run does the same work.
+openai_utils._get_encoding = lambda: None
+
+# Where results are appended, one JSON line per run
+BENCHMARK_RESULTS_PATH = os.getenv('BENCHMARK_RESULTS_PATH', 'benchmark_results.jsonl')
+# Slowdown of a benchmark's median, relative to the baseline, reported as a regression
+BENCHMARK_REGRESSION_THRESHOLD = float(os.getenv('BENCHMARK_REGRESSION_THRESHOLD', '0.2'))
+# Cold import of the web app, including interpreter startup, that a run must stay within
+IMPORT_TIME_BUDGET_SECONDS = float(os.getenv('IMPORT_TIME_BUDGET_SECONDS', '0.75'))
+# Dimensions of the fake embeddings, matching text-embedding-3-small
+FAKE_EMBEDDING_DIMENSIONS = 1536
+
+def fake_embedding(text):
+    seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+    return np.random.default_rng(seed).standard_normal(FAKE_EMBEDDING_DIMENSIONS).astype(np.float32)
+
+def fake_summary(num_topics):
+    return {
+        "meeting_summary": {
+            "summary_overview": "The team reviewed the quarter's roadmap and agreed on owners. " * 5,
+            "main_topics": [
+                {"topic": f"Topic {index}: {'discussion of the roadmap ' * 3}", "timestamp": f"00:{index % 60:02d}:00"}
+                for index in range(num_topics)
+            ],
+            "action_items": [
+                {"action_item": f"Follow up on item {index} with the wider team", "responsible": f"person{index}@example.com"}
+                for index in range(num_topics)
+            ]
+        }
+    }
+
+class FakeOpenAI:
+    """
+    Stands in for the OpenAI client: chat completions return a canned reply and
+    embeddings are deterministic pseudo-random vectors.
+    """
+
+    def __init__(self, summary_json):
+        self.summary_json = summary_json
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._chat))
+        self.embeddings = SimpleNamespace(create=self._embed)
+
+    def _chat(self, model, messages, max_tokens, **kwargs):
+        # Channel routing asks for a short reply; everything else is a summary
+        content = "C0000000000" if max_tokens <= 10 else self.summary_json
+        message = SimpleNamespace(content=content)
+        usage = SimpleNamespace(prompt_tokens=0, completion_tokens=0)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+    def _embed(self, model, input):
+        data = [SimpleNamespace(index=index, embedding=fake_embedding(text)) for index, text in enumerate(input)]
+        return SimpleNamespace(data=data, usage=SimpleNamespace(prompt_tokens=0, completion_tokens=0))
+
+class _RangeHandler(BaseHTTPRequestHandler):
+    """
+    Serves the recording payload from memory and honours single byte ranges.
+    """
+    payload = b''
+
+    def do_GET(self):
+        size = len(self.payload)
+        start, end = 0, size - 1
+        byte_range = self.headers.get('Range')
+        if byte_range:
+            first, last = byte_range.split('=', 1)[1].split('-')
+            start, end = int(first), min(int(last), size - 1)
+            self.send_response(206)
+            self.send_header('Content-Range', f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+        view = memoryview(self.payload)[start:end + 1]
+        for offset in range(0, len(view), 1024 * 1024):
+            self.wfile.write(view[offset:offset + 1024 * 1024])
+
+    def log_message(self, format, *args):
+        pass
+
+class LocalRecordingServer:
+    """
+    Local HTTP server that download benchmarks fetch a synthetic recording from.
+    """
+
+    def __init__(self, size):
+        handler = type('Handler', (_RangeHandler,), {'payload': os.urandom(size)})
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.size = size
+        self.url = f"http://127.0.0.1:{self.server.server_port}/rec/recording.mp4"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+BENCHMARKS = []
+
+def benchmark(fn):
+    """
+    Registers a benchmark. Each benchmark yields (name, callable, bytes) cases,
+    where bytes is the amount of data one call processes, or None.
+    """
+    BENCHMARKS.append(fn)
+    return fn
+
+@benchmark
+def bench_validate_zoom_webhook():
+    secret = 'benchmark-secret'
+    for label, size in (('1KB', 1024), ('100KB', 100 * 1024), ('1MB', 1024 * 1024), ('10MB', 10 * 1024 * 1024)):
+        body = json.dumps({
+            'event': 'recording.completed',
+            'payload': {'object': {'id': 1, 'topic': 'x' * size}}
+        }).encode('utf-8')
+        # Signed when the case starts; each case finishes well inside the staleness window
+        timestamp = str(int(time.time()))
+        message = b'v0:' + timestamp.encode('utf-8') + b':' + body
+        signature = 'v0=' + hmac.new(secret.encode('utf-8'), message, hashlib.sha256).hexdigest()
+
+        def run(body=body, timestamp=timestamp, signature=signature):
+            if not validate_zoom_webhook(secret, signature, timestamp, body):
+                raise RuntimeError("Signature did not validate.")
+        yield f"validate_zoom_webhook[{label}]", run, len(body)
+
+@benchmark
+def bench_determine_slack_channel():
+    meeting_summary = fake_summary(5)['meeting_summary']
+    for count in (10, 1000, 10000):
+        channels = [
+            {'id': f"C{index:010d}", 'name': f"team-{index}", 'topic': f"Work stream {index} planning and updates"}
+            for index in range(count)
+        ]
+        openai_utils.channel_index = ChannelIndex(openai_utils.embed_texts, os.path.join(BENCHMARK_DIR, f"channels_{count}.npz"), model=openai_utils.EMBEDDING_MODEL)
+        # Embeds the channels once, so the timed calls measure the steady state
+        openai_utils.channel_index.sync(channels)
+        index = openai_utils.channel_index
+
+        def run(channels=channels, index=index):
+            openai_utils.channel_index = index
+            openai_utils.determine_slack_channel("Quarterly roadmap review", meeting_summary, channels)
+        yield f"determine_slack_channel[{count} channels]", run, None
+
+class DisabledContentStore:
+    """
+    Content store that never holds a value, so cases measure the work rather than cache I/O.
+    """
+
+    def get(self, namespace, key):
+        return None
+
+    def put(self, namespace, key, value):
+        pass
+
+@benchmark
+def bench_generate_summary():
+    # Every call would add a summary to the content store, and each write walks the whole
+    # cache directory to evict, so the cost would grow over the run
+    original_store = openai_utils.content_store
+    openai_utils.content_store = DisabledContentStore()
+    try:
+        for label, minutes in (('10min', 10), ('2h', 120)):
+            base = "\n".join(
+                f"[{second // 3600:02d}:{second // 60 % 60:02d}:{second % 60:02d}] We went through the next item on the agenda and agreed on the owner."
+                for second in range(0, minutes * 60, 5)
+            )
+
+            def run(base=base):
+                openai_utils.generate_summary(
+                    transcript=base,
+                    meeting_title="Quarterly roadmap review",
+                    host_email="host@example.com",
+                    meeting_id="123456789",
+                    meeting_date="2024-01-01",
+                    meeting_time="10:00:00",
+                    duration=minutes
+                )
+            yield f"generate_summary[{label}]", run, len(base)
+    finally:
+        openai_utils.content_store = original_store
+
+@benchmark
+def bench_format_slack_message():
+    for topics in (10, 200):
+        meeting_summary = fake_summary(topics)
+        meeting_summary['meeting_details'] = {
+            'title': "Quarterly roadmap review",
+            'date_time': "2024-01-01 at 10:00:00",
+            'host_email': "host@example.com",
+            'meeting_id': "123456789"
+        }
+        meeting_summary['share_details'] = {'play_url': "https://zoom.us/rec/share/abc", 'password': "secret"}
+        yield f"format_slack_message[{topics} topics]", lambda meeting_summary=meeting_summary: format_slack_message(meeting_summary), None
+
+@benchmark
+def bench_download_recording():
+    size = 64 * 1024 * 1024
+    server = LocalRecordingServer(size)
+    try:
+        def ranged():
+            scratch_space.release(download_recording(server.url, 'token', file_extension='mp4', file_size=size))
+
+        def whole():
+            scratch_space.release(download_recording(server.url, 'token', file_extension='mp4'))
+
+        def streamed():
+            stream_recording(server.url, 'token', file_extension='mp4', max_memory_bytes=size).close()
+
+        yield "download_recording[64MB ranged]", ranged, size
+        yield "download_recording[64MB whole]", whole, size
+        yield "stream_recording[64MB memory]", streamed, size
+    finally:
+        server.close()
+
+@benchmark
+def bench_import_app():
+    command = [sys.executable, '-c', 'import app']
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    yield "import app", lambda: subprocess.run(command, cwd=cwd, check=True), None
+
+def measure(fn, repeat):
+    """
+    Times fn with timeit, calibrating the loop count so each sample takes at least 0.2s.
+
+    Returns:
+        dict: Seconds per call as 'median', 'min' and 'stdev', and the 'loops' per sample.
+    """
+    timer = timeit.Timer(fn)
+    loops, _ = timer.autorange()
+    samples = [total / loops for total in timer.repeat(repeat=repeat, number=loops)]
+    return {
+        'median': statistics.median(samples),
+        'min': min(samples),
+        'stdev': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        'loops': loops
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(name_filter=None, repeat=5):
+    """
+    Runs every registered benchmark whose case name contains name_filter.
+
+    Returns:
+        dict: Maps each case name to its timings, plus 'mb_per_s' for cases that process data.
+    """
+    original_client = openai_utils.openai_client
+    original_index = openai_utils.channel_index
+    openai_utils.openai_client = FakeOpenAI(json.dumps(fake_summary(20)))
+    original_min_score = openai_utils.ROUTING_MIN_SCORE
+    # Random embeddings are never a confident match, so routing always builds the LLM prompt
+    openai_utils.ROUTING_MIN_SCORE = float('inf')
+    results = {}
+    try:
+        for bench in BENCHMARKS:
+            for name, fn, size in bench():
+                if name_filter and name_filter not in name:
+                    continue
+                fn()  # Warm up caches and connection pools
+                result = measure(fn, repeat)
+                if size:
+                    result['mb_per_s'] = size / result['median'] / 1024 / 1024
+                results[name] = result
+                print(format_result(name, result), flush=True)
+    finally:
+        openai_utils.openai_client = original_client
+        openai_utils.channel_index = original_index
+        openai_utils.ROUTING_MIN_SCORE = original_min_score
+    return results
+
+def format_result(name, result, baseline=None):
+    line = f"{name:<45} {result['median'] * 1000:>12.3f} ms  ±{result['stdev'] * 1000:.3f}"
+    if 'mb_per_s' in result:
+        line += f"  {result['mb_per_s']:>9.1f} MB/s"
+    if baseline:
+        line += f"  {(result['median'] / baseline['median'] - 1) * 100:+7.1f}%"
+    return line
+
+def load_runs(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def save_run(path, results):
+    run = {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'machine': f"{platform.system()} {platform.machine()} ({os.cpu_count()} CPUs)",
+        'results': results
+    }
+    with open(path, 'a') as f:
+        f.write(json.dumps(run) + "\n")
+    return run
+
+def compare(results, baseline, threshold):
+    """
+    Prints each case against the baseline run.
+
+    Returns:
+        list of str: The cases whose median slowed down by more than threshold.
+    """
+    print(f"\nCompared with {baseline.get('commit') or 'unknown commit'} from {baseline['timestamp']}:")
+    regressions = []
+    for name, result in results.items():
+        previous = baseline['results'].get(name)
+        print(format_result(name, result, previous))
+        if previous and result['median'] > previous['median'] * (1 + threshold):
+            regressions.append(name)
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the offline micro-benchmarks and compare them with earlier runs.")
+    parser.add_argument('--filter', help="Only run cases whose name contains this text.")
+    parser.add_argument('--repeat', type=int, default=5, help="Timed samples per case.")
+    parser.add_argument('--results', default=BENCHMARK_RESULTS_PATH, help="JSON lines file the run is appended to.")
+    parser.add_argument('--baseline', help="Commit to compare with (default: the previous run).")
+    parser.add_argument('--threshold', type=float, default=BENCHMARK_REGRESSION_THRESHOLD, help="Relative slowdown reported as a regression.")
+    parser.add_argument('--import-budget', type=float, default=IMPORT_TIME_BUDGET_SECONDS, help="Seconds a cold 'import app' may take.")
+    parser.add_argument('--no-save', action='store_true', help="Do not append this run to the results file.")
+    args = parser.parse_args(argv)
+
+    runs = load_runs(args.results)
+    results = run_benchmarks(args.filter, max(2, args.repeat))
+    if not args.no_save:
+        save_run(args.results, results)
+
+    if args.baseline:
+        baseline = next((run for run in reversed(runs) if run.get('commit') == args.baseline), None)
+        if baseline is None:
+            parser.error(f"No run for commit {args.baseline} in {args.results}.")
+    else:
+        baseline = runs[-1] if runs else None
+
+    regressions = compare(results, baseline, args.threshold) if baseline else []
+    import_time = results.get('import app')
+    if import_time and import_time['median'] > args.import_budget:
+        print(f"\nimport app took {import_time['median']:.3f}s, over the {args.import_budget:.3f}s budget.")
+        regressions.append('import app')
+    if regressions:
+        print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
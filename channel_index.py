@@ -0,0 +1,151 @@
+# channel_index.py
+
+import os
+import logging
+import hashlib
+import tempfile
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Where the channel embeddings are persisted between runs
+CHANNEL_INDEX_PATH = os.getenv(
+    'CHANNEL_INDEX_PATH',
+    os.path.join(tempfile.gettempdir(), 'zoomtoslack_channel_index.npz')
+)
+
+def channel_text(channel):
+    """
+    Returns:
+        str: The text that is embedded for a channel.
+    """
+    return f"{channel['name']}: {channel['topic']}" if channel.get('topic') else channel['name']
+
+def _text_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+class ChannelIndex:
+    """
+    Vector index of channel name and topic embeddings.
+
+    Embeddings are stored as one L2-normalized matrix so that cosine similarity
+    against every channel is a single matrix-vector product. sync() embeds only
+    channels that are new or whose name or topic changed, and persists the index
+    to CHANNEL_INDEX_PATH. A persisted index built with another embedding model is
+    discarded, since its vectors live in a different space.
+    """
+
+    def __init__(self, embed, path=CHANNEL_INDEX_PATH, model=''):
+        """
+        Parameters:
+            embed (callable): Maps a list of texts to a list of embedding vectors.
+            path (str): The .npz file the index is persisted to.
+            model (str): The name of the embedding model behind embed.
+        """
+        self.embed = embed
+        self.path = path
+        self.model = model
+        self._ids = []
+        self._hashes = []
+        self._channels = {}
+        self._matrix = None
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                model = str(data['model']) if 'model' in data.files else None
+                if model != self.model:
+                    logger.info(f"Discarding channel index at {self.path} built with embedding model {model!r}.")
+                    return
+                self._ids = data['ids'].tolist()
+                self._hashes = data['hashes'].tolist()
+                self._matrix = data['vectors']
+            logger.info(f"Loaded channel index with {len(self._ids)} channels from {self.path}.")
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable channel index at {self.path}: {e}")
+            self._ids, self._hashes, self._matrix = [], [], None
+
+    def _save(self):
+        temp_path = f"{self.path}.{os.getpid()}.tmp.npz"
+        np.savez(
+            temp_path,
+            model=np.array(self.model),
+            ids=np.array(self._ids, dtype=str),
+            hashes=np.array(self._hashes, dtype=str),
+            vectors=self._matrix if self._matrix is not None else np.zeros((0, 0), dtype=np.float32)
+        )
+        os.replace(temp_path, self.path)
+
+    def sync(self, channels):
+        """
+        Brings the index in line with the given channels, embedding only what changed.
+
+        Parameters:
+            channels (list of dict): Channels with 'name', 'topic', and 'id'. An
+                empty list, which is what a failed channel listing returns, leaves the
+                index unchanged.
+        """
+        if not channels:
+            logger.warning("Not syncing the channel index with an empty channel list.")
+            return
+        with self._lock:
+            existing = {
+                channel_id: (text_hash, index)
+                for index, (channel_id, text_hash) in enumerate(zip(self._ids, self._hashes))
+            }
+            ids, hashes, rows, to_embed = [], [], [], []
+            for channel in channels:
+                text = channel_text(channel)
+                text_hash = _text_hash(text)
+                ids.append(channel['id'])
+                hashes.append(text_hash)
+                previous = existing.get(channel['id'])
+                if previous and previous[0] == text_hash and self._matrix is not None:
+                    rows.append(self._matrix[previous[1]])
+                else:
+                    rows.append(None)
+                    to_embed.append((len(rows) - 1, text))
+
+            self._channels = {channel['id']: channel for channel in channels}
+            unchanged = len(ids) == len(self._ids) and not to_embed and ids == self._ids
+            if unchanged:
+                return
+
+            if to_embed:
+                logger.info(f"Embedding {len(to_embed)} new or changed channels.")
+                vectors = self.embed([text for _, text in to_embed])
+                for (row_index, _), vector in zip(to_embed, vectors):
+                    vector = np.asarray(vector, dtype=np.float32)
+                    rows[row_index] = vector / (np.linalg.norm(vector) or 1.0)
+
+            self._ids = ids
+            self._hashes = hashes
+            self._matrix = np.vstack(rows).astype(np.float32) if rows else None
+            self._save()
+
+    def search(self, query_vector, k):
+        """
+        Ranks channels by cosine similarity to a query embedding.
+
+        Parameters:
+            query_vector (list of float): The query embedding.
+            k (int): The number of candidates to return.
+
+        Returns:
+            list of tuple: (channel dict, score) pairs, best first.
+        """
+        with self._lock:
+            if self._matrix is None or not self._ids:
+                return []
+            query = np.asarray(query_vector, dtype=np.float32)
+            query = query / (np.linalg.norm(query) or 1.0)
+            scores = self._matrix @ query
+            k = min(k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(self._channels[self._ids[i]], float(scores[i])) for i in top if self._ids[i] in self._channels]
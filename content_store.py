@@ -0,0 +1,124 @@
+# content_store.py
+
+import os
+import logging
+import hashlib
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Location and size cap of the local content-addressed cache
+CONTENT_CACHE_DIR = os.getenv(
+    'CONTENT_CACHE_DIR',
+    os.path.join(tempfile.gettempdir(), 'zoomtoslack_cache')
+)
+CONTENT_CACHE_MAX_BYTES = int(os.getenv('CONTENT_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+
+def sha256_file(file_path):
+    """
+    Hashes a file's contents.
+
+    Parameters:
+        file_path (str): The path to the file.
+
+    Returns:
+        str: The hex SHA-256 digest.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def sha256_text(text):
+    """
+    Returns:
+        str: The hex SHA-256 digest of the UTF-8 encoded text.
+    """
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+class ContentStore:
+    """
+    Local content-addressed store of text values, grouped by namespace.
+
+    Values are written atomically to <root>/<namespace>/<key>. Reads refresh a
+    file's modification time, and when the store grows past max_bytes the least
+    recently used files are deleted first.
+    """
+
+    def __init__(self, root=CONTENT_CACHE_DIR, max_bytes=CONTENT_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _path(self, namespace, key):
+        return os.path.join(self.root, namespace, key)
+
+    def get(self, namespace, key):
+        """
+        Parameters:
+            namespace (str): The kind of value, e.g. 'transcripts'.
+            key (str): The content hash the value is stored under.
+
+        Returns:
+            str or None: The stored value, or None on a cache miss.
+        """
+        path = self._path(namespace, key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                value = f.read()
+            os.utime(path)
+            return value
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"Failed to read cached {namespace} entry {key}: {e}")
+            return None
+
+    def put(self, namespace, key, value):
+        """
+        Stores a value and evicts least recently used entries above the size cap.
+
+        Parameters:
+            namespace (str): The kind of value, e.g. 'transcripts'.
+            key (str): The content hash to store the value under.
+            value (str): The value to store.
+        """
+        path = self._path(namespace, key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(value)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to cache {namespace} entry {key}: {e}")
+            return
+        self._evict()
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            total = 0
+            for directory, _, files in os.walk(self.root):
+                for name in files:
+                    path = os.path.join(directory, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+                    total += stat.st_size
+            if total <= self.max_bytes:
+                return
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except FileNotFoundError:
+                    pass
+            logger.info(f"Evicted cache entries; content store now holds {total} bytes.")
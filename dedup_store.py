@@ -0,0 +1,83 @@
+# dedup_store.py
+
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# How long a processed event is remembered, in seconds
+DEDUP_TTL_SECONDS = int(os.getenv('DEDUP_TTL_SECONDS', str(24 * 60 * 60)))
+
+def recording_event_key(meeting_uuid, recording_files):
+    """
+    Builds the deduplication key for a recording event.
+
+    Parameters:
+        meeting_uuid (str): The Zoom meeting UUID.
+        recording_files (list of dict): The 'recording_files' entries of the event.
+
+    Returns:
+        str: A key that is identical for redeliveries of the same event.
+    """
+    file_ids = sorted(str(file.get('id', '')) for file in recording_files)
+    return f"{meeting_uuid}:{','.join(file_ids)}"
+
+class DedupStore:
+    """
+    Thread-safe set of recently seen keys with TTL eviction.
+
+    Every entry shares the same TTL, so insertion order is also expiry order and
+    expired keys are evicted from the front of the ordered dict.
+    """
+
+    def __init__(self, ttl_seconds=DEDUP_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict_expired(self, now):
+        while self._entries:
+            key, expires_at = next(iter(self._entries.items()))
+            if expires_at > now:
+                break
+            self._entries.popitem(last=False)
+
+    def add_if_absent(self, key):
+        """
+        Records a key unless it has been seen within the TTL.
+
+        Parameters:
+            key (str): The event key.
+
+        Returns:
+            bool: True if the key was new, False if it is a duplicate.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._evict_expired(now)
+            if key in self._entries:
+                return False
+            self._entries[key] = now + self.ttl_seconds
+            return True
+
+    def discard(self, key):
+        """
+        Forgets a key so that a later redelivery is processed again.
+
+        Parameters:
+            key (str): The event key.
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __contains__(self, key):
+        with self._lock:
+            self._evict_expired(time.monotonic())
+            return key in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
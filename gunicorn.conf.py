@@ -0,0 +1,18 @@
+# gunicorn.conf.py
+
+import os
+
+# Import the app once in the master and fork the workers from it, so they share its
+# memory copy-on-write and boot without repeating the imports.
+preload_app = os.getenv('GUNICORN_PRELOAD', 'false').lower() == 'true'
+
+def when_ready(server):
+    if preload_app:
+        import app
+        app.warm_up()
+
+def child_exit(server, worker):
+    # Drops the live gauges of an exited worker from the aggregated /metrics
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
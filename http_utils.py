@@ -0,0 +1,167 @@
+# http_utils.py
+
+import os
+import logging
+import threading
+from collections import defaultdict
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+logger = logging.getLogger(__name__)
+
+# Connection pool and timeout settings shared by every outbound HTTP client
+HTTP_POOL_CONNECTIONS = int(os.getenv('HTTP_POOL_CONNECTIONS', '10'))
+HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', '20'))
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '5'))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', '60'))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv('HTTP_KEEPALIVE_EXPIRY', '60'))
+
+class ConnectionStats:
+    """
+    Thread-safe per-host counters of requests sent and connections opened.
+    """
+
+    def __init__(self):
+        self._requests = defaultdict(int)
+        self._connections = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record_request(self, host):
+        with self._lock:
+            self._requests[host] += 1
+
+    def record_connection(self, host):
+        with self._lock:
+            self._connections[host] += 1
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: Maps each host to its 'requests', 'connections' and 'reused' counts.
+        """
+        with self._lock:
+            return {
+                host: {
+                    'requests': self._requests[host],
+                    'connections': self._connections[host],
+                    'reused': max(0, self._requests[host] - self._connections[host])
+                }
+                for host in set(self._requests) | set(self._connections)
+            }
+
+connection_stats = ConnectionStats()
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    def _new_conn(self):
+        connection_stats.record_connection(self.host)
+        return super()._new_conn()
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    def _new_conn(self):
+        connection_stats.record_connection(self.host)
+        return super()._new_conn()
+
+class _CountingHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter that records every request and every new pooled connection.
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _CountingHTTPConnectionPool,
+            'https': _CountingHTTPSConnectionPool
+        }
+
+    def send(self, request, **kwargs):
+        connection_stats.record_request(urlparse(request.url).hostname)
+        return super().send(request, **kwargs)
+
+class _TimeoutSession(requests.Session):
+    """
+    Session that applies the default connect and read timeouts.
+    """
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+        return super().request(method, url, **kwargs)
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+def get_session(host):
+    """
+    Returns the pooled keep-alive session for a host, creating it on first use.
+
+    Parameters:
+        host (str): The host name, e.g. 'zoom.us'.
+
+    Returns:
+        requests.Session: The shared session.
+    """
+    with _sessions_lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = _TimeoutSession()
+            adapter = _CountingHTTPAdapter(pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _sessions[host] = session
+        return session
+
+def _reset_sessions():
+    # A forked worker must not share the parent's pooled connections
+    global _sessions_lock
+    _sessions.clear()
+    _sessions_lock = threading.Lock()
+
+os.register_at_fork(after_in_child=_reset_sessions)
+
+def request(method, url, **kwargs):
+    """
+    Sends a request on the pooled session for the URL's host.
+
+    Parameters:
+        method (str): The HTTP method.
+        url (str): The request URL.
+        **kwargs: Passed to requests.Session.request.
+
+    Returns:
+        requests.Response: The response.
+    """
+    return get_session(urlparse(url).hostname).request(method, url, **kwargs)
+
+def _trace_httpx_request(request):
+    host = request.url.host
+
+    def trace(event_name, info):
+        if event_name == 'connection.connect_tcp.complete':
+            connection_stats.record_connection(host)
+
+    connection_stats.record_request(host)
+    request.extensions['trace'] = trace
+
+def build_httpx_client(response_hooks=None):
+    """
+    Builds an httpx client with the shared pool limits, timeouts and connection counters,
+    for SDKs such as OpenAI's that are built on httpx.
+    
+    Parameters:
+        response_hooks (list of callable, optional): Called with every response.
+
+    Returns:
+        httpx.Client: The configured client.
+    """
+    import httpx
+
+    return httpx.Client(
+        limits=httpx.Limits(
+            max_connections=HTTP_POOL_MAXSIZE,
+            max_keepalive_connections=HTTP_POOL_MAXSIZE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+        ),
+        timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        event_hooks={'request': [_trace_httpx_request], 'response': list(response_hooks or [])}
+    )
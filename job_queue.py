@@ -0,0 +1,141 @@
+# job_queue.py
+
+import os
+import time
+import heapq
+import queue
+import logging
+import itertools
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Number of background worker threads and the maximum number of pending jobs
+JOB_WORKER_COUNT = int(os.getenv('JOB_WORKER_COUNT', '2'))
+JOB_QUEUE_MAX_SIZE = int(os.getenv('JOB_QUEUE_MAX_SIZE', '100'))
+
+class JobQueue:
+    """
+    In-process job queue served by a pool of background worker threads.
+
+    Workers are started lazily on the first submit so that the queue is safe to
+    create at import time and survives gunicorn forking its worker processes.
+    Jobs submitted with a delay are held by a scheduler thread until they are due,
+    so waiting for a retry does not occupy a worker.
+    """
+
+    def __init__(self, handler, num_workers=JOB_WORKER_COUNT, max_size=JOB_QUEUE_MAX_SIZE, on_start=None):
+        """
+        Parameters:
+            handler (callable): Function called with each job.
+            num_workers (int): Number of background worker threads.
+            max_size (int): Maximum number of pending jobs (0 for unbounded).
+            on_start (callable, optional): Called once the workers are running in a
+                new process, e.g. to resubmit interrupted jobs.
+        """
+        self.handler = handler
+        self.on_start = on_start
+        self.num_workers = max(1, num_workers)
+        self._queue = queue.Queue(maxsize=max_size)
+        self._lock = threading.Lock()
+        self._threads = []
+        self._pid = None
+        self._delayed = []
+        self._sequence = itertools.count()
+        self._delayed_condition = threading.Condition()
+        self._scheduler = None
+
+    def start(self):
+        """
+        Starts the worker threads if they are not running in this process yet.
+        """
+        with self._lock:
+            if self._pid == os.getpid() and all(t.is_alive() for t in self._threads + [self._scheduler]):
+                return
+            new_process = self._pid != os.getpid()
+            self._pid = os.getpid()
+            if new_process:
+                # Delayed jobs belong to the process that scheduled them
+                self._delayed = []
+                self._delayed_condition = threading.Condition()
+                self._scheduler = None
+            self._threads = [t for t in self._threads if t.is_alive()]
+            for index in range(len(self._threads), self.num_workers):
+                thread = threading.Thread(target=self._worker, name=f"job-worker-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            if self._scheduler is None or not self._scheduler.is_alive():
+                self._scheduler = threading.Thread(target=self._schedule, name="job-scheduler", daemon=True)
+                self._scheduler.start()
+            logger.info(f"Started {self.num_workers} background job workers in process {self._pid}.")
+        if new_process and self.on_start:
+            try:
+                self.on_start()
+            except Exception as e:
+                logger.exception(f"Error in job queue start hook: {e}")
+
+    def submit(self, job, delay=0):
+        """
+        Adds a job to the queue without blocking.
+
+        Parameters:
+            job: The job to process.
+            delay (float): Seconds to hold the job before it is queued, e.g. to retry it later.
+
+        Returns:
+            bool: True if the job was queued or scheduled, False if the queue is full.
+        """
+        self.start()
+        if delay > 0:
+            with self._delayed_condition:
+                heapq.heappush(self._delayed, (time.monotonic() + delay, next(self._sequence), job))
+                self._delayed_condition.notify()
+            logger.info(f"Scheduled job to run in {delay:.0f}s.")
+            return True
+        try:
+            self._queue.put_nowait(job)
+            logger.info(f"Queued job; {self._queue.qsize()} job(s) pending.")
+            return True
+        except queue.Full:
+            logger.error("Job queue is full; rejecting job.")
+            return False
+
+    def qsize(self):
+        """
+        Returns:
+            int: The approximate number of pending jobs.
+        """
+        return self._queue.qsize()
+
+    def delayed(self):
+        """
+        Returns:
+            int: The number of jobs waiting for their delay to pass.
+        """
+        with self._delayed_condition:
+            return len(self._delayed)
+
+    def join(self):
+        """
+        Blocks until every queued job has been processed.
+        """
+        self._queue.join()
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            try:
+                self.handler(job)
+            except Exception as e:
+                logger.exception(f"Unhandled error processing job: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _schedule(self):
+        while True:
+            with self._delayed_condition:
+                while not self._delayed or self._delayed[0][0] > time.monotonic():
+                    self._delayed_condition.wait(self._delayed[0][0] - time.monotonic() if self._delayed else None)
+                _, _, job = heapq.heappop(self._delayed)
+            # Delayed jobs were already accepted, so they wait for room rather than being rejected
+            self._queue.put(job)
@@ -0,0 +1,352 @@
+# job_store.py
+
+import os
+import json
+import time
+import uuid
+import shutil
+import socket
+import sqlite3
+import hashlib
+import logging
+import tempfile
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Location of the durable job database and of the per-job stage artifacts
+JOB_STORE_PATH = os.getenv(
+    'JOB_STORE_PATH',
+    os.path.join(tempfile.gettempdir(), 'zoomtoslack_jobs.sqlite3')
+)
+JOB_ARTIFACT_DIR = os.getenv(
+    'JOB_ARTIFACT_DIR',
+    os.path.join(tempfile.gettempdir(), 'zoomtoslack_jobs')
+)
+# How often a job is started before it is left as failed
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+# How long finished and failed jobs are kept before they are deleted
+JOB_RETENTION_SECONDS = int(os.getenv('JOB_RETENTION_SECONDS', str(7 * 24 * 3600)))
+
+# Pipeline stages in the order they complete
+STAGES = ('downloaded', 'transcribed', 'summarized', 'routed', 'posted')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    event_key TEXT PRIMARY KEY,
+    job TEXT NOT NULL,
+    status TEXT NOT NULL,
+    owner TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS stages (
+    event_key TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    output TEXT NOT NULL,
+    completed_at REAL NOT NULL,
+    PRIMARY KEY (event_key, stage)
+);
+"""
+
+_process_owner = None
+_process_owner_pid = None
+
+def _process_start_id(pid):
+    """
+    Returns:
+        str or None: The boot ID and start time of a process, which together tell it
+            apart from an earlier process that had the same PID, or None without /proc.
+    """
+    try:
+        with open('/proc/sys/kernel/random/boot_id', 'r') as f:
+            boot_id = f.read().strip()
+        with open(f'/proc/{pid}/stat', 'r') as f:
+            # The command name in parentheses may contain spaces; start time is field 22
+            start_time = f.read().rsplit(')', 1)[1].split()[19]
+    except (OSError, IndexError):
+        return None
+    return f"{boot_id[:8]}.{start_time}"
+
+def current_owner():
+    """
+    Returns:
+        str: 'host:pid:start' identifying this process, where start is its boot ID and
+            start time, or a random nonce where /proc is not available.
+    """
+    global _process_owner, _process_owner_pid
+    if _process_owner_pid != os.getpid():
+        _process_owner_pid = os.getpid()
+        start = _process_start_id(_process_owner_pid) or uuid.uuid4().hex[:8]
+        _process_owner = f"{socket.gethostname()}:{_process_owner_pid}:{start}"
+    return _process_owner
+
+def _owner_alive(owner):
+    if not owner:
+        return False
+    if owner == current_owner():
+        return True
+    try:
+        host, pid, start = owner.rsplit(':', 2)
+        pid = int(pid)
+    except ValueError:
+        return False
+    if host != socket.gethostname() or pid == os.getpid():
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    # After a restart a new process often gets a dead owner's PID
+    if '.' in start:
+        current_start = _process_start_id(pid)
+        if current_start is not None and current_start != start:
+            return False
+    return True
+
+class JobRecord:
+    """
+    A claimed job and the outputs of the stages it has already completed.
+    """
+
+    def __init__(self, store, event_key, job, outputs, attempts, resumed=False):
+        self.store = store
+        self.event_key = event_key
+        self.job = job
+        self.outputs = outputs
+        self.attempts = attempts
+        self.resumed = resumed
+
+    @property
+    def artifact_dir(self):
+        """
+        Returns:
+            str: The directory for this job's stage artifacts, e.g. the downloaded recording.
+        """
+        return self.store.artifact_path(self.event_key)
+
+    @property
+    def next_stage(self):
+        """
+        Returns:
+            str or None: The first stage without a checkpoint, or None if all are done.
+        """
+        return next((stage for stage in STAGES if stage not in self.outputs), None)
+
+    def output(self, stage):
+        """
+        Returns:
+            dict or None: The checkpointed output of a stage, or None if it has not completed.
+        """
+        return self.outputs.get(stage)
+
+    def complete(self, stage, output=None):
+        """
+        Checkpoints a stage and its output so a retry or restart skips it.
+
+        Parameters:
+            stage (str): One of STAGES.
+            output (dict, optional): JSON-serializable output later stages need.
+        """
+        output = output or {}
+        self.store.save_stage(self.event_key, stage, output)
+        self.outputs[stage] = output
+
+class JobStore:
+    """
+    Durable SQLite record of recording jobs and their per-stage checkpoints.
+
+    A job is owned by the process running it. When that process dies, for example
+    on SIGTERM during a restart, claim_stale() hands the job to a live process,
+    which resumes it at its first incomplete stage.
+    """
+
+    def __init__(self, path=JOB_STORE_PATH, artifact_dir=JOB_ARTIFACT_DIR):
+        self.path = path
+        self.artifact_dir = artifact_dir
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+        finally:
+            conn.close()
+
+    def artifact_path(self, event_key):
+        return os.path.join(self.artifact_dir, hashlib.sha256(event_key.encode('utf-8')).hexdigest()[:32])
+
+    def _outputs(self, conn, event_key):
+        rows = conn.execute('SELECT stage, output FROM stages WHERE event_key = ?', (event_key,))
+        return {stage: json.loads(output) for stage, output in rows}
+
+    def _meeting_taken(self, conn, meeting_uuid, event_key):
+        # Event keys start with the meeting UUID; see dedup_store.recording_event_key
+        prefix = f"{meeting_uuid}:"
+        others = conn.execute(
+            'SELECT status, owner FROM jobs WHERE substr(event_key, 1, ?) = ? AND event_key != ?',
+            (len(prefix), prefix, event_key)
+        ).fetchall()
+        return any(status == 'done' or (status == 'active' and _owner_alive(owner)) for status, owner in others)
+
+    def begin(self, event_key, job, meeting_uuid=None):
+        """
+        Records a new job, or claims an earlier attempt at the same event so it
+        continues from its checkpoints.
+
+        Parameters:
+            event_key (str): The recording event's dedup key.
+            job (dict): The JSON-serializable job.
+            meeting_uuid (str, optional): Also refuse the job while another event of
+                this meeting is posted or running, e.g. the recording.completed and
+                recording.transcript_completed events of one meeting.
+
+        Returns:
+            JobRecord or None: The claimed job, or None if the event has already
+                been posted or is running in another live process.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            if meeting_uuid and self._meeting_taken(conn, meeting_uuid, event_key):
+                return None
+            row = conn.execute('SELECT status, owner, attempts FROM jobs WHERE event_key = ?', (event_key,)).fetchone()
+            if row is None:
+                conn.execute(
+                    'INSERT INTO jobs (event_key, job, status, owner, attempts, created_at, updated_at) '
+                    'VALUES (?, ?, ?, ?, 1, ?, ?)',
+                    (event_key, json.dumps(job), 'active', current_owner(), now, now)
+                )
+                return JobRecord(self, event_key, job, {}, 1)
+            status, owner, attempts = row
+            if status == 'done' or (status == 'active' and _owner_alive(owner)):
+                return None
+            conn.execute(
+                'UPDATE jobs SET job = ?, status = ?, owner = ?, attempts = ?, error = NULL, updated_at = ? WHERE event_key = ?',
+                (json.dumps(job), 'active', current_owner(), attempts + 1, now, event_key)
+            )
+            record = JobRecord(self, event_key, job, self._outputs(conn, event_key), attempts + 1)
+        logger.info(f"Continuing job {event_key} at stage '{record.next_stage}' (attempt {record.attempts}).")
+        return record
+
+    def claim_stale(self):
+        """
+        Claims jobs whose owning process has died, and failed jobs with attempts
+        left, so this process can resume them. A job is left alone while another
+        event of its meeting is posted or running.
+
+        Returns:
+            list of JobRecord: The claimed jobs, marked as resumed.
+        """
+        now = time.time()
+        records = []
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT event_key, job, status, owner, attempts FROM jobs "
+                "WHERE status = 'active' OR (status = 'failed' AND attempts < ?) ORDER BY created_at",
+                (JOB_MAX_ATTEMPTS,)
+            ).fetchall()
+            for event_key, job, status, owner, attempts in rows:
+                if status == 'active' and _owner_alive(owner):
+                    continue
+                if self._meeting_taken(conn, event_key.rsplit(':', 1)[0], event_key):
+                    continue
+                conn.execute(
+                    'UPDATE jobs SET status = ?, owner = ?, attempts = ?, updated_at = ? WHERE event_key = ?',
+                    ('active', current_owner(), attempts + 1, now, event_key)
+                )
+                records.append(JobRecord(self, event_key, json.loads(job), self._outputs(conn, event_key), attempts + 1, resumed=True))
+        if records:
+            logger.info(f"Claimed {len(records)} interrupted job(s) to resume.")
+        return records
+
+    def save_stage(self, event_key, stage, output):
+        with self._transaction() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO stages (event_key, stage, output, completed_at) VALUES (?, ?, ?, ?)',
+                (event_key, stage, json.dumps(output), time.time())
+            )
+            conn.execute('UPDATE jobs SET updated_at = ? WHERE event_key = ?', (time.time(), event_key))
+        logger.info(f"Checkpointed stage '{stage}' for job {event_key}.")
+
+    def retry(self, record, error=None):
+        """
+        Keeps a failed job claimed by this process for another attempt, unless it has
+        used up JOB_MAX_ATTEMPTS. While it waits, other processes leave it alone as
+        running; if this process dies first, claim_stale() resumes it.
+
+        Returns:
+            JobRecord or None: The job for its next attempt, marked as resumed, or
+                None if it has no attempts left.
+        """
+        if record.attempts >= JOB_MAX_ATTEMPTS:
+            return None
+        with self._transaction() as conn:
+            conn.execute(
+                'UPDATE jobs SET attempts = ?, error = ?, updated_at = ? WHERE event_key = ?',
+                (record.attempts + 1, error, time.time(), record.event_key)
+            )
+        logger.info(f"Retrying job {record.event_key} at stage '{record.next_stage}' (attempt {record.attempts + 1}).")
+        return JobRecord(self, record.event_key, record.job, record.outputs, record.attempts + 1, resumed=True)
+
+    def finish(self, record, success, error=None):
+        """
+        Marks a job as done or failed. A finished job's artifacts are deleted
+        straight away; a failed job keeps them for its next attempt.
+        """
+        with self._transaction() as conn:
+            conn.execute(
+                'UPDATE jobs SET status = ?, owner = NULL, error = ?, updated_at = ? WHERE event_key = ?',
+                ('done' if success else 'failed', error, time.time(), record.event_key)
+            )
+        if success:
+            shutil.rmtree(record.artifact_dir, ignore_errors=True)
+
+    def collect_garbage(self, retention_seconds=JOB_RETENTION_SECONDS):
+        """
+        Deletes finished and failed jobs older than the retention period, their
+        artifacts, and artifact directories that no longer belong to any job.
+
+        Returns:
+            int: The number of jobs deleted.
+        """
+        cutoff = time.time() - retention_seconds
+        with self._transaction() as conn:
+            expired = [row[0] for row in conn.execute(
+                "SELECT event_key FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?", (cutoff,)
+            )]
+            conn.executemany('DELETE FROM stages WHERE event_key = ?', [(key,) for key in expired])
+            conn.executemany('DELETE FROM jobs WHERE event_key = ?', [(key,) for key in expired])
+            kept = {
+                os.path.basename(self.artifact_path(row[0]))
+                for row in conn.execute("SELECT event_key FROM jobs WHERE status != 'done'")
+            }
+        if os.path.isdir(self.artifact_dir):
+            for name in os.listdir(self.artifact_dir):
+                path = os.path.join(self.artifact_dir, name)
+                try:
+                    # Recent directories may belong to a job that is being created right now
+                    orphaned = name not in kept and os.path.getmtime(path) < cutoff
+                except FileNotFoundError:
+                    continue
+                if orphaned:
+                    shutil.rmtree(path, ignore_errors=True)
+        if expired:
+            logger.info(f"Deleted {len(expired)} expired job record(s).")
+        return len(expired)
@@ -0,0 +1,313 @@
+# metrics.py
+
+import os
+import time
+import logging
+import resource
+import threading
+from contextlib import contextmanager
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+logger = logging.getLogger(__name__)
+
+# How often the resident set size is sampled while jobs are running
+RSS_SAMPLE_INTERVAL_SECONDS = float(os.getenv('RSS_SAMPLE_INTERVAL_SECONDS', '0.5'))
+
+# Set by gunicorn deployments with several workers so /metrics aggregates all of them
+PROMETHEUS_MULTIPROC_DIR = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+
+# How often each worker writes its rate limiter, connection and scratch counters to
+# the multiprocess directory, since a scrape is served by only one of the workers
+RUNTIME_PUBLISH_INTERVAL_SECONDS = float(os.getenv('RUNTIME_PUBLISH_INTERVAL_SECONDS', '15'))
+
+STAGE_SECONDS = Histogram(
+    'zoomtoslack_stage_duration_seconds',
+    'Latency of each pipeline stage.',
+    ['stage', 'outcome'],
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200, 2400)
+)
+JOB_SECONDS = Histogram(
+    'zoomtoslack_job_duration_seconds',
+    'End-to-end latency of a recording job.',
+    ['outcome'],
+    buckets=(5, 15, 30, 60, 120, 300, 600, 1200, 2400, 3600)
+)
+JOB_PEAK_RSS_BYTES = Histogram(
+    'zoomtoslack_job_peak_rss_bytes',
+    'Peak resident set size of the worker process while a job ran.',
+    buckets=tuple(mb * 1024 * 1024 for mb in (64, 128, 256, 384, 512, 768, 1024, 2048))
+)
+DOWNLOADED_BYTES = Counter('zoomtoslack_downloaded_bytes_total', 'Bytes of recordings downloaded.')
+AUDIO_SECONDS = Counter('zoomtoslack_audio_seconds_total', 'Seconds of audio sent to Whisper.')
+OPENAI_TOKENS = Counter('zoomtoslack_openai_tokens_total', 'OpenAI tokens used.', ['model', 'kind'])
+RETRIES = Counter('zoomtoslack_retries_total', 'Retried calls to external services.', ['operation'])
+JOBS_IN_PROGRESS = Gauge('zoomtoslack_jobs_in_progress', 'Recording jobs currently running.', multiprocess_mode='livesum')
+
+@contextmanager
+def track_stage(stage):
+    """
+    Times a pipeline stage into STAGE_SECONDS. A stage that raises is recorded
+    with outcome 'error'.
+
+    Yields:
+        dict: Set 'outcome' to 'failed' when the stage returns without a result.
+    """
+    state = {'outcome': 'ok'}
+    started_at = time.perf_counter()
+    try:
+        yield state
+    except BaseException:
+        state['outcome'] = 'error'
+        raise
+    finally:
+        STAGE_SECONDS.labels(stage, state['outcome']).observe(time.perf_counter() - started_at)
+
+def record_retry(operation):
+    """
+    Returns:
+        callable: A tenacity before_sleep callback that counts retries of an operation.
+    """
+    counter = RETRIES.labels(operation)
+    return lambda retry_state: counter.inc()
+
+def record_usage(model, usage):
+    """
+    Counts the prompt and completion tokens of an OpenAI response's usage.
+    """
+    if usage is None:
+        return
+    OPENAI_TOKENS.labels(model, 'prompt').inc(getattr(usage, 'prompt_tokens', 0) or 0)
+    OPENAI_TOKENS.labels(model, 'completion').inc(getattr(usage, 'completion_tokens', 0) or 0)
+
+def current_rss_bytes():
+    """
+    Returns:
+        int: The resident set size of this process, or its lifetime peak where
+            /proc is not available.
+    """
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+class _RssSampler:
+    """
+    Samples the process RSS in one background thread while any job is running and
+    keeps the peak seen during each job. Jobs that overlap share the process, so
+    each one's peak includes the memory of the others.
+    """
+
+    def __init__(self, interval=RSS_SAMPLE_INTERVAL_SECONDS):
+        self.interval = interval
+        self._active = []
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _run(self):
+        while True:
+            rss = current_rss_bytes()
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+                for peak in self._active:
+                    peak[0] = max(peak[0], rss)
+            time.sleep(self.interval)
+
+    @contextmanager
+    def track(self):
+        peak = [current_rss_bytes()]
+        with self._lock:
+            self._active.append(peak)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+                self._thread.start()
+        try:
+            yield peak
+        finally:
+            with self._lock:
+                self._active.remove(peak)
+            peak[0] = max(peak[0], current_rss_bytes())
+
+_rss_sampler = _RssSampler()
+
+@contextmanager
+def track_job():
+    """
+    Times a whole recording job and records the process's peak RSS while it ran.
+
+    Yields:
+        dict: Set 'outcome' to 'failed' when the job does not post its summary.
+    """
+    state = {'outcome': 'ok'}
+    started_at = time.perf_counter()
+    JOBS_IN_PROGRESS.inc()
+    try:
+        with _rss_sampler.track() as peak:
+            yield state
+    except BaseException:
+        state['outcome'] = 'error'
+        raise
+    finally:
+        JOBS_IN_PROGRESS.dec()
+        JOB_SECONDS.labels(state['outcome']).observe(time.perf_counter() - started_at)
+        JOB_PEAK_RSS_BYTES.observe(peak[0])
+
+class _RuntimeCollector:
+    """
+    Exposes the rate limiter, connection pool and scratch space counters, which
+    are kept in their own modules, when /metrics is scraped.
+    """
+
+    def describe(self):
+        # Lets the collector register without importing those modules at import time
+        return []
+
+    def collect(self):
+        import rate_limiter
+        from http_utils import connection_stats
+        from scratch_space import scratch_space
+
+        waits = CounterMetricFamily('zoomtoslack_rate_limit_wait_seconds', 'Time spent waiting on rate limiters.', labels=['bucket'])
+        limited = CounterMetricFamily('zoomtoslack_rate_limited', 'Calls rejected by a provider for rate limiting.', labels=['bucket'])
+        rate = GaugeMetricFamily('zoomtoslack_rate_limit_per_minute', 'Current adaptive request rate.', labels=['bucket'])
+        for name, stats in rate_limiter.snapshot().items():
+            waits.add_metric([name], stats['total_wait_seconds'])
+            limited.add_metric([name], stats['rate_limited'])
+            rate.add_metric([name], stats['rate_per_minute'])
+
+        requests = CounterMetricFamily('zoomtoslack_http_requests', 'Outbound HTTP requests.', labels=['host'])
+        connections = CounterMetricFamily('zoomtoslack_http_connections', 'Outbound HTTP connections opened.', labels=['host'])
+        for host, stats in connection_stats.snapshot().items():
+            requests.add_metric([host or ''], stats['requests'])
+            connections.add_metric([host or ''], stats['connections'])
+
+        usage = scratch_space.usage()
+        scratch = [
+            GaugeMetricFamily('zoomtoslack_scratch_used_bytes', 'Bytes held in scratch files.', value=usage['used_bytes']),
+            GaugeMetricFamily('zoomtoslack_scratch_quota_bytes', 'Scratch space quota.', value=usage['quota_bytes']),
+            GaugeMetricFamily('zoomtoslack_scratch_files', 'Open scratch files.', value=usage['files']),
+            GaugeMetricFamily('zoomtoslack_scratch_waiting', 'Downloads waiting for scratch quota.', value=usage['waiting'])
+        ]
+        if usage['disk_free_bytes'] is not None:
+            scratch.append(GaugeMetricFamily('zoomtoslack_scratch_disk_free_bytes', 'Free space on the scratch disk.', value=usage['disk_free_bytes']))
+        return [waits, limited, rate, requests, connections] + scratch
+
+class _RuntimePublisher:
+    """
+    Multiprocess counterpart of _RuntimeCollector. A custom collector only sees the
+    process serving the scrape, so each worker instead copies its runtime counters
+    into multiprocess metrics: counters advance by what grew since the last
+    publish and sum across workers, gauges are kept per live process.
+    """
+
+    def __init__(self, interval=RUNTIME_PUBLISH_INTERVAL_SECONDS):
+        self.interval = interval
+        self.rate_limit_wait_seconds = Counter('zoomtoslack_rate_limit_wait_seconds', 'Time spent waiting on rate limiters.', ['bucket'])
+        self.rate_limited = Counter('zoomtoslack_rate_limited', 'Calls rejected by a provider for rate limiting.', ['bucket'])
+        self.rate_per_minute = Gauge('zoomtoslack_rate_limit_per_minute', 'Current adaptive request rate.', ['bucket'], multiprocess_mode='liveall')
+        self.http_requests = Counter('zoomtoslack_http_requests', 'Outbound HTTP requests.', ['host'])
+        self.http_connections = Counter('zoomtoslack_http_connections', 'Outbound HTTP connections opened.', ['host'])
+        self.scratch_used_bytes = Gauge('zoomtoslack_scratch_used_bytes', 'Bytes held in scratch files.', multiprocess_mode='livesum')
+        self.scratch_quota_bytes = Gauge('zoomtoslack_scratch_quota_bytes', 'Scratch space quota.', multiprocess_mode='livesum')
+        self.scratch_files = Gauge('zoomtoslack_scratch_files', 'Open scratch files.', multiprocess_mode='livesum')
+        self.scratch_waiting = Gauge('zoomtoslack_scratch_waiting', 'Downloads waiting for scratch quota.', multiprocess_mode='livesum')
+        self.scratch_disk_free_bytes = Gauge('zoomtoslack_scratch_disk_free_bytes', 'Free space on the scratch disk.', multiprocess_mode='livemax')
+        self._published = {}
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def _advance(self, counter, label, value):
+        key = (counter._name, label)
+        delta = value - self._published.get(key, 0)
+        if delta > 0:
+            counter.labels(label).inc(delta)
+        self._published[key] = value
+
+    def publish(self):
+        """
+        Writes this process's current runtime counters to the multiprocess metrics.
+        """
+        import rate_limiter
+        from http_utils import connection_stats
+        from scratch_space import scratch_space
+
+        with self._lock:
+            for name, stats in rate_limiter.snapshot().items():
+                self._advance(self.rate_limit_wait_seconds, name, stats['total_wait_seconds'])
+                self._advance(self.rate_limited, name, stats['rate_limited'])
+                self.rate_per_minute.labels(name).set(stats['rate_per_minute'])
+
+            for host, stats in connection_stats.snapshot().items():
+                self._advance(self.http_requests, host or '', stats['requests'])
+                self._advance(self.http_connections, host or '', stats['connections'])
+
+            usage = scratch_space.usage()
+            self.scratch_used_bytes.set(usage['used_bytes'])
+            self.scratch_quota_bytes.set(usage['quota_bytes'])
+            self.scratch_files.set(usage['files'])
+            self.scratch_waiting.set(usage['waiting'])
+            if usage['disk_free_bytes'] is not None:
+                self.scratch_disk_free_bytes.set(usage['disk_free_bytes'])
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.publish()
+            except Exception as e:
+                logger.warning(f"Failed to publish runtime metrics: {e}")
+
+    def start(self):
+        """
+        Starts publishing in the background, once per worker process.
+        """
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        threading.Thread(target=self._run, name="runtime-metrics", daemon=True).start()
+
+    def _reset_after_fork(self):
+        # The parent's publishing thread and lock do not survive the fork
+        self._lock = threading.Lock()
+        self._pid = None
+
+if PROMETHEUS_MULTIPROC_DIR:
+    _runtime_publisher = _RuntimePublisher()
+    os.register_at_fork(after_in_child=_runtime_publisher._reset_after_fork)
+else:
+    _runtime_publisher = None
+    REGISTRY.register(_RuntimeCollector())
+
+def start_runtime_publisher():
+    """
+    Keeps this worker's runtime counters current in /metrics when several gunicorn
+    workers share a multiprocess directory. Does nothing in a single process, where
+    they are collected when /metrics is scraped.
+    """
+    if _runtime_publisher is not None:
+        _runtime_publisher.start()
+
+def render():
+    """
+    Returns:
+        tuple: (body bytes, content type) of the Prometheus text exposition.
+    """
+    if PROMETHEUS_MULTIPROC_DIR:
+        _runtime_publisher.publish()
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -2,61 +2,488 @@
 
 import os
 import logging
-from openai import OpenAI, APIConnectionError, APIStatusError, RateLimitError
+import threading
 import json
 import re
-
-# Configure logging
-LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
-logging.basicConfig(
-    level=LOG_LEVEL,
-    format='%(asctime)s %(levelname)s %(name)s %(message)s',
-    handlers=[
-        logging.StreamHandler()
-    ]
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from audio_utils import (
+    TRANSCODE_AUDIO,
+    TRANSCODE_FORMAT,
+    TRIM_SILENCE,
+    ffmpeg_available,
+    probe_duration,
+    extract_segment,
+    transcode_audio,
+    transcode_extension,
+    detect_speech_spans,
+    build_offset_map,
+    to_original_time
 )
+from http_utils import build_httpx_client
+import rate_limiter
+import metrics
+from rate_limiter import parse_duration
+from content_store import ContentStore, sha256_file, sha256_text
+from scratch_space import scratch_space
+from zoom_utils import RecordingBuffer
+
 logger = logging.getLogger(__name__)
 
-# Ensure OpenAI API key is set
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
-if not OPENAI_API_KEY:
-    logger.error("OPENAI_API_KEY is not set in environment variables.")
-    raise EnvironmentError("OPENAI_API_KEY is required.")
 
-# Instantiate the OpenAI client
-openai_client = OpenAI(
-    api_key=OPENAI_API_KEY
-)
+def _api_errors():
+    """
+    Returns:
+        tuple: The OpenAI API exception types, imported only once an error is handled.
+    """
+    from openai import APIConnectionError, APIStatusError, RateLimitError
+    return (APIConnectionError, RateLimitError, APIStatusError)
+
+def _openai_retry_after(error):
+    from openai import RateLimitError
+    if not isinstance(error, RateLimitError):
+        return False
+    return parse_duration(error.response.headers.get('retry-after'))
+
+def _estimated_chat_tokens(messages, max_tokens):
+    # What a chat completion counts against the token quota: its prompt and the completion it may use
+    return sum(count_tokens(message.get('content') or '') for message in messages) + (max_tokens or 0)
 
-def transcribe_audio(file_path):
+def _rate_limited(tier, fn, *args, **kwargs):
     """
-    Transcribes audio using OpenAI's Whisper API.
+    Calls an OpenAI endpoint through the shared rate limiter for its tier. Chat
+    completions also wait for their estimated tokens on the 'chat_tokens' bucket,
+    since for GPT-4 the token-per-minute quota usually binds before the request one.
+    """
+    if tier == 'chat':
+        rate_limiter.get_bucket('openai', 'chat_tokens').acquire(
+            _estimated_chat_tokens(kwargs.get('messages', []), kwargs.get('max_tokens'))
+        )
+    return rate_limiter.call('openai', tier, _openai_retry_after, fn, *args, **kwargs)
+
+def _update_rate_limits(response):
+    """
+    Adapts the OpenAI rate-limit buckets to the x-ratelimit-remaining-* and
+    x-ratelimit-reset-* headers of each response: the request quota of every tier,
+    and the token quota of chat completions.
+    """
+    path = response.request.url.path
+    tier = 'audio' if '/audio/' in path else 'embeddings' if path.endswith('/embeddings') else 'chat'
+    quotas = {'requests': tier}
+    if tier == 'chat':
+        quotas['tokens'] = 'chat_tokens'
+    for quota, bucket_tier in quotas.items():
+        remaining = response.headers.get(f'x-ratelimit-remaining-{quota}')
+        if remaining is not None and remaining.isdigit():
+            rate_limiter.get_bucket('openai', bucket_tier).update(
+                int(remaining),
+                parse_duration(response.headers.get(f'x-ratelimit-reset-{quota}'))
+            )
+
+# Per-request timeout for OpenAI calls; Whisper uploads can take minutes
+OPENAI_TIMEOUT = float(os.getenv('OPENAI_TIMEOUT', '600'))
+
+# Built on first use by get_openai_client(); the openai package is slow to import
+openai_client = None
+_openai_client_lock = threading.Lock()
+
+def get_openai_client():
+    """
+    Returns the OpenAI client on the shared pooled HTTP layer, building it on first use.
+
+    Raises:
+        EnvironmentError: If OPENAI_API_KEY is not set.
+    """
+    global openai_client
+    if openai_client is None:
+        with _openai_client_lock:
+            if openai_client is None:
+                if not OPENAI_API_KEY:
+                    logger.error("OPENAI_API_KEY is not set in environment variables.")
+                    raise EnvironmentError("OPENAI_API_KEY is required.")
+                from openai import OpenAI
+                openai_client = OpenAI(
+                    api_key=OPENAI_API_KEY,
+                    timeout=OPENAI_TIMEOUT,
+                    http_client=build_httpx_client(response_hooks=[_update_rate_limits])
+                )
+    return openai_client
+
+def _reset_openai_client():
+    # A forked worker must not share the parent's pooled connections
+    global openai_client, _openai_client_lock
+    openai_client = None
+    _openai_client_lock = threading.Lock()
+
+os.register_at_fork(after_in_child=_reset_openai_client)
+
+# Whisper rejects uploads above 25 MB
+WHISPER_MAX_FILE_BYTES = int(os.getenv('WHISPER_MAX_FILE_BYTES', str(25 * 1024 * 1024)))
+# Channel routing: embedding model, shortlist size and the similarity needed to skip the LLM
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'text-embedding-3-small')
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', '512'))
+ROUTING_TOP_K = int(os.getenv('ROUTING_TOP_K', '5'))
+ROUTING_MIN_SCORE = float(os.getenv('ROUTING_MIN_SCORE', '0.5'))
+ROUTING_CONFIDENT_MARGIN = float(os.getenv('ROUTING_CONFIDENT_MARGIN', '0.1'))
+# Bump when the summary prompts change so cached summaries are not reused
+SUMMARY_PROMPT_VERSION = "1"
+# Summarization token budgets: model context, completion size, per-chunk input and parallelism
+SUMMARY_CONTEXT_TOKENS = int(os.getenv('SUMMARY_CONTEXT_TOKENS', '8192'))
+SUMMARY_MAX_TOKENS = int(os.getenv('SUMMARY_MAX_TOKENS', '1500'))
+SUMMARY_CHUNK_TOKENS = int(os.getenv('SUMMARY_CHUNK_TOKENS', '5000'))
+SUMMARY_CHUNK_MAX_TOKENS = int(os.getenv('SUMMARY_CHUNK_MAX_TOKENS', '800'))
+SUMMARY_MAX_WORKERS = int(os.getenv('SUMMARY_MAX_WORKERS', '4'))
+# Chunked transcription settings
+TRANSCRIBE_SEGMENT_SECONDS = float(os.getenv('TRANSCRIBE_SEGMENT_SECONDS', '600'))
+TRANSCRIBE_OVERLAP_SECONDS = float(os.getenv('TRANSCRIBE_OVERLAP_SECONDS', '5'))
+TRANSCRIBE_MAX_WORKERS = int(os.getenv('TRANSCRIBE_MAX_WORKERS', '4'))
+
+# Cache of transcripts keyed by recording hash and summaries keyed by transcript hash
+content_store = ContentStore()
+
+def _transcribe_file(source):
+    """
+    Sends one audio file to Whisper and returns its timestamped segments.
     
     Parameters:
-        file_path (str): The path to the audio file to transcribe.
+        source (str or RecordingBuffer): The path to the audio file, or an in-memory recording
+            that is uploaded directly without copying.
     
     Returns:
-        str: The transcribed text or an empty string if transcription fails.
+        list of dict: Segments with 'start' and 'end' (seconds) and 'text'.
+    """
+    def send():
+        # Reopened or rewound on every attempt, since a rate-limited upload consumes the file
+        if isinstance(source, str):
+            with open(source, "rb") as audio_file:
+                return _create_transcription(audio_file)
+        return _create_transcription((source.filename, source.open_for_read()))
+
+    transcript_response = _rate_limited('audio', send)
+    metrics.AUDIO_SECONDS.inc(getattr(transcript_response, 'duration', None) or 0)
+    segments = getattr(transcript_response, 'segments', None)
+    if not segments:
+        text = (transcript_response.text or "").strip()
+        return [{'start': 0.0, 'end': 0.0, 'text': text}] if text else []
+    return [
+        {'start': float(segment.start), 'end': float(segment.end), 'text': segment.text.strip()}
+        for segment in segments
+        if segment.text.strip()
+    ]
+
+def _create_transcription(file):
+    return get_openai_client().audio.transcriptions.create(
+        file=file,
+        model="whisper-1",  # Specify the appropriate model
+        response_format="verbose_json",
+        timestamp_granularities=["segment"]
+    )
+
+def _transcribe_chunk(file_path, chunk_start, chunk_length):
     """
+    Extracts one chunk of the recording, transcribes it and shifts its timestamps.
+    """
+    chunk_path = extract_segment(file_path, chunk_start, chunk_length)
+    if not chunk_path:
+        raise RuntimeError(f"Could not extract audio chunk at {chunk_start:.0f}s.")
     try:
-        with open(file_path, "rb") as audio_file:
-            transcript_response = openai_client.audio.transcriptions.create(
-                file=audio_file,
-                model="whisper-1"  # Specify the appropriate model
-            )
-        transcript = transcript_response.text
+        segments = _transcribe_file(chunk_path)
+    finally:
+        scratch_space.release(chunk_path)
+    for segment in segments:
+        segment['start'] += chunk_start
+        segment['end'] += chunk_start
+    return segments
+
+def stitch_segments(chunk_results, segment_seconds, overlap_seconds):
+    """
+    Merges per-chunk segments into one ordered list without the overlap duplicates.
+    Each overlap is cut at its midpoint: a segment is kept only by the chunk whose
+    window contains the segment's midpoint.
+    
+    Parameters:
+        chunk_results (list of list of dict): Segments per chunk, in chunk order, with absolute timestamps.
+        segment_seconds (float): The chunk stride in seconds.
+        overlap_seconds (float): The overlap between consecutive chunks in seconds.
+    
+    Returns:
+        list of dict: The stitched segments in time order.
+    """
+    stitched = []
+    last_index = len(chunk_results) - 1
+    for index, segments in enumerate(chunk_results):
+        lower = index * segment_seconds + overlap_seconds / 2 if index > 0 else float('-inf')
+        upper = (index + 1) * segment_seconds + overlap_seconds / 2 if index < last_index else float('inf')
+        for segment in segments:
+            midpoint = (segment['start'] + segment['end']) / 2
+            if lower <= midpoint < upper:
+                stitched.append(segment)
+    stitched.sort(key=lambda segment: segment['start'])
+    return stitched
+
+def format_timestamp(seconds):
+    """
+    Formats a number of seconds as HH:MM:SS.
+    """
+    seconds = int(max(0, seconds))
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+def format_transcript(segments):
+    """
+    Renders transcript segments as one '[HH:MM:SS] text' line per segment, or
+    '[HH:MM:SS] Speaker: text' for segments that name their speaker.
+    
+    Parameters:
+        segments (list of dict): Segments with 'start' and 'text', and optionally 'speaker'.
+    
+    Returns:
+        str: The timestamped transcript.
+    """
+    return "\n".join(
+        f"[{format_timestamp(segment['start'])}] {segment['speaker'] + ': ' if segment.get('speaker') else ''}{segment['text']}"
+        for segment in segments
+    )
+
+def _ffmpeg_inputs(source):
+    """
+    Yields the ways ffmpeg can read a recording, as callables returning its input
+    arguments, since a piped stream has to be rewound for every run. In-memory
+    recordings are piped through stdin first; MP4s with their index at the end
+    cannot be read from a pipe, so the recording is then spilled to a file.
+    """
+    if isinstance(source, str):
+        yield lambda: {'input_path': source}
+        return
+    if source.path is None:
+        yield lambda: {'input_stream': source.open_for_read()}
+        source.rollover()
+    yield lambda: {'input_path': source.path}
+
+def _transcode(source):
+    """
+    Converts a recording to mono 16 kHz audio with ffmpeg before it is uploaded,
+    cutting out long silences when TRIM_SILENCE is set. The result stays in memory
+    while it fits in one Whisper request.
+
+    Returns:
+        tuple: (RecordingBuffer, offset map) of the transcoded audio, where the offset
+            map is None if nothing was cut, or (None, None) if transcoding is disabled,
+            ffmpeg is unavailable or it fails.
+    """
+    if not TRANSCODE_AUDIO or not ffmpeg_available():
+        return None, None
+    source_size = os.path.getsize(source) if isinstance(source, str) else source.size
+    for input_args in _ffmpeg_inputs(source):
+        spans = None
+        if TRIM_SILENCE:
+            with metrics.track_stage('detect_silence') as stage:
+                spans = detect_speech_spans(**input_args())
+                if spans is None:
+                    stage['outcome'] = 'failed'
+            if spans is not None and (not spans or spans == [(0.0, None)]):
+                # Nothing to cut, or no speech found at all; transcribe everything
+                spans = None
+
+        with metrics.track_stage('transcode') as stage:
+            output = RecordingBuffer(transcode_extension(), max_memory_bytes=WHISPER_MAX_FILE_BYTES)
+            if not transcode_audio(output, spans=spans, **input_args()) or output.size == 0:
+                stage['outcome'] = 'failed'
+                output.close()
+                continue
+
+        output.flush()
+        offset_map = build_offset_map(spans) if spans else None
+        kept = f", keeping {len(spans)} non-silent spans" if spans else ""
+        logger.info(f"Transcoded {source_size} byte recording to {output.size} bytes of mono 16 kHz {TRANSCODE_FORMAT}{kept}.")
+        return output, offset_map
+
+    logger.warning("Transcoding failed; transcribing the original recording.")
+    return None, None
+
+def restore_timestamps(segments, offset_map):
+    """
+    Moves segment timestamps from silence-trimmed audio back to the original recording's
+    time, so transcript lines and the summary topics that cite them match the recording.
+
+    Parameters:
+        segments (list of dict): Segments with 'start' and 'end' in trimmed time.
+        offset_map (list of tuple): The map returned by build_offset_map.
+
+    Returns:
+        list of dict: The segments with original timestamps.
+    """
+    for segment in segments:
+        segment['start'] = to_original_time(offset_map, segment['start'])
+        segment['end'] = max(segment['start'], to_original_time(offset_map, segment['end'], is_end=True))
+    return segments
+
+def _transcribe_source(source):
+    """
+    Transcribes a recording, splitting it into parallel chunks when it is too large or long.
+    """
+    if not isinstance(source, str):
+        if source.path is None and source.size <= WHISPER_MAX_FILE_BYTES:
+            segments = _transcribe_file(source)
+            logger.info("Transcription successful.")
+            return segments
+        # Large recordings need a file on disk for ffmpeg to split
+        source.rollover()
+        source = source.path
+
+    file_path = source
+    file_size = os.path.getsize(file_path)
+    duration = probe_duration(file_path) if ffmpeg_available() else None
+    if not duration or (file_size <= WHISPER_MAX_FILE_BYTES and duration <= TRANSCRIBE_SEGMENT_SECONDS):
+        if file_size > WHISPER_MAX_FILE_BYTES:
+            logger.warning(f"Recording is {file_size} bytes but ffmpeg is unavailable to split it; sending it whole.")
+        segments = _transcribe_file(file_path)
         logger.info("Transcription successful.")
-        return transcript
-    except (APIConnectionError, RateLimitError, APIStatusError) as api_err:
+        return segments
+
+    chunk_starts = []
+    chunk_start = 0.0
+    while chunk_start < duration:
+        chunk_starts.append(chunk_start)
+        chunk_start += TRANSCRIBE_SEGMENT_SECONDS
+    chunk_length = TRANSCRIBE_SEGMENT_SECONDS + TRANSCRIBE_OVERLAP_SECONDS
+    logger.info(f"Transcribing {duration:.0f}s recording in {len(chunk_starts)} chunks with up to {TRANSCRIBE_MAX_WORKERS} workers.")
+
+    with ThreadPoolExecutor(max_workers=max(1, min(TRANSCRIBE_MAX_WORKERS, len(chunk_starts)))) as executor:
+        chunk_results = list(executor.map(
+            lambda start: _transcribe_chunk(file_path, start, chunk_length),
+            chunk_starts
+        ))
+
+    segments = stitch_segments(chunk_results, TRANSCRIBE_SEGMENT_SECONDS, TRANSCRIBE_OVERLAP_SECONDS)
+    logger.info("Transcription successful.")
+    return segments
+
+def transcribe_audio_segments(source):
+    """
+    Transcribes audio using OpenAI's Whisper API and returns timestamped segments.
+    Recordings that exceed Whisper's upload limit or the configured segment length
+    are split into overlapping chunks that are transcribed in parallel. When ffmpeg is
+    available the audio is first transcoded to mono 16 kHz, which usually fits a whole
+    meeting in one request, and long silences are cut out with their timestamps
+    mapped back to the original recording. Results are cached by the SHA-256 of the
+    recording, so the same media is transcribed once.
+    
+    Parameters:
+        source (str or RecordingBuffer): The path to the audio file to transcribe, or a
+            streamed recording. Recordings still held in memory are uploaded in a single call.
+    
+    Returns:
+        list of dict or None: Segments with 'start', 'end' and 'text', empty if the
+            recording has no speech, or None if transcription fails.
+    """
+    try:
+        content_hash = sha256_file(source) if isinstance(source, str) else source.sha256
+        cached = content_store.get('transcripts', content_hash)
+        if cached is not None:
+            logger.info(f"Using cached transcript for recording {content_hash}.")
+            return json.loads(cached)
+
+        transcoded, offset_map = _transcode(source)
+        try:
+            segments = _transcribe_source(transcoded or source)
+        finally:
+            if transcoded is not None:
+                transcoded.close()
+        if offset_map:
+            segments = restore_timestamps(segments, offset_map)
+        if segments:
+            content_store.put('transcripts', content_hash, json.dumps(segments))
+        return segments
+    except _api_errors() as api_err:
         logger.error(f"API error during transcription: {api_err}")
-        return ""
+        return None
     except Exception as e:
         logger.exception(f"Unexpected error during transcription: {e}")
-        return ""
+        return None
+
+def transcribe_audio(source):
+    """
+    Transcribes audio using OpenAI's Whisper API.
+    
+    Parameters:
+        source (str or RecordingBuffer): The path to the audio file to transcribe, or a streamed recording.
+    
+    Returns:
+        str: The transcript as '[HH:MM:SS] text' lines, or an empty string if transcription fails.
+    """
+    return format_transcript(transcribe_audio_segments(source) or [])
+
+def embed_texts(texts):
+    """
+    Embeds texts with OpenAI's embeddings API, in batches.
+    
+    Parameters:
+        texts (list of str): The texts to embed.
+    
+    Returns:
+        list of list of float: One embedding per text, in input order.
+    """
+    vectors = []
+    for start in range(0, len(texts), EMBEDDING_BATCH_SIZE):
+        response = _rate_limited('embeddings', get_openai_client().embeddings.create,
+            model=EMBEDDING_MODEL,
+            input=texts[start:start + EMBEDDING_BATCH_SIZE]
+        )
+        metrics.record_usage(EMBEDDING_MODEL, response.usage)
+        vectors.extend(item.embedding for item in sorted(response.data, key=lambda item: item.index))
+    return vectors
+
+# Built on first use by get_channel_index(), which loads numpy and the persisted index
+channel_index = None
+_channel_index_lock = threading.Lock()
+
+def get_channel_index():
+    """
+    Returns:
+        ChannelIndex: The channel embedding index, loaded on first use.
+    """
+    global channel_index
+    if channel_index is None:
+        with _channel_index_lock:
+            if channel_index is None:
+                from channel_index import ChannelIndex
+                channel_index = ChannelIndex(embed_texts, model=EMBEDDING_MODEL)
+    return channel_index
+
+def rank_channel_candidates(meeting_topic, meeting_summary, public_channels):
+    """
+    Ranks channels against the meeting by cosine similarity of their embeddings.
+    
+    Parameters:
+        meeting_topic (str): The topic of the meeting.
+        meeting_summary (dict): The meeting summary overview.
+        public_channels (list of dict): List of public channels with 'name', 'topic', and 'id'.
+    
+    Returns:
+        list of tuple or None: Up to ROUTING_TOP_K (channel, score) pairs, best first,
+            or None if the embedding index is unavailable.
+    """
+    if not public_channels:
+        # Slack returns no channels when listing them fails; the index is left as it is
+        return []
+    try:
+        get_channel_index().sync(public_channels)
+        query = f"{meeting_topic}\n{meeting_summary.get('summary_overview', '')}"
+        query_vector = embed_texts([query])[0]
+        return get_channel_index().search(query_vector, ROUTING_TOP_K)
+    except _api_errors() as api_err:
+        logger.error(f"API error while ranking Slack channels; using all channels: {api_err}")
+        return None
+    except Exception as e:
+        logger.exception(f"Unexpected error while ranking Slack channels; using all channels: {e}")
+        return None
 
 def determine_slack_channel(meeting_topic, meeting_summary, public_channels):
     """
-    Determines the appropriate Slack channel to post the meeting summary to using OpenAI's ChatCompletion API.
+    Determines the appropriate Slack channel to post the meeting summary to.
+    Channels are shortlisted by embedding similarity; a clear winner is returned
+    directly and otherwise OpenAI's ChatCompletion API picks among the shortlist.
     
     Parameters:
         meeting_topic (str): The topic of the meeting.
@@ -67,8 +494,25 @@ def determine_slack_channel(meeting_topic, meeting_summary, public_channels):
         str or None: The Slack channel ID (e.g., 'C012AB3CD'), or None if no suitable channel is found.
     """
     try:
+        # Shortlist channels by embedding similarity instead of sending every channel to GPT-4
+        candidates = rank_channel_candidates(meeting_topic, meeting_summary, public_channels)
+        if candidates is None:
+            candidates = [(channel, None) for channel in public_channels]
+        elif not candidates:
+            logger.info("No Slack channels available for routing.")
+            return None
+        elif candidates[0][1] >= ROUTING_MIN_SCORE and (
+            len(candidates) == 1 or candidates[0][1] - candidates[1][1] >= ROUTING_CONFIDENT_MARGIN
+        ):
+            channel, score = candidates[0]
+            logger.info(f"Routed to Slack channel '{channel['name']}' ({channel['id']}) by similarity {score:.3f} without LLM.")
+            return channel['id']
+
         # Prepare channel data for OpenAI prompt
-        channel_info = "\n".join([f"- Name: {channel['name']}, Topic: {channel['topic']}" for channel in public_channels])
+        channel_info = "\n".join([
+            f"- ID: {channel['id']}, Name: {channel['name']}, Topic: {channel['topic']}"
+            for channel, _ in candidates
+        ])
         
         prompt = (
             "Based on the meeting topic and summary overview, determine the most appropriate Slack channel ID to post the meeting summary to.\n\n"
@@ -82,7 +526,7 @@ def determine_slack_channel(meeting_topic, meeting_summary, public_channels):
             "- If no suitable channel exists, respond with 'None'.\n\n"
         )
         
-        response = openai_client.chat.completions.create(
+        response = _rate_limited('chat', get_openai_client().chat.completions.create,
             model="gpt-4",
             messages=[
                 {"role": "system", "content": "You are a helpful assistant that categorizes information into Slack channels based on relevance."},
@@ -93,6 +537,7 @@ def determine_slack_channel(meeting_topic, meeting_summary, public_channels):
             n=1,
             stop=["\n"]
         )
+        metrics.record_usage("gpt-4", response.usage)
         logger.info(f"Raw response from GPT4 matching: {response}")
         channel_id_raw = response.choices[0].message.content.strip()
         
@@ -116,16 +561,207 @@ def determine_slack_channel(meeting_topic, meeting_summary, public_channels):
             else:
                 logger.warning(f"Unexpected response format from OpenAI: '{channel_id_raw}'")
                 return None
-    except (APIConnectionError, RateLimitError, APIStatusError) as api_err:
+    except _api_errors() as api_err:
         logger.error(f"API error during Slack channel determination: {api_err}")
         return None
     except Exception as e:
         logger.exception(f"Unexpected error during Slack channel determination: {e}")
         return None
 
+def count_tokens(text):
+    """
+    Counts GPT-4 tokens with tiktoken, or estimates them at four characters per
+    token if the encoding cannot be loaded.
+    
+    Parameters:
+        text (str): The text to count.
+    
+    Returns:
+        int: The number of tokens.
+    """
+    encoding = _get_encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    try:
+        import tiktoken
+        return tiktoken.encoding_for_model("gpt-4")
+    except Exception as e:
+        logger.warning(f"Could not load the tiktoken encoding; estimating token counts: {e}")
+        return None
+
+def split_transcript(transcript, max_tokens):
+    """
+    Splits a transcript into chunks of at most max_tokens, breaking only between
+    segment lines. A single line longer than the budget is split between words.
+    
+    Parameters:
+        transcript (str): The transcript, one segment per line.
+        max_tokens (int): The token budget per chunk.
+    
+    Returns:
+        list of str: The transcript chunks, in order.
+    """
+    pieces = []
+    for line in transcript.splitlines():
+        if count_tokens(line) <= max_tokens:
+            pieces.append(line)
+            continue
+        words, current = line.split(" "), []
+        for word in words:
+            if current and count_tokens(" ".join(current + [word])) > max_tokens:
+                pieces.append(" ".join(current))
+                current = []
+            current.append(word)
+        if current:
+            pieces.append(" ".join(current))
+
+    chunks, current, current_tokens = [], [], 0
+    for piece in pieces:
+        piece_tokens = count_tokens(piece) + 1  # Account for the newline
+        if current and current_tokens + piece_tokens > max_tokens:
+            chunks.append("\n".join(current))
+            current, current_tokens = [], 0
+        current.append(piece)
+        current_tokens += piece_tokens
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+def _complete_json(prompt, system_prompt, max_tokens, temperature):
+    """
+    Runs a chat completion and parses the reply as JSON.
+    
+    Raises:
+        json.JSONDecodeError: If the reply is not valid JSON.
+    """
+    response = _rate_limited('chat', get_openai_client().chat.completions.create,
+        model="gpt-4",
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt}
+        ],
+        max_tokens=max_tokens,
+        temperature=temperature,
+        n=1,
+        stop=None
+    )
+    metrics.record_usage("gpt-4", response.usage)
+    summary_text = response.choices[0].message.content.strip()
+    try:
+        return json.loads(summary_text)
+    except json.JSONDecodeError:
+        logger.debug(f"Summary text: {summary_text}")
+        raise
+
+# JSON shape shared by the partial and combined summaries of a long transcript
+PARTIAL_SUMMARY_FORMAT = (
+    "{\n"
+    "  \"summary_overview\": \"\",\n"
+    "  \"main_topics\": [\n"
+    "    {\"topic\": \"\", \"timestamp\": \"\"},\n"
+    "    ...\n"
+    "  ],\n"
+    "  \"action_items\": [\n"
+    "    {\"action_item\": \"\", \"responsible\": \"\"},\n"
+    "    ...\n"
+    "  ]\n"
+    "}"
+)
+
+def _summarize_chunk(chunk, part_number, part_count):
+    prompt = (
+        f"Below is part {part_number} of {part_count} of a meeting transcript. "
+        "Each line starts with its [HH:MM:SS] timestamp in the recording.\n\n"
+        "Summarize only this part in the following JSON format, using the transcript timestamps for the topics:\n\n"
+        f"{PARTIAL_SUMMARY_FORMAT}\n\n"
+        "Transcript part:\n"
+        f"{chunk}\n\n"
+        "Please ensure the JSON structure is followed precisely."
+    )
+    return _complete_json(
+        prompt,
+        "You are a helpful assistant that summarizes meeting transcripts.",
+        SUMMARY_CHUNK_MAX_TOKENS,
+        0.3
+    )
+
+def _truncate_summary(summary, max_tokens):
+    """
+    Shortens a partial summary to at most max_tokens of JSON by dropping topics and
+    action items from the end of the longer list, then cutting the overview.
+    """
+    if not isinstance(summary, dict):
+        return summary
+    summary = json.loads(json.dumps(summary))
+    while count_tokens(json.dumps(summary, indent=1)) > max_tokens:
+        lists = [summary[key] for key in ('main_topics', 'action_items') if isinstance(summary.get(key), list) and summary[key]]
+        if lists:
+            max(lists, key=len).pop()
+            continue
+        overview = summary.get('summary_overview')
+        if not isinstance(overview, str) or not overview:
+            break
+        summary['summary_overview'] = overview[:len(overview) // 2]
+    return summary
+
+def _reduce_summaries(partials):
+    """
+    Combines partial summaries into one, reducing in groups when they do not fit in one prompt.
+    Two summaries that still do not fit together are each truncated to half the budget.
+    """
+    if len(partials) == 1:
+        return partials[0]
+
+    def build_prompt(group):
+        return (
+            "Below are summaries of consecutive parts of one meeting, in order.\n\n"
+            "Combine them into a single summary of the whole meeting in the following JSON format. "
+            "Merge duplicate topics and action items and keep the original timestamps:\n\n"
+            f"{PARTIAL_SUMMARY_FORMAT}\n\n"
+            "Part summaries:\n"
+            f"{json.dumps(group, indent=1)}\n\n"
+            "Please ensure the JSON structure is followed precisely."
+        )
+
+    prompt = build_prompt(partials)
+    if count_tokens(prompt) + SUMMARY_MAX_TOKENS > SUMMARY_CONTEXT_TOKENS:
+        if len(partials) > 2:
+            middle = len(partials) // 2
+            return _reduce_summaries([_reduce_summaries(partials[:middle]), _reduce_summaries(partials[middle:])])
+        # A pair cannot be split any further, so each summary is cut to its share of the budget
+        budget = (SUMMARY_CONTEXT_TOKENS - SUMMARY_MAX_TOKENS - count_tokens(build_prompt([]))) // len(partials)
+        prompt = build_prompt([_truncate_summary(partial, budget) for partial in partials])
+    return _complete_json(
+        prompt,
+        "You are a helpful assistant that summarizes meeting transcripts.",
+        SUMMARY_MAX_TOKENS,
+        0.3
+    )
+
+def _map_reduce_summary(transcript):
+    """
+    Summarizes a transcript that does not fit in one prompt: the transcript is split
+    on segment boundaries, the chunks are summarized in parallel and the partial
+    summaries are combined into the 'meeting_summary' shape.
+    """
+    chunks = split_transcript(transcript, SUMMARY_CHUNK_TOKENS)
+    logger.info(f"Transcript exceeds the context budget; summarizing {len(chunks)} chunks with up to {SUMMARY_MAX_WORKERS} workers.")
+    with ThreadPoolExecutor(max_workers=max(1, min(SUMMARY_MAX_WORKERS, len(chunks)))) as executor:
+        partials = list(executor.map(
+            lambda numbered: _summarize_chunk(numbered[1], numbered[0] + 1, len(chunks)),
+            enumerate(chunks)
+        ))
+    return {"meeting_summary": _reduce_summaries(partials)}
+
 def generate_summary(transcript, meeting_title, host_email, meeting_id, meeting_date, meeting_time, duration):
     """
     Generates a structured summary from the transcript using OpenAI's ChatCompletion API.
+    Transcripts that do not fit in the model's context are summarized with map-reduce.
+    Results are cached by transcript hash and SUMMARY_PROMPT_VERSION.
     
     Parameters:
         transcript (str): The transcribed meeting audio.
@@ -171,21 +807,22 @@ def generate_summary(transcript, meeting_title, host_email, meeting_id, meeting_
             f"{transcript}\n\n"
             "Please ensure the JSON structure is followed precisely."
         )
-        response = openai_client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant that summarizes meeting transcripts."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=1500,
-            temperature=0.3,
-            n=1,
-            stop=None
-        )
-        summary_text = response.choices[0].message.content.strip()
-
-        # Parse the JSON response
-        summary_json = json.loads(summary_text)
+        summary_key = sha256_text(f"{SUMMARY_PROMPT_VERSION}:{transcript}")
+        cached = content_store.get('summaries', summary_key)
+        if cached is not None:
+            logger.info(f"Using cached summary for transcript {summary_key}.")
+            summary_json = json.loads(cached)
+        else:
+            if count_tokens(prompt) + SUMMARY_MAX_TOKENS <= SUMMARY_CONTEXT_TOKENS:
+                summary_json = _complete_json(
+                    prompt,
+                    "You are a helpful assistant that summarizes meeting transcripts.",
+                    SUMMARY_MAX_TOKENS,
+                    0.3
+                )
+            else:
+                summary_json = _map_reduce_summary(transcript)
+            content_store.put('summaries', summary_key, json.dumps(summary_json))
 
         # Add meeting details
         summary_json['meeting_details'] = {
@@ -200,9 +837,8 @@ def generate_summary(transcript, meeting_title, host_email, meeting_id, meeting_
         return summary_json
     except json.JSONDecodeError as json_err:
         logger.error(f"JSON decode error during summary parsing: {json_err}")
-        logger.debug(f"Summary text: {summary_text}")
         return {}
-    except (APIConnectionError, RateLimitError, APIStatusError) as api_err:
+    except _api_errors() as api_err:
         logger.error(f"API error during summary generation: {api_err}")
         return {}
     except Exception as e:
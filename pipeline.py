@@ -0,0 +1,509 @@
+# pipeline.py
+
+import os
+import time
+import shutil
+import hashlib
+import logging
+import threading
+import contextvars
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import metrics
+from scratch_space import scratch_space
+from zoom_utils import (
+    download_recording,
+    stream_recording,
+    download_transcript,
+    parse_vtt,
+    is_transcript_file,
+    select_recording_file,
+    select_recording_segments,
+    get_meeting_recordings,
+    get_valid_zoom_access_token,
+    RECORDING_SPOOL_MAX_BYTES
+)
+from slack_utils import get_all_public_channels, ensure_default_channel_exists, join_slack_channel, post_to_slack
+from openai_utils import (
+    transcribe_audio_segments,
+    format_transcript,
+    generate_summary,
+    determine_slack_channel
+)
+
+logger = logging.getLogger(__name__)
+
+# Define the default Slack channel name
+DEFAULT_CHANNEL_NAME = "bot-lost-meeting-recordings"
+
+# Stream recordings into memory (spilling large ones to disk) instead of always writing a temp file
+RECORDING_STREAMING = os.getenv('RECORDING_STREAMING', 'true').lower() == 'true'
+
+# Recording segments of one meeting that are downloaded and transcribed at once
+RECORDING_SEGMENT_WORKERS = int(os.getenv('RECORDING_SEGMENT_WORKERS', '3'))
+
+# For accounts with Zoom cloud transcription, whose transcripts are usually ready some
+# minutes after recording.completed: how long a meeting without one waits for it before
+# using Whisper, and how often Zoom is asked in the meantime. Off by default, since every
+# meeting of an account without cloud transcription would wait it out. A waiting job is
+# requeued between checks and holds no worker.
+ZOOM_TRANSCRIPT_WAIT_SECONDS = float(os.getenv('ZOOM_TRANSCRIPT_WAIT_SECONDS', '0'))
+ZOOM_TRANSCRIPT_POLL_SECONDS = float(os.getenv('ZOOM_TRANSCRIPT_POLL_SECONDS', '60'))
+
+# Serializes the download checkpoints of segments that finish at the same time
+_checkpoint_lock = threading.Lock()
+
+def recording_segments(job):
+    """
+    Returns:
+        list of dict: The recording file of each segment of the job's meeting. Jobs
+            recorded before segments were supported carry a single 'recording_file'.
+    """
+    return job.get('recording_files') or [job['recording_file']]
+
+def release_recording(recording):
+    """
+    Deletes a downloaded recording, given as a file path or a RecordingBuffer.
+    """
+    if not isinstance(recording, str):
+        recording.close()
+        return
+    scratch_space.release(recording)
+
+def _segment_key(recording_file):
+    return str(recording_file.get('id') or recording_file['download_url'])
+
+def _is_checkpointed(recording, record):
+    return record is not None and isinstance(recording, str) and os.path.dirname(recording) == record.artifact_dir
+
+def _segment_checkpoint(record, field, segment_key):
+    return ((record.output('downloaded') if record else None) or {}).get(field, {}).get(segment_key)
+
+def _checkpoint_segment(record, field, segment_key, value):
+    """
+    Adds one recording segment's progress to the job's 'downloaded' checkpoint, which
+    holds each segment's file under 'paths' and, once it is transcribed, its
+    transcript under 'transcripts', so a retry only redoes the segments that failed.
+    """
+    with _checkpoint_lock:
+        downloaded = dict(record.output('downloaded') or {})
+        downloaded[field] = {**downloaded.get(field, {}), segment_key: value}
+        record.complete('downloaded', downloaded)
+
+def format_slack_message(meeting_summary):
+    """
+    Renders the structured meeting summary as a Slack message.
+
+    Parameters:
+        meeting_summary (dict): The structured summary with meeting, share and summary details.
+
+    Returns:
+        str: The message content to post.
+    """
+    summary = meeting_summary.get('meeting_summary', {})
+    recording_summary = (
+        f"*Meeting Title & Basic Details:*\n"
+        f"- **Title:** {meeting_summary['meeting_details']['title']}\n"
+        f"- **Date & Time:** {meeting_summary['meeting_details']['date_time']}\n"
+        f"- **Host Email:** {meeting_summary['meeting_details']['host_email']}\n"
+        f"- **Meeting ID:** {meeting_summary['meeting_details']['meeting_id']}\n\n"
+        f"*Share Details:*\n"
+        f"- **Play URL:** {meeting_summary['share_details']['play_url']}\n"
+        f"- **Password:** {meeting_summary['share_details']['password']}\n\n"
+        f"*Meeting Summary:*\n"
+        f"- **Brief Overview:** {summary.get('summary_overview', 'No overview available.')}\n"
+        f"- **Main Topics Discussed:**\n"
+    )
+
+    # Add main topics
+    for topic in summary.get('main_topics', []):
+        recording_summary += f"  - **{topic['topic']}** (Timestamp: {topic['timestamp']})\n"
+
+    # Add action items
+    recording_summary += "\n- **Action Items:**\n"
+    for action in summary.get('action_items', []):
+        recording_summary += f"  - **{action['action_item']}** (Responsible: {action['responsible']})\n"
+
+    return recording_summary
+
+def fetch_recording(recording_file, download_token, record=None):
+    """
+    Downloads a recording. Small recordings are streamed into memory; large ones are
+    fetched to disk as parallel, resumable byte ranges. With a job record, an on-disk
+    download is moved into the job's artifact directory and checkpointed so that a
+    retry does not fetch it again.
+
+    Returns:
+        str or RecordingBuffer or None: The recording, or None if the download failed.
+    """
+    segment_key = _segment_key(recording_file)
+    checkpointed = _segment_checkpoint(record, 'paths', segment_key)
+    if checkpointed and os.path.exists(checkpointed):
+        logger.info(f"Using checkpointed download at {checkpointed}.")
+        return checkpointed
+
+    recording_url = recording_file['download_url']
+    file_extension = recording_file.get('file_extension', recording_file.get('file_type', '')).lower()
+    file_size = recording_file.get('file_size')
+    with metrics.track_stage('download') as stage:
+        if RECORDING_STREAMING and (not file_size or file_size <= RECORDING_SPOOL_MAX_BYTES):
+            recording = stream_recording(recording_url, download_token, file_extension=file_extension)
+        else:
+            recording = download_recording(recording_url, download_token, file_extension=file_extension, file_size=file_size)
+        if not recording:
+            stage['outcome'] = 'failed'
+            return None
+    metrics.DOWNLOADED_BYTES.inc(os.path.getsize(recording) if isinstance(recording, str) else recording.size)
+
+    # In-memory recordings are small and cheap to fetch again, so only files are checkpointed
+    if record and isinstance(recording, str):
+        os.makedirs(record.artifact_dir, exist_ok=True)
+        name = hashlib.sha256(segment_key.encode('utf-8')).hexdigest()[:16]
+        path = os.path.join(record.artifact_dir, f"recording-{name}{os.path.splitext(recording)[1]}")
+        # Its scratch quota stays reserved until the job ends, since the file still uses the disk
+        shutil.move(recording, path)
+        _checkpoint_segment(record, 'paths', segment_key, path)
+        recording = path
+    return recording
+
+def _fetch_zoom_transcript(recording_file, download_token):
+    """
+    Downloads and parses a Zoom transcript or closed caption file.
+
+    Returns:
+        list of dict: The speaker-attributed segments, or an empty list if it cannot be used.
+    """
+    with metrics.track_stage('zoom_transcript') as stage:
+        try:
+            vtt = download_transcript(recording_file['download_url'], download_token)
+        except Exception as e:
+            logger.error(f"Failed to download Zoom transcript: {e}")
+            vtt = None
+        segments = parse_vtt(vtt) if vtt else []
+        if not segments:
+            stage['outcome'] = 'failed'
+    return segments
+
+def _transcribe_segment(recording_file, recording_files, download_token, record):
+    """
+    Transcribes one recording segment, from Zoom's own transcript when one was
+    selected, and otherwise by downloading its audio and sending it to Whisper.
+    With a job record, the transcript is checkpointed per segment and the segment's
+    download is deleted once it is no longer needed.
+
+    Parameters:
+        recording_file (dict): The file selected for the segment.
+        recording_files (list of dict): All the meeting's files. The segment's audio is
+            picked from these if its Zoom transcript cannot be used.
+
+    Returns:
+        list of dict or None: The segment's transcript segments, empty if it has no
+            speech, or None if it could not be downloaded or transcribed.
+    """
+    segment_key = _segment_key(recording_file)
+    checkpointed = _segment_checkpoint(record, 'transcripts', segment_key)
+    if checkpointed is not None:
+        logger.info(f"Using checkpointed transcript of recording segment {segment_key}.")
+        return checkpointed
+    segments = _fetch_segment_transcript(recording_file, recording_files, download_token, record)
+    if record and segments is not None:
+        _checkpoint_segment(record, 'transcripts', segment_key, segments)
+    return segments
+
+def _fetch_segment_transcript(recording_file, recording_files, download_token, record):
+    if is_transcript_file(recording_file):
+        segments = _fetch_zoom_transcript(recording_file, download_token)
+        if segments:
+            logger.info(f"Using Zoom {recording_file['file_type']} file with {len(segments)} cues; skipping Whisper.")
+            return segments
+        recording_file = select_recording_file([
+            candidate for candidate in recording_files
+            if candidate.get('recording_start') == recording_file.get('recording_start')
+        ])
+        if not recording_file:
+            logger.error("Zoom transcript could not be used and there is no audio to transcribe instead.")
+            return None
+        logger.warning("Zoom transcript could not be used; transcribing the audio with Whisper.")
+
+    recording = fetch_recording(recording_file, download_token, record)
+    if not recording:
+        return None
+    segments = None
+    try:
+        with metrics.track_stage('transcribe') as stage:
+            segments = transcribe_audio_segments(recording)
+            if segments is None:
+                stage['outcome'] = 'failed'
+    finally:
+        # A checkpointed download is kept for a retry while its segment has no transcript
+        if segments is not None or not _is_checkpointed(recording, record):
+            release_recording(recording)
+    return segments
+
+def _parse_recording_start(recording_file):
+    try:
+        return datetime.fromisoformat(recording_file['recording_start'].replace('Z', '+00:00'))
+    except (KeyError, AttributeError, ValueError):
+        return None
+
+def merge_segment_transcripts(recording_files, results):
+    """
+    Merges the transcripts of a meeting's recording segments into one. Each segment's
+    timestamps are shifted by its 'recording_start' offset from the first segment, so
+    they read as time since the meeting recording began.
+
+    Parameters:
+        recording_files (list of dict): The segments, in 'recording_start' order.
+        results (list of list of dict): The transcript segments of each recording segment.
+
+    Returns:
+        list of dict: The merged transcript segments.
+    """
+    first_start = _parse_recording_start(recording_files[0]) if recording_files else None
+    merged = []
+    for recording_file, segments in zip(recording_files, results):
+        recording_start = _parse_recording_start(recording_file)
+        offset = (recording_start - first_start).total_seconds() if recording_start and first_start else 0.0
+        for segment in segments or []:
+            merged.append({**segment, 'start': segment['start'] + offset, 'end': segment['end'] + offset})
+    return merged
+
+def transcribe_recording_segments(recording_files, download_token, record=None, all_files=None):
+    """
+    Transcribes every segment of a meeting in parallel, up to RECORDING_SEGMENT_WORKERS
+    at once.
+
+    Parameters:
+        recording_files (list of dict): The file selected for each segment.
+        download_token (str): The token for downloading the files.
+        record (JobRecord, optional): Durable job record for download checkpoints.
+        all_files (list of dict, optional): All the meeting's files, for falling back
+            from a Zoom transcript to the audio.
+
+    Returns:
+        list: Each segment's transcript segments, in order; None for a segment that
+            could not be downloaded or transcribed.
+    """
+    workers = max(1, min(RECORDING_SEGMENT_WORKERS, len(recording_files)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Each task runs in a copy of this context so its scratch files join the job's scope
+        futures = [
+            executor.submit(
+                contextvars.copy_context().run,
+                _transcribe_segment, recording_file, all_files or recording_files, download_token, record
+            )
+            for recording_file in recording_files
+        ]
+        return [future.result() for future in futures]
+
+def zoom_transcript_delay(job, record=None):
+    """
+    Asks Zoom once whether each segment of a webhook job's meeting has a cloud
+    transcript yet, for up to ZOOM_TRANSCRIPT_WAIT_SECONDS after the webhook was
+    received. When they all do, or the wait is over, the job is switched to the
+    meeting's current files so it uses whatever transcripts exist. The caller
+    requeues a job that should keep waiting rather than sleeping in a worker.
+
+    Parameters:
+        job (dict): The job, updated in place once it stops waiting.
+        record (JobRecord, optional): Durable job record; a job whose transcript is
+            already checkpointed does not wait.
+
+    Returns:
+        float: Seconds until the job should ask again, or 0 to run it now.
+    """
+    if ZOOM_TRANSCRIPT_WAIT_SECONDS <= 0 or not job.get('received_at'):
+        return 0
+    if (record and record.output('transcribed')) or any(is_transcript_file(recording_file) for recording_file in recording_segments(job)):
+        return 0
+    meeting_uuid = job['recording_info'].get('uuid')
+    remaining = job['received_at'] + ZOOM_TRANSCRIPT_WAIT_SECONDS - time.time()
+    with metrics.track_stage('await_transcript') as stage:
+        try:
+            recording_files = get_meeting_recordings(meeting_uuid).get('recording_files', [])
+        except Exception as e:
+            logger.warning(f"Failed to check for a Zoom transcript: {e}")
+            recording_files = []
+        segment_files = select_recording_segments(recording_files)
+        transcripts = [recording_file for recording_file in segment_files if is_transcript_file(recording_file)]
+        if remaining > 0 and (not transcripts or len(transcripts) < len(segment_files)):
+            stage['outcome'] = 'waiting'
+            delay = min(ZOOM_TRANSCRIPT_POLL_SECONDS, remaining)
+            logger.info(f"Zoom's transcript of meeting {meeting_uuid} is not ready; checking again in {delay:.0f}s.")
+            return delay
+        if not transcripts:
+            stage['outcome'] = 'failed'
+            logger.info(f"No Zoom transcript of meeting {meeting_uuid} arrived in time; using Whisper.")
+            return 0
+
+    # Files listed by the API are downloaded with the account's own token
+    download_token = get_valid_zoom_access_token()
+    job['recording_info'] = {**job['recording_info'], 'recording_files': recording_files}
+    job['recording_files'] = segment_files
+    job['download_token'] = download_token
+    logger.info(f"Using Zoom's transcript for {len(transcripts)} of {len(segment_files)} segments of meeting {meeting_uuid}.")
+    return 0
+
+def process_recording(job, record=None):
+    """
+    Runs the download -> transcribe -> summarize -> route -> post pipeline for one recording.
+
+    Parameters:
+        job (dict): Contains 'recording_info' (the webhook payload object),
+            'recording_files' (the selected entry of each recording segment), 'download_token'
+            and, for webhook jobs, 'received_at', from which zoom_transcript_delay times
+            their wait for a Zoom transcript.
+        record (JobRecord, optional): Durable job record. Each completed stage is
+            checkpointed to it, and stages it already holds are skipped.
+
+    Returns:
+        bool: True if the summary was posted to Slack, False otherwise.
+    """
+    # Scratch files the job leaves behind are deleted on every exit path
+    with metrics.track_job() as tracked, scratch_space.scope():
+        success = _run_pipeline(job, record)
+        if not success:
+            tracked['outcome'] = 'failed'
+    return success
+
+def _run_pipeline(job, record):
+    recording_info = job['recording_info']
+    recording_files = recording_segments(job)
+    recording_url = recording_files[0]['download_url']
+    download_token = job['download_token']
+
+    meeting_topic = recording_info.get('topic', 'No topic')
+    meeting_id = str(recording_info.get('id'))  # Ensure it's string
+    host_email = recording_info.get('host_email', 'No host email provided')
+
+    logger.info(f"Processing recording for Meeting ID: {meeting_id}")
+
+    # Additional Meeting Details
+    start_time = recording_info.get('start_time', 'Unknown DateTime')
+    if 'T' in start_time and 'Z' in start_time:
+        meeting_date = start_time.split('T')[0]
+        meeting_time = start_time.split('T')[1].split('Z')[0]
+    else:
+        meeting_date = "Unknown Date"
+        meeting_time = "Unknown Time"
+
+    duration = recording_info.get('duration', 'Unknown Duration')
+
+    if record and record.output('posted') is not None:
+        logger.info(f"Meeting ID {meeting_id} was already posted; nothing to do.")
+        return True
+
+    transcribed = record.output('transcribed') if record else None
+    if transcribed:
+        transcript = transcribed['transcript']
+    else:
+        all_files = recording_info.get('recording_files', [])
+        # Transcribe every recording segment, from Zoom's transcript where there is one
+        results = transcribe_recording_segments(recording_files, download_token, record, all_files)
+        if any(segments is None for segments in results):
+            # The retry redoes only the segments without a checkpointed transcript
+            logger.error("Failed to download or transcribe a recording segment.")
+            return False
+        transcript = format_transcript(merge_segment_transcripts(recording_files, results))
+        if transcript and record:
+            record.complete('transcribed', {'transcript': transcript})
+    if not transcript:
+        logger.warning("The recording has no speech to transcribe.")
+        transcript = "No transcription available."
+
+    # Generate summary using OpenAI
+    summarized = record.output('summarized') if record else None
+    if summarized:
+        meeting_summary = summarized['meeting_summary']
+    else:
+        with metrics.track_stage('summarize') as stage:
+            meeting_summary = generate_summary(
+                transcript=transcript,
+                meeting_title=meeting_topic,
+                host_email=host_email,
+                meeting_id=meeting_id,
+                meeting_date=meeting_date,
+                meeting_time=meeting_time,
+                duration=duration
+            )
+            if not meeting_summary:
+                stage['outcome'] = 'failed'
+        if meeting_summary and record:
+            record.complete('summarized', {'meeting_summary': meeting_summary})
+    if not meeting_summary:
+        logger.warning("Summary generation failed.")
+        meeting_summary = {
+            "meeting_details": {
+                "title": meeting_topic,
+                "date_time": f"{meeting_date} at {meeting_time}",
+                "host_email": host_email,
+                "meeting_id": meeting_id,
+                "duration": duration
+            },
+            "share_details": {
+                "play_url": "No play URL available.",
+                "password": "No password available."
+            },
+            "meeting_summary": {
+                "summary_overview": "No overview available.",
+                "main_topics": [],
+                "action_items": []
+            }
+        }
+
+    # Incorporate Share Details (Play URL and Password)
+    share_details = {
+        "play_url": recording_info.get('share_url', recording_url),
+        "password": recording_info.get('recording_play_passcode', 'No password available.')
+    }
+
+    # Update share_details in meeting_summary
+    meeting_summary['share_details'] = share_details
+
+    routed = record.output('routed') if record else None
+    if routed:
+        slack_channel_id = routed['channel_id']
+    else:
+        # Fetch all public channels from Slack
+        with metrics.track_stage('list_channels'):
+            public_channels = get_all_public_channels()
+
+        # Determine Slack channel using OpenAI
+        with metrics.track_stage('route') as stage:
+            slack_channel_id = determine_slack_channel(meeting_topic, meeting_summary.get('meeting_summary', {}), public_channels)
+            if not slack_channel_id:
+                stage['outcome'] = 'failed'
+        if not slack_channel_id:
+            logger.warning(f"No suitable Slack channel found. Attempting to use default channel '{DEFAULT_CHANNEL_NAME}'.")
+            slack_channel_id = ensure_default_channel_exists(DEFAULT_CHANNEL_NAME)
+            if not slack_channel_id:
+                logger.error("Failed to find or create the default Slack channel. Cannot post the meeting summary.")
+                return False
+        if record:
+            record.complete('routed', {'channel_id': slack_channel_id})
+
+    # Join the Slack channel if not already a member
+    with metrics.track_stage('join') as stage:
+        joined = join_slack_channel(slack_channel_id)
+        if not joined:
+            stage['outcome'] = 'failed'
+    if not joined:
+        logger.error(f"Failed to join Slack channel ID '{slack_channel_id}'. Cannot post the meeting summary.")
+        return False
+
+    # Prepare the summary message using structured data
+    recording_summary = format_slack_message(meeting_summary)
+
+    # Post to Slack
+    with metrics.track_stage('post') as stage:
+        success = post_to_slack(slack_channel_id, recording_summary)
+        if not success:
+            stage['outcome'] = 'failed'
+    if success:
+        logger.info(f"Posted meeting summary to Slack channel ID '{slack_channel_id}'.")
+        if record:
+            record.complete('posted', {'channel_id': slack_channel_id})
+    else:
+        logger.error(f"Failed to post meeting summary to Slack channel ID '{slack_channel_id}'.")
+
+    return success
@@ -0,0 +1,207 @@
+# rate_limiter.py
+
+import os
+import re
+import time
+import logging
+import threading
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Default request rates per minute for each (provider, tier) bucket, and for
+# ('openai', 'chat_tokens') the GPT token rate. Override with
+# RATE_LIMIT_<PROVIDER>_<TIER>, e.g. RATE_LIMIT_SLACK_TIER2=20.
+DEFAULT_RATES_PER_MINUTE = {
+    ('openai', 'audio'): 50,
+    ('openai', 'chat'): 500,
+    ('openai', 'chat_tokens'): 150000,
+    ('openai', 'embeddings'): 3000,
+    ('slack', 'tier2'): 20,
+    ('slack', 'tier3'): 50,
+    ('slack', 'tier4'): 100,
+    ('slack', 'post'): 60,
+    ('zoom', 'light'): 1800,
+    ('zoom', 'medium'): 1200,
+    ('zoom', 'heavy'): 600,
+}
+# How often a call that is rejected for rate limiting is retried after waiting
+RATE_LIMIT_MAX_RETRIES = int(os.getenv('RATE_LIMIT_MAX_RETRIES', '5'))
+# Fallback wait when a rate-limit response has no Retry-After header
+RATE_LIMIT_DEFAULT_BACKOFF = float(os.getenv('RATE_LIMIT_DEFAULT_BACKOFF', '10'))
+
+def parse_duration(value):
+    """
+    Parses a rate-limit reset duration such as '20ms', '1s', '6m0s' or '30'.
+
+    Returns:
+        float or None: The duration in seconds, or None if it cannot be parsed.
+    """
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = re.findall(r'(\d+(?:\.\d+)?)(ms|h|m|s)', value)
+    if not parts:
+        return None
+    scale = {'h': 3600, 'm': 60, 's': 1, 'ms': 0.001}
+    return sum(float(number) * scale[unit] for number, unit in parts)
+
+class TokenBucket:
+    """
+    Token bucket that callers block on until a request slot is free.
+
+    The refill rate starts at the configured rate and adapts to the provider's
+    rate-limit headers: it slows down to spread the remaining quota over the time
+    until reset, and all callers pause until Retry-After has passed after a 429.
+    """
+
+    def __init__(self, name, rate_per_minute):
+        self.name = name
+        self.base_rate = rate_per_minute / 60.0
+        self.rate = self.base_rate
+        self.capacity = max(1.0, self.base_rate)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.waits = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.rate_limited = 0
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def acquire(self, cost=1):
+        """
+        Blocks until a request may be sent.
+
+        Parameters:
+            cost (float): Units the request uses, e.g. its estimated GPT tokens for a
+                token-rate bucket. A cost above the capacity waits for a full bucket
+                and leaves it in debt, so the requests after it wait longer.
+
+        Returns:
+            float: The number of seconds waited.
+        """
+        started_at = time.monotonic()
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self._blocked_until - now
+                if wait <= 0:
+                    needed = min(cost, self.capacity)
+                    if self._tokens >= needed:
+                        self._tokens -= cost
+                        break
+                    wait = (needed - self._tokens) / self.rate
+            time.sleep(wait)
+        waited = time.monotonic() - started_at
+        with self._lock:
+            self.calls += 1
+            if waited > 0.001:
+                self.waits += 1
+                self.total_wait_seconds += waited
+                self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        return waited
+
+    def penalize(self, retry_after):
+        """
+        Pauses the bucket after the provider rejected a request for rate limiting.
+
+        Parameters:
+            retry_after (float or None): Seconds from the Retry-After header.
+        """
+        retry_after = retry_after if retry_after is not None else RATE_LIMIT_DEFAULT_BACKOFF
+        with self._lock:
+            self.rate_limited += 1
+            self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+            self._tokens = 0
+        logger.warning(f"Rate limited on {self.name}; pausing for {retry_after:.1f}s.")
+
+    def update(self, remaining, reset_seconds):
+        """
+        Adapts the rate to the quota the provider reports.
+
+        Parameters:
+            remaining (int or None): Requests, or tokens, left in the current window.
+            reset_seconds (float or None): Seconds until the window resets.
+        """
+        if remaining is None:
+            return
+        with self._lock:
+            if reset_seconds and remaining < self.capacity:
+                self.rate = min(self.base_rate, max(self.base_rate / 100, remaining / reset_seconds))
+            else:
+                self.rate = self.base_rate
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'rate_per_minute': self.rate * 60,
+                'calls': self.calls,
+                'waits': self.waits,
+                'total_wait_seconds': self.total_wait_seconds,
+                'max_wait_seconds': self.max_wait_seconds,
+                'rate_limited': self.rate_limited,
+            }
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+def get_bucket(provider, tier):
+    """
+    Returns the shared bucket for a provider and endpoint tier, creating it on first use.
+    """
+    key = (provider, tier)
+    with _buckets_lock:
+        bucket = _buckets.get(key)
+        if bucket is None:
+            env_name = f"RATE_LIMIT_{provider.upper()}_{tier.upper()}"
+            rate = float(os.getenv(env_name, DEFAULT_RATES_PER_MINUTE.get(key, 60)))
+            bucket = TokenBucket(f"{provider}/{tier}", rate)
+            _buckets[key] = bucket
+        return bucket
+
+def call(provider, tier, retry_after, fn, *args, **kwargs):
+    """
+    Calls fn once the bucket has capacity. If fn fails because of rate limiting,
+    the bucket is paused for the Retry-After time and the call is retried.
+
+    Parameters:
+        provider (str): The API provider, e.g. 'openai'.
+        tier (str): The endpoint tier within the provider, e.g. 'chat'.
+        retry_after (callable): Maps an exception to its Retry-After seconds, or to
+            False if the exception is not a rate-limit error.
+        fn (callable): The API call.
+
+    Returns:
+        The result of fn.
+    """
+    bucket = get_bucket(provider, tier)
+    for attempt in range(RATE_LIMIT_MAX_RETRIES + 1):
+        bucket.acquire()
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            delay = retry_after(e)
+            if delay is False or attempt == RATE_LIMIT_MAX_RETRIES:
+                raise
+            bucket.penalize(delay)
+            metrics.RETRIES.labels(bucket.name).inc()
+
+def snapshot():
+    """
+    Returns:
+        dict: Maps each 'provider/tier' bucket to its rate and wait statistics.
+    """
+    with _buckets_lock:
+        buckets = list(_buckets.values())
+    return {bucket.name: bucket.snapshot() for bucket in buckets}
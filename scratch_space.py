@@ -0,0 +1,208 @@
+# scratch_space.py
+
+import os
+import time
+import shutil
+import logging
+import tempfile
+import threading
+import contextvars
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Directory for recordings and audio chunks while they are processed
+SCRATCH_DIR = os.getenv(
+    'SCRATCH_DIR',
+    os.path.join(tempfile.gettempdir(), 'zoomtoslack_scratch')
+)
+# Bytes of scratch files one worker process may hold at once
+SCRATCH_QUOTA_BYTES = int(os.getenv('SCRATCH_QUOTA_BYTES', str(2 * 1024 * 1024 * 1024)))
+# How long a new file waits for quota before giving up
+SCRATCH_WAIT_TIMEOUT_SECONDS = float(os.getenv('SCRATCH_WAIT_TIMEOUT_SECONDS', '900'))
+# Age after which a scratch file is swept even if its process may still be alive
+SCRATCH_STALE_SECONDS = float(os.getenv('SCRATCH_STALE_SECONDS', str(6 * 3600)))
+
+class ScratchSpaceExhausted(Exception):
+    """Raised when a scratch file cannot get quota within the wait timeout."""
+
+def _owner_pid(name):
+    try:
+        return int(name.split('-', 1)[0])
+    except ValueError:
+        return None
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class ScratchSpace:
+    """
+    Quota-bounded directory of temporary files.
+
+    Each file reserves its expected size when it is created, and create() blocks
+    while the reservations plus the actual sizes of the open files would exceed
+    the quota. Files created inside scope() are deleted when the scope exits,
+    however it exits. File names start with the owning PID so sweep_stale() can
+    tell files left behind by dead processes.
+    """
+
+    def __init__(self, root=SCRATCH_DIR, quota_bytes=SCRATCH_QUOTA_BYTES):
+        self.root = root
+        self.quota_bytes = quota_bytes
+        self._files = {}
+        self._condition = threading.Condition()
+        self._waiting = 0
+        self._scope = contextvars.ContextVar(f"scratch_scope_{id(self)}", default=None)
+
+    def _size(self, path, reserved):
+        try:
+            return max(reserved, os.path.getsize(path))
+        except OSError:
+            return reserved
+
+    def _used(self):
+        return sum(self._size(path, reserved) for path, reserved in self._files.items())
+
+    def create(self, suffix='', expected_bytes=0, timeout=SCRATCH_WAIT_TIMEOUT_SECONDS):
+        """
+        Creates an empty scratch file once the quota has room for it.
+
+        Parameters:
+            suffix (str): The file name suffix, e.g. '.mp4'.
+            expected_bytes (int): The size the file will grow to, if known.
+            timeout (float): Seconds to wait for quota.
+
+        Returns:
+            str: The path to the new file.
+
+        Raises:
+            ScratchSpaceExhausted: If the quota stays full for the whole timeout.
+        """
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            used = self._used()
+            # A file larger than the whole quota may still use the space on its own
+            while self._files and used + expected_bytes > self.quota_bytes:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise ScratchSpaceExhausted(
+                        f"Scratch quota of {self.quota_bytes} bytes is full ({used} used, {expected_bytes} needed)."
+                    )
+                logger.warning(f"Scratch space full ({used} of {self.quota_bytes} bytes); waiting for {expected_bytes} bytes.")
+                self._waiting += 1
+                try:
+                    # Rechecked periodically, since open files keep growing
+                    self._condition.wait(min(remaining, 5))
+                finally:
+                    self._waiting -= 1
+                used = self._used()
+
+            os.makedirs(self.root, exist_ok=True)
+            fd, path = tempfile.mkstemp(prefix=f"{os.getpid()}-", suffix=suffix, dir=self.root)
+            os.close(fd)
+            self._files[path] = expected_bytes
+        scope = self._scope.get()
+        if scope is not None:
+            scope.append(path)
+        return path
+
+    def release(self, path):
+        """
+        Deletes a file and frees its quota. Paths that are not scratch files, or
+        that were already moved or deleted, are handled the same way.
+        """
+        try:
+            os.remove(path)
+            logger.info(f"Removed temporary file: {path}")
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Failed to remove temporary file: {path}. Error: {e}")
+        with self._condition:
+            if self._files.pop(path, None) is not None:
+                self._condition.notify_all()
+
+    @contextmanager
+    def scope(self):
+        """
+        Deletes every file created in this context, in this thread, when it exits.
+        """
+        paths = []
+        token = self._scope.set(paths)
+        try:
+            yield
+        finally:
+            self._scope.reset(token)
+            for path in paths:
+                with self._condition:
+                    tracked = path in self._files
+                if tracked:
+                    self.release(path)
+
+    def sweep_stale(self, max_age_seconds=SCRATCH_STALE_SECONDS):
+        """
+        Deletes files left behind by processes that have exited, and files older
+        than max_age_seconds.
+
+        Returns:
+            int: The number of bytes freed.
+        """
+        if not os.path.isdir(self.root):
+            return 0
+        freed = 0
+        now = time.time()
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            with self._condition:
+                if path in self._files:
+                    continue
+            pid = _owner_pid(name)
+            try:
+                stat = os.stat(path)
+                stale = now - stat.st_mtime > max_age_seconds or pid is None or (pid != os.getpid() and not _pid_alive(pid))
+                if stale:
+                    os.remove(path)
+                    freed += stat.st_size
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                logger.warning(f"Failed to sweep scratch file {path}: {e}")
+        if freed:
+            logger.info(f"Swept {freed} bytes of stale scratch files from {self.root}.")
+        return freed
+
+    def usage(self):
+        """
+        Returns:
+            dict: 'files', 'used_bytes' and 'quota_bytes' of this process,
+                'waiting' (creates blocked on quota) and 'disk_free_bytes'.
+        """
+        with self._condition:
+            files, used, waiting = len(self._files), self._used(), self._waiting
+        try:
+            disk_free = shutil.disk_usage(self.root if os.path.isdir(self.root) else tempfile.gettempdir()).free
+        except OSError:
+            disk_free = None
+        return {
+            'files': files,
+            'used_bytes': used,
+            'quota_bytes': self.quota_bytes,
+            'waiting': waiting,
+            'disk_free_bytes': disk_free
+        }
+
+scratch_space = ScratchSpace()
+
+def _reset_after_fork():
+    # Files created by the parent are not this process's to release
+    scratch_space._files.clear()
+    scratch_space._condition = threading.Condition()
+    scratch_space._waiting = 0
+
+os.register_at_fork(after_in_child=_reset_after_fork)
@@ -1,65 +1,359 @@
 # slack_utils.py
 
+import io
 import os
+import time
 import logging
+import threading
+from email.message import Message
+from urllib.error import HTTPError
 from slack_sdk import WebClient
 from slack_sdk.errors import SlackApiError
+from http_utils import get_session, HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT
+import rate_limiter
+from rate_limiter import parse_duration
 
-# Configure logging
-LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
-logging.basicConfig(
-    level=LOG_LEVEL,
-    format='%(asctime)s %(levelname)s %(name)s %(message)s',
-    handlers=[
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
 SLACK_BOT_TOKEN = os.getenv('SLACK_BOT_TOKEN')
-if not SLACK_BOT_TOKEN:
-    logger.error("SLACK_BOT_TOKEN is not set in environment variables.")
-    raise EnvironmentError("SLACK_BOT_TOKEN is required.")
 
-client = WebClient(token=SLACK_BOT_TOKEN)
+# Slack rate-limit tier of each Web API method used here
+SLACK_METHOD_TIERS = {
+    'conversations.list': 'tier2',
+    'conversations.create': 'tier2',
+    'conversations.join': 'tier3',
+    'conversations.info': 'tier3',
+    'users.conversations': 'tier3',
+    'chat.postMessage': 'post',
+}
+
+def _slack_retry_after(error):
+    if not isinstance(error, SlackApiError) or error.response.get('error') != 'ratelimited':
+        return False
+    return parse_duration(error.response.headers.get('Retry-After'))
+
+class _CountingWebClient(WebClient):
+    """
+    WebClient that waits on the shared rate limiter for each method's tier and
+    sends its requests on the pooled keep-alive session for slack.com, which
+    records them in the shared connection stats. The stock sync client opens a
+    new urllib connection per call.
+    """
+
+    def api_call(self, api_method, **kwargs):
+        def send():
+            return super(_CountingWebClient, self).api_call(api_method, **kwargs)
+
+        tier = SLACK_METHOD_TIERS.get(api_method, 'tier3')
+        return rate_limiter.call('slack', tier, _slack_retry_after, send)
+
+    def _perform_urllib_http_request_internal(self, url, req):
+        # A custom proxy or SSL context keeps slack_sdk's own urllib path
+        if self.proxy is not None or self.ssl is not None or not url.lower().startswith('http'):
+            return super()._perform_urllib_http_request_internal(url, req)
+        response = get_session(SLACK_API_HOST).post(
+            url,
+            data=req.data,
+            headers=dict(req.header_items()),
+            timeout=(HTTP_CONNECT_TIMEOUT, self.timeout)
+        )
+        if response.status_code >= 400:
+            # slack_sdk reads error statuses, e.g. 429 with Retry-After, from urllib's HTTPError
+            headers = Message()
+            for name, value in response.headers.items():
+                headers[name] = value
+            raise HTTPError(url, response.status_code, response.reason, headers, io.BytesIO(response.content))
+        if response.headers.get('Content-Type', '').startswith('application/gzip'):
+            body = response.content
+        else:
+            body = response.content.decode(response.encoding or 'utf-8')
+        return {'status': response.status_code, 'headers': response.headers, 'body': body}
+
+SLACK_API_HOST = "slack.com"
+
+# Built on first use by get_slack_client()
+client = None
+_client_lock = threading.Lock()
+
+def get_slack_client():
+    """
+    Returns the Slack WebClient, building it on first use.
+
+    Raises:
+        EnvironmentError: If SLACK_BOT_TOKEN is not set.
+    """
+    global client
+    if client is None:
+        with _client_lock:
+            if client is None:
+                if not SLACK_BOT_TOKEN:
+                    logger.error("SLACK_BOT_TOKEN is not set in environment variables.")
+                    raise EnvironmentError("SLACK_BOT_TOKEN is required.")
+                client = _CountingWebClient(token=SLACK_BOT_TOKEN, timeout=int(HTTP_READ_TIMEOUT))
+    return client
+
+# How long the cached channel directory is served before it is refreshed
+CHANNEL_CACHE_TTL_SECONDS = int(os.getenv('CHANNEL_CACHE_TTL_SECONDS', '900'))
+
+def _normalize_channel(channel):
+    return {
+        'name': channel['name'].lower(),
+        'topic': channel.get('topic', {}).get('value', '').lower(),
+        'id': channel['id']
+    }
+
+def fetch_all_public_channels():
+    """
+    Pages through conversations_list and returns every public channel.
+    
+    Returns:
+        list of dict: Each dictionary contains 'name', 'topic', and 'id' of a channel.
+    
+    Raises:
+        SlackApiError: If a Slack API call fails.
+    """
+    channels = []
+    cursor = None
+    while True:
+        response = get_slack_client().conversations_list(
+            types="public_channel",
+            exclude_archived=True,
+            limit=1000,
+            cursor=cursor
+        )
+        for channel in response['channels']:
+            channels.append(_normalize_channel(channel))
+        cursor = response.get('response_metadata', {}).get('next_cursor')
+        if not cursor:
+            break
+    logger.info(f"Retrieved {len(channels)} public channels from Slack.")
+    return channels
+
+def fetch_channel(channel_id):
+    """
+    Fetches one channel with conversations_info.
+    
+    Returns:
+        dict: Slack's channel object.
+    
+    Raises:
+        SlackApiError: If the Slack API call fails.
+    """
+    return get_slack_client().conversations_info(channel=channel_id)['channel']
+
+class ChannelDirectory:
+    """
+    Cache of the workspace's public channels with O(1) lookup by name and ID.
+
+    The first read loads the directory synchronously. After the TTL expires, reads
+    keep returning the cached channels while a single background thread refreshes
+    them. Channel events update the cache in place between refreshes.
+    """
+
+    def __init__(self, fetch=fetch_all_public_channels, ttl_seconds=CHANNEL_CACHE_TTL_SECONDS, fetch_one=fetch_channel):
+        self.fetch = fetch
+        self.fetch_one = fetch_one
+        self.ttl_seconds = ttl_seconds
+        self._by_id = {}
+        self._by_name = {}
+        self._loaded_at = None
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """
+        Reloads every channel from Slack.
+        
+        Raises:
+            SlackApiError: If a Slack API call fails; the cached channels are kept.
+        """
+        channels = self.fetch()
+        by_id = {channel['id']: channel for channel in channels}
+        by_name = {channel['name']: channel for channel in channels}
+        with self._lock:
+            self._by_id = by_id
+            self._by_name = by_name
+            self._loaded_at = time.monotonic()
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.error(f"Background refresh of the Slack channel directory failed: {e}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def _ensure_fresh(self):
+        with self._lock:
+            loaded_at = self._loaded_at
+            stale = loaded_at is not None and time.monotonic() - loaded_at >= self.ttl_seconds
+            start_refresh = stale and not self._refreshing
+            if start_refresh:
+                self._refreshing = True
+        if loaded_at is None:
+            self.refresh()
+        elif start_refresh:
+            threading.Thread(target=self._refresh_in_background, name="channel-directory-refresh", daemon=True).start()
+
+    def channels(self):
+        """
+        Returns:
+            list of dict: The cached public channels.
+        """
+        self._ensure_fresh()
+        with self._lock:
+            return list(self._by_id.values())
+
+    def get_by_name(self, name):
+        """
+        Returns:
+            dict or None: The channel with the given (case-insensitive) name.
+        """
+        self._ensure_fresh()
+        with self._lock:
+            return self._by_name.get(name.lower())
+
+    def get_by_id(self, channel_id):
+        """
+        Returns:
+            dict or None: The channel with the given ID.
+        """
+        self._ensure_fresh()
+        with self._lock:
+            return self._by_id.get(channel_id)
+
+    def upsert(self, channel):
+        """
+        Adds or updates a channel, given in Slack's channel object format.
+        """
+        normalized = _normalize_channel(channel)
+        with self._lock:
+            previous = self._by_id.get(normalized['id'])
+            if previous:
+                self._by_name.pop(previous['name'], None)
+                if 'topic' not in channel:
+                    normalized['topic'] = previous['topic']
+            self._by_id[normalized['id']] = normalized
+            self._by_name[normalized['name']] = normalized
+
+    def mark_stale(self):
+        """
+        Makes the next read refresh the directory in the background.
+        """
+        with self._lock:
+            if self._loaded_at is not None:
+                self._loaded_at = time.monotonic() - self.ttl_seconds
+
+    def remove(self, channel_id):
+        """
+        Removes a channel from the cache.
+        """
+        with self._lock:
+            previous = self._by_id.pop(channel_id, None)
+            if previous:
+                self._by_name.pop(previous['name'], None)
+
+    def apply_event(self, event):
+        """
+        Applies a Slack Events API channel event to the cache.
+        
+        Parameters:
+            event (dict): The 'event' object of an event_callback.
+        """
+        event_type = event.get('type')
+        if event_type in ('channel_created', 'channel_rename'):
+            self.upsert(event['channel'])
+            logger.info(f"Updated Slack channel directory from {event_type} event.")
+        elif event_type == 'channel_unarchive':
+            # This event carries only the channel ID
+            try:
+                self.upsert(self.fetch_one(event['channel']))
+                logger.info(f"Updated Slack channel directory from {event_type} event.")
+            except Exception as e:
+                logger.warning(f"Could not look up unarchived channel {event['channel']}; refreshing the directory: {e}")
+                self.mark_stale()
+        elif event_type in ('channel_deleted', 'channel_archive'):
+            self.remove(event.get('channel'))
+            logger.info(f"Updated Slack channel directory from {event_type} event.")
+
+channel_directory = ChannelDirectory()
 
 def get_all_public_channels():
     """
     Retrieves a list of all public Slack channels with their normalized names, topics, and IDs.
+    Channels are served from the shared channel directory cache.
     
     Returns:
         list of dict: Each dictionary contains 'name', 'topic', and 'id' of a channel.
     """
     try:
-        channels = []
+        return channel_directory.channels()
+    except SlackApiError as e:
+        logger.error(f"Error fetching public channels: {e.response['error']}")
+        return []
+    except Exception as e:
+        logger.exception(f"Unexpected error fetching public channels: {e}")
+        return []
+
+class ChannelMemberships:
+    """
+    Cache of the channels the bot is a member of.
+
+    Seeded once from users_conversations on first use and then kept current from
+    join results and from not_in_channel/channel_not_found errors.
+    """
+
+    def __init__(self):
+        self._channel_ids = set()
+        self._seeded = False
+        self._lock = threading.Lock()
+
+    def _seed(self):
+        channel_ids = set()
         cursor = None
         while True:
-            response = client.conversations_list(
+            response = get_slack_client().users_conversations(
                 types="public_channel",
+                exclude_archived=True,
                 limit=1000,
                 cursor=cursor
             )
-            for channel in response['channels']:
-                channels.append({
-                    'name': channel['name'].lower(),
-                    'topic': channel['topic']['value'].lower(),
-                    'id': channel['id']
-                })
+            channel_ids.update(channel['id'] for channel in response['channels'])
             cursor = response.get('response_metadata', {}).get('next_cursor')
             if not cursor:
                 break
-        logger.info(f"Retrieved {len(channels)} public channels from Slack.")
-        return channels
-    except SlackApiError as e:
-        logger.error(f"Error fetching public channels: {e.response['error']}")
-        return []
-    except Exception as e:
-        logger.exception(f"Unexpected error fetching public channels: {e}")
-        return []
+        logger.info(f"Bot is a member of {len(channel_ids)} public channels.")
+        return channel_ids
+
+    def is_member(self, channel_id):
+        """
+        Returns:
+            bool: True if the cache says the bot is in the channel.
+        """
+        with self._lock:
+            if not self._seeded:
+                try:
+                    self._channel_ids |= self._seed()
+                except SlackApiError as e:
+                    logger.warning(f"Could not load the bot's channel memberships: {e.response['error']}")
+                self._seeded = True
+            return channel_id in self._channel_ids
+
+    def add(self, channel_id):
+        with self._lock:
+            self._channel_ids.add(channel_id)
+
+    def discard(self, channel_id):
+        with self._lock:
+            self._channel_ids.discard(channel_id)
+
+channel_memberships = ChannelMemberships()
 
 def join_slack_channel(channel_id):
     """
-    Makes the bot join the specified Slack channel by ID.
+    Makes the bot join the specified Slack channel by ID, unless the membership
+    cache shows it is already a member.
     
     Parameters:
         channel_id (str): The ID of the Slack channel to join.
@@ -68,11 +362,16 @@ def join_slack_channel(channel_id):
         bool: True if successful or already in the channel, False otherwise.
     """
     try:
-        response = client.conversations_join(channel=channel_id)
+        if channel_memberships.is_member(channel_id):
+            logger.info(f"Already in Slack channel ID '{channel_id}'.")
+            return True
+        response = get_slack_client().conversations_join(channel=channel_id)
+        channel_memberships.add(channel_id)
         logger.info(f"Joined Slack channel ID '{channel_id}'.")
         return True
     except SlackApiError as e:
         if e.response['error'] == 'already_in_channel':
+            channel_memberships.add(channel_id)
             logger.info(f"Already in Slack channel ID '{channel_id}'.")
             return True
         else:
@@ -84,7 +383,9 @@ def join_slack_channel(channel_id):
 
 def post_to_slack(channel_id, message):
     """
-    Posts a message to the specified Slack channel by ID.
+    Posts a message to the specified Slack channel by ID. If Slack reports that the
+    bot is not in the channel, the membership cache is corrected, the bot rejoins
+    and the post is retried once.
     
     Parameters:
         channel_id (str): The ID of the Slack channel to post the message to.
@@ -94,11 +395,21 @@ def post_to_slack(channel_id, message):
         bool: True if the message was posted successfully, False otherwise.
     """
     try:
-        response = client.chat_postMessage(channel=channel_id, text=message)
+        try:
+            response = get_slack_client().chat_postMessage(channel=channel_id, text=message)
+        except SlackApiError as e:
+            if e.response['error'] != 'not_in_channel':
+                raise
+            logger.warning(f"Bot is not in Slack channel ID '{channel_id}'; rejoining.")
+            channel_memberships.discard(channel_id)
+            if not join_slack_channel(channel_id):
+                return False
+            response = get_slack_client().chat_postMessage(channel=channel_id, text=message)
         logger.info(f"Message posted to channel ID '{channel_id}' with timestamp {response['ts']}.")
         return True
     except SlackApiError as e:
         if e.response['error'] == 'channel_not_found':
+            channel_memberships.discard(channel_id)
             logger.error(f"Slack channel ID '{channel_id}' not found.")
         elif e.response['error'] == 'missing_scope':
             logger.error(f"Slack app is missing necessary scopes: {e.response['error']}")
@@ -121,29 +432,30 @@ def ensure_default_channel_exists(default_channel_name="bot-lost-meeting-recordi
         str or None: The ID of the default Slack channel, or None if creation failed.
     """
     try:
-        # Fetch all public channels
-        public_channels = get_all_public_channels()
-        # Normalize the default channel name
-        normalized_default_name = default_channel_name.lower()
-        # Search for the default channel
-        for channel in public_channels:
-            if channel['name'] == normalized_default_name:
-                logger.info(f"Default Slack channel '{default_channel_name}' already exists with ID: {channel['id']}")
-                return channel['id']
+        # Look up the default channel in the channel directory
+        channel = channel_directory.get_by_name(default_channel_name)
+        if channel:
+            logger.info(f"Default Slack channel '{default_channel_name}' already exists with ID: {channel['id']}")
+            return channel['id']
         
         # If not found, attempt to create it
-        response = client.conversations_create(name=default_channel_name)
+        response = get_slack_client().conversations_create(name=default_channel_name)
         channel = response['channel']
+        channel_directory.upsert(channel)
         logger.info(f"Created default Slack channel '{default_channel_name}' with ID: {channel['id']}")
         return channel['id']
     except SlackApiError as e:
         if e.response['error'] == 'name_taken':
             logger.warning(f"Slack channel '{default_channel_name}' already exists.")
-            # Fetch the channel ID again
-            public_channels = get_all_public_channels()
-            for channel in public_channels:
-                if channel['name'] == default_channel_name.lower():
-                    return channel['id']
+            # The cache is out of date; reload it and look the channel up again
+            try:
+                channel_directory.refresh()
+            except SlackApiError as refresh_err:
+                logger.error(f"Error fetching public channels: {refresh_err.response['error']}")
+                return None
+            channel = channel_directory.get_by_name(default_channel_name)
+            if channel:
+                return channel['id']
         else:
             logger.error(f"Error creating default Slack channel '{default_channel_name}': {e.response['error']}")
         return None
@@ -0,0 +1,24 @@
+# conftest.py
+
+import os
+import sys
+import shutil
+import atexit
+import tempfile
+
+# Tests run offline: the credentials only need to exist, and every on-disk store
+# lives in a scratch directory that is discarded afterwards. The settings are read
+# at import time, so they are set before any project module is imported.
+TEST_DIR = tempfile.mkdtemp(prefix='zoomtoslack_tests_')
+atexit.register(shutil.rmtree, TEST_DIR, ignore_errors=True)
+os.environ['DYNO'] = 'test'  # Skips loading a developer's .env file
+for name in ('ZOOM_WEBHOOK_SECRET_TOKEN', 'ZOOM_CLIENT_ID', 'ZOOM_CLIENT_SECRET', 'OPENAI_API_KEY', 'SLACK_BOT_TOKEN'):
+    os.environ.setdefault(name, 'test')
+os.environ['CHANNEL_INDEX_PATH'] = os.path.join(TEST_DIR, 'channel_index.npz')
+os.environ['CONTENT_CACHE_DIR'] = os.path.join(TEST_DIR, 'cache')
+os.environ['ZOOM_TOKEN_CACHE_PATH'] = os.path.join(TEST_DIR, 'zoom_token.json')
+os.environ['JOB_STORE_PATH'] = os.path.join(TEST_DIR, 'jobs.sqlite3')
+os.environ['JOB_ARTIFACT_DIR'] = os.path.join(TEST_DIR, 'jobs')
+os.environ['SCRATCH_DIR'] = os.path.join(TEST_DIR, 'scratch')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,124 @@
+# test_app.py
+
+import hmac
+import json
+import time
+import hashlib
+import sqlite3
+import pytest
+import app as zoom_app
+
+@pytest.fixture
+def queued(monkeypatch):
+    records = []
+    monkeypatch.setattr(zoom_app.job_queue, 'submit', lambda record, delay=0: records.append(record) or True)
+    monkeypatch.setattr(zoom_app.job_queue, 'start', lambda: None)
+    return records
+
+def deliver(body):
+    payload = json.dumps(body).encode('utf-8')
+    timestamp = str(int(time.time()))
+    message = f"v0:{timestamp}:{payload.decode('utf-8')}"
+    signature = 'v0=' + hmac.new(zoom_app.ZOOM_WEBHOOK_SECRET_TOKEN.encode('utf-8'), message.encode('utf-8'), hashlib.sha256).hexdigest()
+    response = zoom_app.app.test_client().post('/zoom-webhook', data=payload, headers={
+        'x-zm-signature': signature,
+        'x-zm-request-timestamp': timestamp,
+        'Content-Type': 'application/json'
+    })
+    return response.status_code, response.get_json()
+
+def recording_completed(meeting_uuid):
+    return {
+        'event': 'recording.completed',
+        'download_token': 'download-token',
+        'payload': {'object': {'id': 1, 'uuid': meeting_uuid, 'recording_files': [
+            {'id': 'audio', 'file_type': 'M4A', 'download_url': 'https://zoom.us/rec/audio', 'recording_start': '2026-01-01T10:00:00Z'}
+        ]}}
+    }
+
+def test_failed_begin_lets_zoom_redelivery_through(monkeypatch, queued):
+    begin = zoom_app.job_store.begin
+
+    def locked(*args, **kwargs):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(zoom_app.job_store, 'begin', locked)
+    assert deliver(recording_completed('locked-meeting'))[0] == 500
+
+    monkeypatch.setattr(zoom_app.job_store, 'begin', begin)
+    status, body = deliver(recording_completed('locked-meeting'))
+    assert (status, body) == (200, {'message': 'Event received'})
+    assert [record.job['recording_info']['uuid'] for record in queued] == ['locked-meeting']
+
+def test_failed_submit_releases_job_for_redelivery(monkeypatch, queued):
+    def broken(record):
+        raise RuntimeError("queue unavailable")
+
+    monkeypatch.setattr(zoom_app.job_queue, 'submit', broken)
+    assert deliver(recording_completed('submit-failure'))[0] == 500
+
+    monkeypatch.setattr(zoom_app.job_queue, 'submit', lambda record, delay=0: queued.append(record) or True)
+    assert deliver(recording_completed('submit-failure'))[0] == 200
+    assert len(queued) == 1
+
+def test_recording_completed_job_is_requeued_until_the_later_zoom_transcript(monkeypatch):
+    import pipeline
+
+    delays = []
+    queued = []
+    monkeypatch.setattr(zoom_app.job_queue, 'start', lambda: None)
+    monkeypatch.setattr(zoom_app.job_queue, 'submit', lambda record, delay=0: queued.append(record) or delays.append(delay) or True)
+    monkeypatch.setattr(pipeline, 'ZOOM_TRANSCRIPT_WAIT_SECONDS', 600)
+
+    transcript_file = {'id': 'vtt', 'file_type': 'TRANSCRIPT', 'download_url': 'https://zoom.us/rec/vtt', 'recording_start': '2026-01-01T10:00:00Z'}
+    completed = recording_completed('transcribed-later')
+    assert deliver(completed)[0] == 200
+
+    # The transcript is not ready yet, so the job is requeued instead of running Whisper
+    listed = completed['payload']['object']
+    monkeypatch.setattr(pipeline, 'get_meeting_recordings', lambda meeting_uuid: listed)
+    monkeypatch.setattr(pipeline, 'fetch_recording', lambda *args: pytest.fail("The audio was downloaded for Whisper"))
+    zoom_app.run_recording_job(queued.pop())
+    assert delays == [0, pipeline.ZOOM_TRANSCRIPT_POLL_SECONDS]
+
+    # Zoom's transcript follows while the recording.completed job holds the meeting
+    transcript_completed = recording_completed('transcribed-later')
+    transcript_completed['event'] = 'recording.transcript_completed'
+    transcript_completed['payload']['object']['recording_files'].append(transcript_file)
+    assert deliver(transcript_completed) == (200, {'message': 'Duplicate event ignored.'})
+    assert len(queued) == 1
+
+    summarized = []
+    listed = transcript_completed['payload']['object']
+    monkeypatch.setattr(pipeline, 'get_valid_zoom_access_token', lambda: 'account-token')
+    monkeypatch.setattr(pipeline, 'download_transcript', lambda url, token: "WEBVTT\n\n1\n00:00:01.000 --> 00:00:03.000\nAda: Hello.\n")
+    monkeypatch.setattr(pipeline, 'generate_summary', lambda transcript, **details: summarized.append(transcript))
+    monkeypatch.setattr(pipeline, 'get_all_public_channels', lambda: [])
+    monkeypatch.setattr(pipeline, 'determine_slack_channel', lambda *args: 'C1')
+    monkeypatch.setattr(pipeline, 'join_slack_channel', lambda channel_id: True)
+    monkeypatch.setattr(pipeline, 'post_to_slack', lambda channel_id, message: True)
+
+    zoom_app.run_recording_job(queued.pop())
+    assert summarized == ["[00:00:01] Ada: Hello."]
+    assert queued == []
+
+def test_zoom_transcript_wait_is_off_by_default():
+    import pipeline
+
+    job = {'recording_info': {'uuid': 'meeting'}, 'recording_files': [{'file_type': 'M4A'}], 'received_at': time.time()}
+    assert pipeline.zoom_transcript_delay(job) == 0
+
+def test_failed_job_is_retried_with_backoff_until_attempts_run_out(monkeypatch, queued):
+    delays = []
+    monkeypatch.setattr(zoom_app, 'process_recording', lambda job, record: False)
+    monkeypatch.setattr(zoom_app, 'get_valid_zoom_access_token', lambda: 'account-token')
+    monkeypatch.setattr(zoom_app.job_queue, 'submit', lambda record, delay=0: queued.append(record) or delays.append(delay) or True)
+    assert deliver(recording_completed('keeps-failing'))[0] == 200
+
+    while queued:
+        zoom_app.run_recording_job(queued.pop())
+
+    assert delays == [0, zoom_app.JOB_RETRY_DELAY_SECONDS, zoom_app.JOB_RETRY_DELAY_SECONDS * 2]
+    # Only after the last attempt may a redelivery from Zoom start the job again
+    assert deliver(recording_completed('keeps-failing'))[0] == 200
+    assert len(queued) == 1
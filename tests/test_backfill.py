@@ -0,0 +1,44 @@
+# test_backfill.py
+
+import os
+import backfill
+
+def make_meeting(uuid):
+    return {
+        'uuid': uuid,
+        'id': 123,
+        'recording_files': [{'id': 'f1', 'file_type': 'M4A', 'download_url': 'https://zoom.us/rec/f1', 'recording_start': 'S'}]
+    }
+
+def run(monkeypatch, tmp_path, meeting, event_key, outcome=True):
+    calls = []
+
+    def process_recording(job, record):
+        calls.append(record)
+        return outcome
+
+    monkeypatch.setattr(backfill, 'process_recording', process_recording)
+    monkeypatch.setattr(backfill, 'get_valid_zoom_access_token', lambda: 'token')
+    checkpoint = backfill.Checkpoint(os.path.join(tmp_path, 'checkpoint.json'))
+    result = backfill.run_job(meeting, meeting['recording_files'], event_key, checkpoint, backfill.Throughput())
+    return result, calls
+
+def test_backfill_skips_meeting_posted_by_webhook(monkeypatch, tmp_path):
+    meeting = make_meeting('posted-by-webhook')
+    webhook_record = backfill.job_store.begin('posted-by-webhook:f1,f2', {}, meeting_uuid='posted-by-webhook')
+    backfill.job_store.finish(webhook_record, True)
+
+    result, calls = run(monkeypatch, tmp_path, meeting, 'posted-by-webhook:f1')
+    assert result is True
+    assert calls == []
+
+def test_backfill_records_job_and_resumes_failed_attempt(monkeypatch, tmp_path):
+    meeting = make_meeting('backfilled')
+    result, calls = run(monkeypatch, tmp_path, meeting, 'backfilled:f1', outcome=False)
+    assert result is False
+    calls[0].complete('downloaded', {'paths': {'f1': '/tmp/recording.m4a'}})
+
+    result, calls = run(monkeypatch, tmp_path, meeting, 'backfilled:f1')
+    assert result is True
+    assert calls[0].output('downloaded') == {'paths': {'f1': '/tmp/recording.m4a'}}
+    assert backfill.job_store.begin('backfilled:f1', {}) is None
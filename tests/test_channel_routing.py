@@ -0,0 +1,61 @@
+# test_channel_routing.py
+
+import os
+import openai_utils
+from channel_index import ChannelIndex
+
+CHANNEL = {'id': 'C0123456789', 'name': 'design', 'topic': 'product design'}
+
+def test_single_candidate_below_min_score_is_not_routed_directly(monkeypatch):
+    monkeypatch.setattr(openai_utils, 'rank_channel_candidates', lambda *args: [(CHANNEL, openai_utils.ROUTING_MIN_SCORE - 0.2)])
+    asked = []
+
+    def ask_llm(*args, **kwargs):
+        asked.append(kwargs)
+        raise RuntimeError("no LLM in tests")
+
+    monkeypatch.setattr(openai_utils, '_rate_limited', ask_llm)
+    assert openai_utils.determine_slack_channel("Quarterly taxes", {'summary_overview': "Tax filing."}, [CHANNEL]) is None
+    assert asked
+
+def test_single_candidate_above_min_score_is_routed_directly(monkeypatch):
+    monkeypatch.setattr(openai_utils, 'rank_channel_candidates', lambda *args: [(CHANNEL, openai_utils.ROUTING_MIN_SCORE + 0.1)])
+    assert openai_utils.determine_slack_channel("Design review", {'summary_overview': "Mockups."}, [CHANNEL]) == CHANNEL['id']
+
+def test_index_built_with_another_model_is_rebuilt(tmp_path):
+    path = os.path.join(tmp_path, 'index.npz')
+    old = ChannelIndex(lambda texts: [[1.0, 0.0]] * len(texts), path, model='old-model')
+    old.sync([CHANNEL])
+
+    embedded = []
+
+    def embed(texts):
+        embedded.extend(texts)
+        return [[0.0, 0.0, 1.0]] * len(texts)
+
+    new = ChannelIndex(embed, path, model='new-model')
+    new.sync([CHANNEL])
+    assert embedded == ['design: product design']
+    assert new.search([0.0, 0.0, 1.0], 1)[0][0]['id'] == CHANNEL['id']
+
+    reloaded = ChannelIndex(embed, path, model='new-model')
+    reloaded.sync([CHANNEL])
+    assert len(embedded) == 1
+
+def test_empty_channel_list_keeps_the_index(tmp_path):
+    path = os.path.join(tmp_path, 'index.npz')
+    embedded = []
+
+    def embed(texts):
+        embedded.extend(texts)
+        return [[1.0, 0.0]] * len(texts)
+
+    index = ChannelIndex(embed, path, model='model')
+    index.sync([CHANNEL])
+    # What get_all_public_channels() returns when Slack fails
+    index.sync([])
+    assert index.search([1.0, 0.0], 1)[0][0]['id'] == CHANNEL['id']
+
+    reloaded = ChannelIndex(embed, path, model='model')
+    reloaded.sync([CHANNEL])
+    assert len(embedded) == 1
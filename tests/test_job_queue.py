@@ -0,0 +1,21 @@
+# test_job_queue.py
+
+import threading
+from job_queue import JobQueue
+
+def test_delayed_job_runs_after_its_delay_without_holding_a_worker():
+    ran = []
+    done = threading.Event()
+
+    def handler(job):
+        ran.append(job)
+        if len(ran) == 2:
+            done.set()
+
+    jobs = JobQueue(handler, num_workers=1)
+    assert jobs.submit('later', delay=0.2)
+    assert jobs.delayed() == 1
+    assert jobs.submit('now')
+    assert done.wait(5)
+    assert ran == ['now', 'later']
+    assert jobs.delayed() == 0
@@ -0,0 +1,23 @@
+# test_job_store.py
+
+import os
+import socket
+import job_store
+
+def test_owner_with_a_reused_pid_is_not_alive():
+    # The test runner's parent process stands in for a live process with a known PID
+    pid = os.getppid()
+    start = job_store._process_start_id(pid)
+    assert job_store._owner_alive(f"{socket.gethostname()}:{pid}:{start}")
+    assert not job_store._owner_alive(f"{socket.gethostname()}:{pid}:{start.split('.')[0]}.1")
+
+def test_job_of_an_owner_with_a_reused_pid_is_resumed(tmp_path):
+    store = job_store.JobStore(str(tmp_path / 'jobs.sqlite3'), str(tmp_path / 'jobs'))
+    store.begin('meeting:f1', {}, meeting_uuid='meeting')
+    store.begin('other:f1', {}, meeting_uuid='other')
+    with store._transaction() as conn:
+        conn.execute('UPDATE jobs SET owner = ?', (f"{socket.gethostname()}:{os.getppid()}:00000000.1",))
+
+    # A redelivery from Zoom is no longer refused as in progress, and a restart resumes the other job
+    assert store.begin('meeting:f1', {}, meeting_uuid='meeting') is not None
+    assert [record.event_key for record in store.claim_stale()] == ['other:f1']
@@ -0,0 +1,37 @@
+# test_metrics.py
+
+import os
+import sys
+import subprocess
+
+from prometheus_client import CollectorRegistry, generate_latest, multiprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORKER = """
+from http_utils import connection_stats
+import metrics
+
+for _ in range({requests}):
+    connection_stats.record_request('api.zoom.us')
+connection_stats.record_connection('api.zoom.us')
+metrics._runtime_publisher.publish()
+# A second publish only adds what grew since the first
+connection_stats.record_request('api.zoom.us')
+metrics._runtime_publisher.publish()
+"""
+
+def _run_worker(multiproc_dir, requests):
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=multiproc_dir)
+    subprocess.run([sys.executable, '-c', WORKER.format(requests=requests)], cwd=REPO_ROOT, env=env, check=True)
+
+def test_runtime_counters_are_summed_across_worker_processes(tmp_path):
+    _run_worker(str(tmp_path), 2)
+    _run_worker(str(tmp_path), 4)
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry, path=str(tmp_path))
+    text = generate_latest(registry).decode()
+
+    assert 'zoomtoslack_http_requests_total{host="api.zoom.us"} 8.0' in text
+    assert 'zoomtoslack_http_connections_total{host="api.zoom.us"} 2.0' in text
@@ -0,0 +1,82 @@
+# test_pipeline.py
+
+import os
+import openai_utils
+import pipeline
+
+SEGMENTS = [
+    {'id': 'f1', 'file_type': 'M4A', 'download_url': 'https://zoom.us/rec/f1', 'recording_start': '2024-01-01T10:00:00Z'},
+    {'id': 'f2', 'file_type': 'M4A', 'download_url': 'https://zoom.us/rec/f2', 'recording_start': '2024-01-01T10:30:00Z'}
+]
+
+def transcribe_with(monkeypatch, transcripts):
+    monkeypatch.setattr(pipeline, 'fetch_recording', lambda recording_file, download_token, record=None: recording_file['id'])
+    monkeypatch.setattr(pipeline, 'release_recording', lambda recording: None)
+    monkeypatch.setattr(pipeline, 'transcribe_audio_segments', lambda recording: transcripts[recording])
+    return pipeline.transcribe_recording_segments(SEGMENTS, 'token')
+
+def test_failed_segment_transcription_fails_the_meeting(monkeypatch):
+    results = transcribe_with(monkeypatch, {'f1': [{'start': 0.0, 'end': 1.0, 'text': 'Hello.'}], 'f2': None})
+    assert results[1] is None
+
+def test_segment_without_speech_is_empty(monkeypatch):
+    results = transcribe_with(monkeypatch, {'f1': [{'start': 0.0, 'end': 1.0, 'text': 'Hello.'}], 'f2': []})
+    assert results[1] == []
+    assert len(pipeline.merge_segment_transcripts(SEGMENTS, results)) == 1
+
+def test_transcription_error_is_not_an_empty_transcript(monkeypatch, tmp_path):
+    recording = tmp_path / 'recording.m4a'
+    recording.write_bytes(b'audio')
+
+    def fail(source):
+        raise RuntimeError("Whisper is unavailable")
+
+    monkeypatch.setattr(openai_utils, '_transcode', lambda source: (None, None))
+    monkeypatch.setattr(openai_utils, '_transcribe_source', fail)
+    assert openai_utils.transcribe_audio_segments(str(recording)) is None
+
+def download_to_scratch(monkeypatch):
+    from scratch_space import scratch_space
+
+    def download_recording(url, token, file_extension='', file_size=None):
+        path = scratch_space.create(suffix=f".{file_extension}")
+        with open(path, 'wb') as f:
+            f.write(b'audio')
+        return path
+
+    monkeypatch.setattr(pipeline, 'RECORDING_STREAMING', False)
+    monkeypatch.setattr(pipeline, 'download_recording', download_recording)
+
+def test_failed_transcription_keeps_the_download_checkpoint(monkeypatch, tmp_path):
+    from job_store import JobStore
+
+    download_to_scratch(monkeypatch)
+    monkeypatch.setattr(pipeline, 'transcribe_audio_segments', lambda recording: None)
+    record = JobStore(str(tmp_path / 'jobs.sqlite3'), str(tmp_path / 'jobs')).begin('meeting:f1', {})
+
+    results = pipeline.transcribe_recording_segments(SEGMENTS[:1], 'token', record)
+    assert results == [None]
+    assert os.path.exists(record.output('downloaded')['paths']['f1'])
+
+def test_retry_redoes_only_the_failed_segment(monkeypatch, tmp_path):
+    from job_store import JobStore
+
+    download_to_scratch(monkeypatch)
+    transcribed = []
+
+    def transcribe_audio_segments(recording):
+        transcribed.append(recording)
+        return None if len(transcribed) == 2 else [{'start': 0.0, 'end': 1.0, 'text': 'Hello.'}]
+
+    monkeypatch.setattr(pipeline, 'RECORDING_SEGMENT_WORKERS', 1)
+    monkeypatch.setattr(pipeline, 'transcribe_audio_segments', transcribe_audio_segments)
+    store = JobStore(str(tmp_path / 'jobs.sqlite3'), str(tmp_path / 'jobs'))
+    record = store.begin('meeting:f1,f2', {})
+    assert pipeline.transcribe_recording_segments(SEGMENTS, 'token', record)[1] is None
+    store.finish(record, False)
+
+    retry = store.begin('meeting:f1,f2', {})
+    results = pipeline.transcribe_recording_segments(SEGMENTS, 'token', retry)
+    assert all(results)
+    assert len(transcribed) == 3
+    assert transcribed[2] == record.output('downloaded')['paths']['f2']
@@ -0,0 +1,54 @@
+# test_rate_limiter.py
+
+from types import SimpleNamespace
+import httpx
+import openai_utils
+import rate_limiter
+from rate_limiter import TokenBucket
+
+def test_token_headers_slow_the_chat_token_bucket(monkeypatch):
+    monkeypatch.setattr(rate_limiter, '_buckets', {})
+    response = SimpleNamespace(
+        request=httpx.Request('POST', 'https://api.openai.com/v1/chat/completions'),
+        headers={
+            'x-ratelimit-remaining-requests': '499',
+            'x-ratelimit-reset-requests': '120ms',
+            'x-ratelimit-remaining-tokens': '1200',
+            'x-ratelimit-reset-tokens': '6s'
+        }
+    )
+    openai_utils._update_rate_limits(response)
+
+    assert rate_limiter.get_bucket('openai', 'chat_tokens').rate == 200
+    assert rate_limiter.get_bucket('openai', 'chat').rate == rate_limiter.get_bucket('openai', 'chat').base_rate
+
+def test_cost_above_capacity_leaves_the_bucket_in_debt(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(rate_limiter.time, 'monotonic', lambda: clock[0])
+    monkeypatch.setattr(rate_limiter.time, 'sleep', lambda seconds: clock.__setitem__(0, clock[0] + seconds))
+    bucket = TokenBucket('openai/chat_tokens', 60 * 1000)
+
+    # A request larger than the bucket goes at once when the bucket is full
+    assert bucket.acquire(5000) == 0
+    # and the next one waits out four seconds of debt and one of refill
+    assert bucket.acquire(1000) == 5
+
+def test_low_remaining_quota_spreads_requests_until_reset():
+    bucket = TokenBucket('zoom/medium', 600)
+    bucket.update(5, 10)
+    assert bucket.rate == 0.5
+    # Never below a hundredth of the configured rate
+    bucket.update(0, 30)
+    assert bucket.rate == bucket.base_rate / 100
+    bucket.update(500, 60)
+    assert bucket.rate == bucket.base_rate
+
+def test_rate_limited_bucket_pauses_every_caller(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(rate_limiter.time, 'monotonic', lambda: clock[0])
+    monkeypatch.setattr(rate_limiter.time, 'sleep', lambda seconds: clock.__setitem__(0, clock[0] + seconds))
+    bucket = TokenBucket('zoom/medium', 6000)
+
+    bucket.penalize(7.5)
+    assert bucket.acquire() == 7.5
+    assert bucket.snapshot()['rate_limited'] == 1
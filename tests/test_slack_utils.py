@@ -0,0 +1,86 @@
+# test_slack_utils.py
+
+import json
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pytest
+from slack_sdk.errors import SlackApiError
+import slack_utils
+from http_utils import connection_stats
+from slack_utils import ChannelDirectory, _CountingWebClient
+
+def make_directory(channels, fetch_one=None):
+    directory = ChannelDirectory(fetch=lambda: [dict(channel) for channel in channels], fetch_one=fetch_one)
+    directory.refresh()
+    return directory
+
+def test_channel_created_adds_channel():
+    directory = make_directory([])
+    directory.apply_event({
+        'type': 'channel_created',
+        'channel': {'id': 'C1', 'name': 'Design', 'created': 1700000000, 'creator': 'U1'}
+    })
+    assert directory.get_by_name('design')['id'] == 'C1'
+
+def test_channel_unarchive_looks_up_channel_by_id():
+    looked_up = []
+
+    def fetch_one(channel_id):
+        looked_up.append(channel_id)
+        return {'id': channel_id, 'name': 'revived', 'topic': {'value': 'Old project'}}
+
+    directory = make_directory([], fetch_one=fetch_one)
+    # Slack sends the channel of this event as a bare ID
+    directory.apply_event({'type': 'channel_unarchive', 'channel': 'C2', 'user': 'U1'})
+    assert looked_up == ['C2']
+    assert directory.get_by_id('C2') == {'id': 'C2', 'name': 'revived', 'topic': 'old project'}
+
+def test_channel_unarchive_marks_directory_stale_when_lookup_fails():
+    def fetch_one(channel_id):
+        raise RuntimeError("channel_not_found")
+
+    directory = make_directory([{'id': 'C1', 'name': 'general'}], fetch_one=fetch_one)
+    directory.apply_event({'type': 'channel_unarchive', 'channel': 'C2', 'user': 'U1'})
+    assert time.monotonic() - directory._loaded_at >= directory.ttl_seconds
+
+class _SlackAPI(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.path.endswith('/conversations.join'):
+            status, body = 404, {'ok': False, 'error': 'channel_not_found'}
+        else:
+            status, body = 200, {'ok': True, 'channel': {'id': 'C1'}}
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def slack_api(monkeypatch):
+    # The calls themselves are under test, not the tier's request spacing
+    monkeypatch.setattr(slack_utils.rate_limiter, 'call', lambda provider, tier, retry_after, fn: fn())
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _SlackAPI)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield _CountingWebClient(token='xoxb-test', base_url=f"http://127.0.0.1:{server.server_port}/api/")
+    server.shutdown()
+
+def test_slack_calls_reuse_one_pooled_connection(slack_api):
+    before = connection_stats.snapshot().get('127.0.0.1', {'requests': 0, 'connections': 0})
+    for _ in range(3):
+        assert slack_api.conversations_info(channel='C1')['channel']['id'] == 'C1'
+    after = connection_stats.snapshot()['127.0.0.1']
+    assert after['requests'] - before['requests'] == 3
+    assert after['connections'] - before['connections'] <= 1
+
+def test_slack_error_status_raises_api_error(slack_api):
+    with pytest.raises(SlackApiError) as error:
+        slack_api.conversations_join(channel='C404')
+    assert error.value.response['error'] == 'channel_not_found'
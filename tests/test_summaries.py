@@ -0,0 +1,34 @@
+# test_summaries.py
+
+import openai_utils
+
+def make_partial(part, items):
+    return {
+        'summary_overview': f"Part {part} " + "discussion " * 200,
+        'main_topics': [{'topic': f"Topic {part}.{index} " + "detail " * 20, 'timestamp': "00:00:00"} for index in range(items)],
+        'action_items': [{'action_item': f"Action {part}.{index} " + "step " * 20, 'responsible': "Alex"} for index in range(items)]
+    }
+
+def test_reduce_summaries_truncates_a_pair_that_does_not_fit(monkeypatch):
+    monkeypatch.setattr(openai_utils, 'count_tokens', lambda text: len(text) // 4)
+    monkeypatch.setattr(openai_utils, 'SUMMARY_CONTEXT_TOKENS', 3000)
+    monkeypatch.setattr(openai_utils, 'SUMMARY_MAX_TOKENS', 500)
+    prompts = []
+
+    def complete_json(prompt, system_prompt, max_tokens, temperature):
+        prompts.append(prompt)
+        return {'summary_overview': "combined", 'main_topics': [], 'action_items': []}
+
+    monkeypatch.setattr(openai_utils, '_complete_json', complete_json)
+    partials = [make_partial(1, 30), make_partial(2, 30)]
+    assert openai_utils._reduce_summaries(partials) == {'summary_overview': "combined", 'main_topics': [], 'action_items': []}
+    assert len(prompts) == 1
+    assert openai_utils.count_tokens(prompts[0]) + 500 <= 3000
+    assert "Topic 1.0" in prompts[0] and "Topic 2.0" in prompts[0]
+
+def test_reduce_summaries_splits_larger_groups(monkeypatch):
+    monkeypatch.setattr(openai_utils, 'count_tokens', lambda text: len(text) // 4)
+    monkeypatch.setattr(openai_utils, 'SUMMARY_CONTEXT_TOKENS', 3000)
+    monkeypatch.setattr(openai_utils, 'SUMMARY_MAX_TOKENS', 500)
+    monkeypatch.setattr(openai_utils, '_complete_json', lambda *args: make_partial(0, 2))
+    assert openai_utils._reduce_summaries([make_partial(part, 10) for part in range(7)])['main_topics']
@@ -0,0 +1,20 @@
+# test_transcription.py
+
+from openai_utils import stitch_segments
+
+def segment(start, end, text):
+    return {'start': start, 'end': end, 'text': text}
+
+def test_overlap_is_cut_at_its_midpoint():
+    # 600 s chunks overlapping by 30 s: the second chunk starts at 600 and the cut is at 615
+    first = [segment(0, 10, 'intro'), segment(605, 612, 'before cut'), segment(612, 620, 'across cut')]
+    second = [segment(605, 612, 'before cut'), segment(612, 620, 'across cut'), segment(640, 650, 'later')]
+    stitched = stitch_segments([first, second], 600, 30)
+    assert [s['text'] for s in stitched] == ['intro', 'before cut', 'across cut', 'later']
+    # Each overlap duplicate is kept from the chunk whose window holds its midpoint
+    assert stitched[1] is first[1]
+    assert stitched[2] is second[1]
+
+def test_single_chunk_keeps_every_segment():
+    segments = [segment(0, 5, 'a'), segment(5, 9000, 'b')]
+    assert stitch_segments([segments], 600, 30) == segments
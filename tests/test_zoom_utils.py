@@ -0,0 +1,95 @@
+# test_zoom_utils.py
+
+import hmac
+import json
+import time
+import hashlib
+from zoom_utils import ZoomTokenManager, validate_zoom_webhook, parse_vtt, select_recording_segments
+
+SECRET = 'webhook-secret'
+
+def sign(timestamp, payload):
+    message = b"v0:" + timestamp.encode('utf-8') + b":" + payload
+    return 'v0=' + hmac.new(SECRET.encode('utf-8'), message, hashlib.sha256).hexdigest()
+
+def test_webhook_with_valid_signature_is_accepted():
+    payload = b'{"event": "recording.completed"}'
+    timestamp = str(int(time.time()))
+    assert validate_zoom_webhook(SECRET, sign(timestamp, payload), timestamp, payload)
+    assert not validate_zoom_webhook(SECRET, sign(timestamp, payload + b' '), timestamp, payload)
+
+def test_webhook_with_stale_timestamp_is_rejected():
+    payload = b'{"event": "recording.completed"}'
+    timestamp = str(int(time.time()) - 3600)
+    # Even a correct signature does not make a replayed request acceptable
+    assert not validate_zoom_webhook(SECRET, sign(timestamp, payload), timestamp, payload)
+
+def test_webhook_with_millisecond_timestamp_is_accepted():
+    payload = b'{"event": "recording.completed"}'
+    timestamp = str(int(time.time() * 1000))
+    assert validate_zoom_webhook(SECRET, sign(timestamp, payload), timestamp, payload)
+    stale = str(int((time.time() - 3600) * 1000))
+    assert not validate_zoom_webhook(SECRET, sign(stale, payload), stale, payload)
+
+def test_webhook_is_signed_over_the_raw_non_ascii_body():
+    body = {'event': 'recording.completed', 'payload': {'object': {'topic': 'Café planning – Zürich'}}}
+    payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+    timestamp = str(int(time.time()))
+    assert validate_zoom_webhook(SECRET, sign(timestamp, payload), timestamp, payload)
+    # A signature over the body re-serialized with escapes does not match the raw bytes
+    escaped = json.dumps(body).encode('utf-8')
+    assert not validate_zoom_webhook(SECRET, sign(timestamp, escaped), timestamp, payload)
+
+def test_webhook_with_malformed_timestamp_is_rejected():
+    assert not validate_zoom_webhook(SECRET, 'v0=', 'yesterday', b'{}')
+
+def test_vtt_cues_with_and_without_speaker_prefix():
+    vtt = (
+        "WEBVTT\n\n"
+        "1\n00:00:01.000 --> 00:00:03.500\nAda Lovelace: Let's start with the roadmap.\n\n"
+        "2\n00:00:04.000 --> 00:00:06.000\nThanks everyone for joining.\n\n"
+        "3\n01:02:03.250 --> 01:02:05.000\n<v Grace Hopper>Ship it.</v>\n"
+    )
+    assert parse_vtt(vtt) == [
+        {'start': 1.0, 'end': 3.5, 'text': "Let's start with the roadmap.", 'speaker': 'Ada Lovelace'},
+        {'start': 4.0, 'end': 6.0, 'text': 'Thanks everyone for joining.'},
+        {'start': 3723.25, 'end': 3725.0, 'text': 'Ship it.', 'speaker': 'Grace Hopper'}
+    ]
+
+def test_recording_segments_prefer_zoom_transcript_per_segment():
+    files = [
+        {'id': 'video-1', 'file_type': 'MP4', 'download_url': 'https://zoom.us/rec/v1', 'recording_start': '2026-01-01T10:00:00Z', 'file_size': 900},
+        {'id': 'audio-1', 'file_type': 'M4A', 'download_url': 'https://zoom.us/rec/a1', 'recording_start': '2026-01-01T10:00:00Z', 'file_size': 100},
+        {'id': 'vtt-1', 'file_type': 'TRANSCRIPT', 'download_url': 'https://zoom.us/rec/t1', 'recording_start': '2026-01-01T10:00:00Z'},
+        {'id': 'audio-2', 'file_type': 'M4A', 'download_url': 'https://zoom.us/rec/a2', 'recording_start': '2026-01-01T10:45:00Z', 'file_size': 80},
+        {'id': 'video-2', 'file_type': 'MP4', 'download_url': 'https://zoom.us/rec/v2', 'recording_start': '2026-01-01T10:45:00Z', 'file_size': 700}
+    ]
+    assert [f['id'] for f in select_recording_segments(files)] == ['vtt-1', 'audio-2']
+
+def wait_for_refresh(manager):
+    deadline = time.time() + 5
+    while manager._refreshing and time.time() < deadline:
+        time.sleep(0.01)
+
+def test_failed_background_refresh_backs_off(tmp_path):
+    fetches = []
+
+    def fetch():
+        fetches.append(time.time())
+        return None, None
+
+    manager = ZoomTokenManager(fetch=fetch, cache_path=str(tmp_path / 'token.json'), refresh_margin=300, retry_seconds=60)
+    # A token inside the refresh margin, so every call would start a background refresh
+    manager._token, manager._expires_at = 'current-token', time.time() + 100
+
+    for _ in range(20):
+        assert manager.get_token() == 'current-token'
+        wait_for_refresh(manager)
+    assert len(fetches) == 1
+
+    manager._next_fetch_at = 0
+    manager.get_token()
+    wait_for_refresh(manager)
+    assert len(fetches) == 2
+    # The second failure in a row waits twice as long
+    assert 119 < manager._next_fetch_at - time.time() <= 120
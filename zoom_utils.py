@@ -1,15 +1,25 @@
 # zoom_utils.py
 
 import os
+import io
+import re
 import logging
 import requests
+import http_utils
+import rate_limiter
+import metrics
+from scratch_space import scratch_space
+from rate_limiter import parse_duration
 import tempfile
 import base64
 import time
 import hmac
 import hashlib
 import json
-from urllib.parse import urlparse
+import fcntl
+import threading
+from urllib.parse import urlparse, quote
+from concurrent.futures import ThreadPoolExecutor
 from tenacity import retry, wait_exponential, stop_after_attempt, retry_if_exception_type
 
 logger = logging.getLogger(__name__)
@@ -20,14 +30,13 @@ ZOOM_API_BASE_URL = "https://api.zoom.us/v2"
 ZOOM_CLIENT_ID = os.getenv('ZOOM_CLIENT_ID')
 ZOOM_CLIENT_SECRET = os.getenv('ZOOM_CLIENT_SECRET')
 
-if not ZOOM_CLIENT_ID or not ZOOM_CLIENT_SECRET:
-    logger.error("ZOOM_CLIENT_ID and ZOOM_CLIENT_SECRET must be set in environment variables.")
-    raise EnvironmentError("ZOOM_CLIENT_ID and ZOOM_CLIENT_SECRET are required.")
-
 def obtain_zoom_access_token():
     """
     Obtains a new OAuth access token using Client Credentials Grant.
     """
+    if not ZOOM_CLIENT_ID or not ZOOM_CLIENT_SECRET:
+        logger.error("ZOOM_CLIENT_ID and ZOOM_CLIENT_SECRET must be set in environment variables.")
+        return None, None
     try:
         url = "https://zoom.us/oauth/token"
         credentials = f"{ZOOM_CLIENT_ID}:{ZOOM_CLIENT_SECRET}"
@@ -39,7 +48,7 @@ def obtain_zoom_access_token():
         data = {
             "grant_type": "client_credentials"
         }
-        response = requests.post(url, headers=headers, data=data)
+        response = http_utils.request('POST', url, headers=headers, data=data)
         response.raise_for_status()
         token_info = response.json()
         access_token = token_info.get('access_token')
@@ -54,21 +63,132 @@ def obtain_zoom_access_token():
         return None, None
 
 # Token Management
-ZOOM_ACCESS_TOKEN = None
-ZOOM_TOKEN_EXPIRY = 0  # Unix timestamp
+# Tokens are shared between worker processes through this file
+ZOOM_TOKEN_CACHE_PATH = os.getenv(
+    'ZOOM_TOKEN_CACHE_PATH',
+    os.path.join(tempfile.gettempdir(), 'zoomtoslack_zoom_token.json')
+)
+# Refresh in the background this many seconds before the token expires
+ZOOM_TOKEN_REFRESH_MARGIN = int(os.getenv('ZOOM_TOKEN_REFRESH_MARGIN', '300'))
+# After a failed refresh Zoom is not asked again for this long, doubled for each
+# failure in a row up to the refresh margin
+ZOOM_TOKEN_RETRY_SECONDS = float(os.getenv('ZOOM_TOKEN_RETRY_SECONDS', '10'))
+
+class ZoomTokenManager:
+    """
+    Shares one Zoom OAuth access token across threads and worker processes.
+
+    Only one refresh runs at a time: threads in a process serialize on a lock and
+    processes serialize on an flock of the token file, re-reading it before
+    fetching so that a token obtained by another process is reused. Within
+    refresh_margin seconds of expiry the current token is still returned while a
+    background thread refreshes it, so callers only wait when there is no usable
+    token at all. A failed refresh is not retried until a backoff has passed, so
+    callers do not stampede Zoom's OAuth endpoint while it is failing.
+    """
+
+    def __init__(self, fetch=obtain_zoom_access_token, cache_path=ZOOM_TOKEN_CACHE_PATH,
+                 refresh_margin=ZOOM_TOKEN_REFRESH_MARGIN, retry_seconds=ZOOM_TOKEN_RETRY_SECONDS):
+        self.fetch = fetch
+        self.cache_path = cache_path
+        self.refresh_margin = refresh_margin
+        self.retry_seconds = retry_seconds
+        self._token = None
+        self._expires_at = 0  # Unix timestamp, already reduced by a one-minute safety margin
+        self._refreshing = False
+        self._failures = 0
+        self._next_fetch_at = 0  # Unix timestamp before which a failed fetch is not retried
+        self._lock = threading.Lock()
+
+    def _read_shared_token(self):
+        try:
+            with open(self.cache_path, 'r') as f:
+                token_info = json.load(f)
+            return token_info['access_token'], float(token_info['expires_at'])
+        except (OSError, ValueError, KeyError):
+            return None, 0
+
+    def _write_shared_token(self, access_token, expires_at):
+        temp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'access_token': access_token, 'expires_at': expires_at}, f)
+        os.replace(temp_path, self.cache_path)
+
+    def _refresh(self):
+        """
+        Adopts a fresher token from the shared file or fetches a new one.
+        Must be called with self._lock held.
+        """
+        with open(f"{self.cache_path}.lock", 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                access_token, expires_at = self._read_shared_token()
+                if access_token and time.time() < expires_at - self.refresh_margin:
+                    self._token, self._expires_at = access_token, expires_at
+                    return
+                if time.time() < self._next_fetch_at:
+                    return
+                access_token, expires_in = self.fetch()
+                if not access_token:
+                    self._back_off()
+                    return
+                self._failures = 0
+                self._next_fetch_at = 0
+                expires_at = time.time() + expires_in - 60  # Refresh 1 minute before expiry
+                self._token, self._expires_at = access_token, expires_at
+                try:
+                    self._write_shared_token(access_token, expires_at)
+                except OSError as e:
+                    logger.warning(f"Failed to share Zoom access token via {self.cache_path}: {e}")
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _back_off(self):
+        self._failures += 1
+        delay = min(self.retry_seconds * 2 ** (self._failures - 1), max(self.retry_seconds, self.refresh_margin))
+        self._next_fetch_at = time.time() + delay
+        logger.warning(f"Zoom token refresh failed; retrying in {delay:.0f}s.")
+
+    def _refresh_in_background(self):
+        try:
+            with self._lock:
+                self._refresh()
+        except Exception as e:
+            logger.exception(f"Background Zoom token refresh failed: {e}")
+            with self._lock:
+                self._back_off()
+        finally:
+            self._refreshing = False
+
+    def get_token(self):
+        """
+        Returns:
+            str or None: A valid access token, or None if one cannot be obtained.
+        """
+        now = time.time()
+        token, expires_at = self._token, self._expires_at
+        if token and now < expires_at:
+            if now >= expires_at - self.refresh_margin and now >= self._next_fetch_at and not self._refreshing:
+                with self._lock:
+                    start_refresh = not self._refreshing
+                    self._refreshing = True
+                if start_refresh:
+                    threading.Thread(target=self._refresh_in_background, name="zoom-token-refresh", daemon=True).start()
+            return token
+
+        with self._lock:
+            if not self._token or time.time() >= self._expires_at:
+                self._refresh()
+            return self._token if time.time() < self._expires_at else None
+
+zoom_token_manager = ZoomTokenManager()
 
 def get_valid_zoom_access_token():
     """
     Retrieves a valid Zoom access token, refreshing it if necessary.
     """
-    global ZOOM_ACCESS_TOKEN, ZOOM_TOKEN_EXPIRY
-    current_time = int(time.time())
-    if not ZOOM_ACCESS_TOKEN or current_time >= ZOOM_TOKEN_EXPIRY:
-        access_token, expires_in = obtain_zoom_access_token()
-        if access_token:
-            ZOOM_ACCESS_TOKEN = access_token
-            ZOOM_TOKEN_EXPIRY = current_time + expires_in - 60  # Refresh 1 minute before expiry
-    return ZOOM_ACCESS_TOKEN
+    return zoom_token_manager.get_token()
 
 def get_zoom_headers():
     """
@@ -86,41 +206,161 @@ def get_zoom_headers():
         "Content-Type": "application/json"
     }
 
+def _zoom_retry_after(error):
+    if not isinstance(error, requests.exceptions.HTTPError) or error.response is None or error.response.status_code != 429:
+        return False
+    return parse_duration(error.response.headers.get('Retry-After'))
+
+def iter_zoom_pages(path, items_key, params=None):
+    """
+    Pages through a Zoom API list endpoint using next_page_token.
+    
+    Parameters:
+        path (str): The API path, e.g. '/users'.
+        items_key (str): The response key holding the page's items, e.g. 'users'.
+        params (dict, optional): Query parameters for every page.
+    
+    Yields:
+        dict: Each item across all pages.
+    
+    Raises:
+        requests.exceptions.HTTPError: If a page cannot be fetched.
+    """
+    def fetch_page():
+        response = http_utils.request('GET', f"{ZOOM_API_BASE_URL}{path}", headers=get_zoom_headers(), params=params)
+        response.raise_for_status()
+        return response.json()
+
+    params = dict(params or {})
+    while True:
+        page = rate_limiter.call('zoom', 'medium', _zoom_retry_after, fetch_page)
+        yield from page.get(items_key, [])
+        next_page_token = page.get('next_page_token')
+        if not next_page_token:
+            break
+        params['next_page_token'] = next_page_token
+
+def list_users():
+    """
+    Yields:
+        dict: Every active user on the Zoom account.
+    """
+    return iter_zoom_pages('/users', 'users', {'status': 'active', 'page_size': 300})
+
+def get_meeting_recordings(meeting_uuid):
+    """
+    Fetches the current cloud recording files of one meeting.
+    
+    Parameters:
+        meeting_uuid (str): The Zoom meeting UUID.
+    
+    Returns:
+        dict: The meeting, with its 'recording_files'.
+    
+    Raises:
+        requests.exceptions.HTTPError: If the recordings cannot be fetched.
+    """
+    # UUIDs that start with '/' or contain '//' must be encoded twice
+    encoded_uuid = quote(meeting_uuid, safe='')
+    if meeting_uuid.startswith('/') or '//' in meeting_uuid:
+        encoded_uuid = quote(encoded_uuid, safe='')
+
+    def fetch():
+        response = http_utils.request('GET', f"{ZOOM_API_BASE_URL}/meetings/{encoded_uuid}/recordings", headers=get_zoom_headers())
+        response.raise_for_status()
+        return response.json()
+
+    return rate_limiter.call('zoom', 'light', _zoom_retry_after, fetch)
+
+def list_recordings(user_id, from_date, to_date):
+    """
+    Lists a user's cloud recordings in a date window. Zoom allows at most one month per request.
+    
+    Parameters:
+        user_id (str): The Zoom user ID or 'me'.
+        from_date (str): The window start, as YYYY-MM-DD.
+        to_date (str): The window end, as YYYY-MM-DD.
+    
+    Yields:
+        dict: Each meeting, with its 'recording_files'.
+    """
+    return iter_zoom_pages(
+        f"/users/{user_id}/recordings",
+        'meetings',
+        {'from': from_date, 'to': to_date, 'page_size': 300}
+    )
+
+# Webhook requests older (or newer) than this many seconds are rejected as replays
+ZOOM_WEBHOOK_MAX_AGE_SECONDS = int(os.getenv('ZOOM_WEBHOOK_MAX_AGE_SECONDS', '300'))
+
 def validate_zoom_webhook(signing_secret, signature, timestamp, payload):
     """
     Validates Zoom webhook signatures to ensure authenticity.
+    Stale timestamps are rejected before any hashing, and the signature is computed
+    over the raw request bytes exactly as Zoom sent them.
     
     Parameters:
         signing_secret (str): The webhook secret token from Zoom.
         signature (str): The signature from the 'x-zm-signature' header.
         timestamp (str): The timestamp from the 'x-zm-request-timestamp' header.
-        payload (str): The raw request body as a JSON string.
+        payload (bytes): The raw request body.
     
     Returns:
         bool: True if the signature is valid, False otherwise.
     """
     try:
+        # Reject replays before doing any work on the body
+        request_time = int(timestamp)
+        if request_time > 10 ** 12:  # Milliseconds
+            request_time //= 1000
+        if abs(time.time() - request_time) > ZOOM_WEBHOOK_MAX_AGE_SECONDS:
+            logger.warning("Zoom webhook timestamp is outside the allowed window.")
+            return False
+
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
         # Construct the message as per Zoom's specifications
-        message = f"v0:{timestamp}:{payload}"
+        message = b"v0:" + timestamp.encode('utf-8') + b":" + payload
         # Create HMAC SHA256 hash using the signing secret
         hash_digest = hmac.new(
             signing_secret.encode('utf-8'),
-            message.encode('utf-8'),
+            message,
             hashlib.sha256
         ).hexdigest()
         # Prepend 'v0=' to the hash to form the expected signature
         expected_signature = f"v0={hash_digest}"
         # Compare the expected signature with the received signature
-        is_valid = hmac.compare_digest(expected_signature, signature)
+        is_valid = hmac.compare_digest(expected_signature.encode('utf-8'), signature.encode('utf-8'))
         if is_valid:
             logger.info("Zoom webhook signature validated successfully.")
         else:
             logger.warning("Zoom webhook signature validation failed.")
         return is_valid
+    except ValueError:
+        logger.warning(f"Invalid Zoom webhook timestamp: {timestamp!r}")
+        return False
     except Exception as e:
         logger.exception(f"Error during Zoom webhook validation: {e}")
         return False
 
+def build_url_validation_response(signing_secret, plain_token):
+    """
+    Builds the response to Zoom's endpoint.url_validation challenge.
+    
+    Parameters:
+        signing_secret (str): The webhook secret token from Zoom.
+        plain_token (str): The 'plainToken' from the challenge payload.
+    
+    Returns:
+        dict: The 'plainToken' and its HMAC SHA256 'encryptedToken'.
+    """
+    encrypted_token = hmac.new(
+        signing_secret.encode('utf-8'),
+        plain_token.encode('utf-8'),
+        hashlib.sha256
+    ).hexdigest()
+    return {"plainToken": plain_token, "encryptedToken": encrypted_token}
+
 def is_valid_download_url(download_url):
     """
     Validates the structure of the download URL.
@@ -138,19 +378,310 @@ def is_valid_download_url(download_url):
         logger.exception(f"Error parsing download URL '{download_url}': {e}")
         return False
 
-@retry(
-    wait=wait_exponential(multiplier=1, min=4, max=10),
-    stop=stop_after_attempt(3),
-    retry=retry_if_exception_type(requests.exceptions.RequestException)
-)
-def download_recording(download_url, download_token):
+# Recording file types whose audio Whisper can transcribe
+TRANSCRIBABLE_FILE_TYPES = ('M4A', 'MP4')
+
+def prefer_smallest_audio(recording_file):
+    """
+    Ranks a recording file by how cheap it is to transcribe.
+    Audio-only files come first, then the smallest file within each group.
+    
+    Parameters:
+        recording_file (dict): An entry of the webhook's 'recording_files'.
+    
+    Returns:
+        tuple or None: A sort key (lower is better), or None if the file cannot be transcribed.
+    """
+    file_type = (recording_file.get('file_type') or '').upper()
+    if file_type not in TRANSCRIBABLE_FILE_TYPES or not recording_file.get('download_url'):
+        return None
+    if recording_file.get('status', 'completed') != 'completed':
+        return None
+    audio_only = file_type == 'M4A' or recording_file.get('recording_type') == 'audio_only'
+    file_size = recording_file.get('file_size') or float('inf')
+    return (0 if audio_only else 1, file_size)
+
+def select_recording_file(recording_files, strategy=prefer_smallest_audio):
+    """
+    Selects the recording file to transcribe.
+    
+    Parameters:
+        recording_files (list of dict): The webhook's 'recording_files' entries.
+        strategy (callable): Maps a recording file to a sort key, or None to exclude it.
+    
+    Returns:
+        dict or None: The best recording file, or None if none can be transcribed.
+    """
+    candidates = []
+    for index, recording_file in enumerate(recording_files):
+        rank = strategy(recording_file)
+        if rank is not None:
+            candidates.append((rank, index, recording_file))
+    if not candidates:
+        return None
+    _, _, selected = min(candidates, key=lambda candidate: candidate[:2])
+    logger.info(f"Selected {selected.get('file_type')} recording file ({selected.get('recording_type')}, {selected.get('file_size')} bytes).")
+    return selected
+
+# Zoom cloud transcript files, in order of preference: the audio transcript, then closed captions
+TRANSCRIPT_FILE_TYPES = ('TRANSCRIPT', 'CC')
+
+def is_transcript_file(recording_file):
+    """
+    Returns:
+        bool: True if the recording file is a Zoom transcript or closed caption VTT.
+    """
+    return (recording_file.get('file_type') or '').upper() in TRANSCRIPT_FILE_TYPES
+
+def prefer_zoom_transcript(recording_file):
+    """
+    Ranks a recording file by how cheap it is to turn into a transcript. Zoom's own
+    transcript files come first, since they need no transcription at all, then audio
+    as ranked by prefer_smallest_audio.
+    
+    Parameters:
+        recording_file (dict): An entry of the webhook's 'recording_files'.
+    
+    Returns:
+        tuple or None: A sort key (lower is better), or None if the file cannot be used.
+    """
+    if is_transcript_file(recording_file):
+        if not recording_file.get('download_url') or recording_file.get('status', 'completed') != 'completed':
+            return None
+        return (0, TRANSCRIPT_FILE_TYPES.index(recording_file['file_type'].upper()))
+    rank = prefer_smallest_audio(recording_file)
+    return None if rank is None else (1, *rank)
+
+def select_recording_segments(recording_files, strategy=prefer_zoom_transcript):
+    """
+    Selects one file to transcribe for every segment of a meeting, preferring Zoom's
+    own transcript. A host who pauses and resumes a recording produces several
+    segments, which Zoom sends as files with different 'recording_start' values.
+    
+    Parameters:
+        recording_files (list of dict): The webhook's 'recording_files' entries.
+        strategy (callable): Maps a recording file to a sort key, or None to exclude it.
+    
+    Returns:
+        list of dict: The best file of each segment, in 'recording_start' order.
+    """
+    segments = {}
+    for recording_file in recording_files:
+        segments.setdefault(recording_file.get('recording_start') or '', []).append(recording_file)
+    selected = []
+    for recording_start in sorted(segments):
+        recording_file = select_recording_file(segments[recording_start], strategy)
+        if recording_file:
+            selected.append(recording_file)
+    if len(selected) > 1:
+        logger.info(f"Selected {len(selected)} recording segments.")
+    return selected
+
+# Recording file extensions accepted for download
+SUPPORTED_EXTENSIONS = ['mp4', 'm4a', 'mov']
+# Streamed recordings stay in memory up to this size before spilling to disk
+RECORDING_SPOOL_MAX_BYTES = int(os.getenv('RECORDING_SPOOL_MAX_BYTES', str(24 * 1024 * 1024)))
+# Ranged downloads: bytes per range, parallel connections and attempts per range
+DOWNLOAD_RANGE_BYTES = int(os.getenv('DOWNLOAD_RANGE_BYTES', str(16 * 1024 * 1024)))
+DOWNLOAD_MAX_WORKERS = int(os.getenv('DOWNLOAD_MAX_WORKERS', '4'))
+DOWNLOAD_MAX_ATTEMPTS = int(os.getenv('DOWNLOAD_MAX_ATTEMPTS', '3'))
+
+def resolve_file_extension(download_url, file_extension=None):
+    """
+    Determines and validates the extension to store a recording under.
+    
+    Parameters:
+        download_url (str): The URL the recording is downloaded from.
+        file_extension (str, optional): The extension from the recording's file type.
+    
+    Returns:
+        str or None: The lowercase extension, or None if it is not supported.
+    """
+    # Safely determine the file extension from the URL
+    if not file_extension:
+        parsed_url = urlparse(download_url)
+        path = parsed_url.path  # e.g., /path/to/file.mp4
+        _, file_extension = os.path.splitext(path)
+        file_extension = file_extension.lstrip('.')  # Remove the leading dot
+    
+    # Fallback to a default extension if none found
+    if not file_extension:
+        file_extension = 'mp4'  # Default to mp4 or another appropriate format
+    
+    # Validate file extension against supported types
+    if file_extension.lower() not in SUPPORTED_EXTENSIONS:
+        logger.warning(f"Unsupported file extension: .{file_extension}. Supported extensions are: {SUPPORTED_EXTENSIONS}.")
+        return None
+    return file_extension.lower()
+
+class RecordingBuffer:
+    """
+    Holds a downloaded recording in memory and spills it to a scratch file once
+    it grows past max_memory_bytes. The SHA-256 of the content is
+    computed while it is written.
+    """
+
+    def __init__(self, file_extension, max_memory_bytes=RECORDING_SPOOL_MAX_BYTES):
+        self.file_extension = file_extension
+        self.max_memory_bytes = max_memory_bytes
+        self.size = 0
+        self.path = None
+        self._hash = hashlib.sha256()
+        self._file = io.BytesIO()
+
+    @property
+    def filename(self):
+        """The file name to upload the recording under."""
+        return f"recording.{self.file_extension}"
+
+    @property
+    def sha256(self):
+        """The hex SHA-256 digest of the bytes written so far."""
+        return self._hash.hexdigest()
+
+    def write(self, chunk):
+        self._hash.update(chunk)
+        self.size += len(chunk)
+        self._file.write(chunk)
+        if self.path is None and self.size > self.max_memory_bytes:
+            self.rollover()
+
+    def rollover(self):
+        """
+        Moves the buffered bytes to a scratch file.
+        """
+        if self.path is not None:
+            return
+        path = scratch_space.create(f".{self.file_extension}", expected_bytes=self.size)
+        temp_file = open(path, 'w+b')
+        temp_file.write(self._file.getbuffer())
+        temp_file.flush()
+        self._file.close()
+        self._file = temp_file
+        self.path = path
+        logger.info(f"Recording exceeded {self.max_memory_bytes} bytes; spilled to {self.path}")
+
+    def flush(self):
+        """
+        Flushes buffered writes so the spill file is complete on disk.
+        """
+        self._file.flush()
+
+    def open_for_read(self):
+        """
+        Returns:
+            file object: The underlying buffer, rewound to the start.
+        """
+        self._file.flush()
+        self._file.seek(0)
+        return self._file
+
+    def close(self):
+        """
+        Releases the buffer and deletes the spill file, if any.
+        """
+        self._file.close()
+        if self.path:
+            scratch_space.release(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class RangeNotSupportedError(Exception):
+    """Raised when the download server ignores HTTP Range requests."""
+
+def _fetch_range(download_url, headers, fd, byte_range):
+    """
+    Downloads the missing part of one byte range and writes it at its offset.
+    Progress is recorded in byte_range['written'] as chunks arrive, so a failed
+    attempt keeps everything written before the failure.
+    """
+    start = byte_range['start'] + byte_range['written']
+    end = byte_range['end']
+    if start > end:
+        return
+    range_headers = dict(headers, Range=f"bytes={start}-{end}")
+    with http_utils.request('GET', download_url, headers=range_headers, stream=True, timeout=30) as response:
+        response.raise_for_status()
+        if response.status_code != 206:
+            raise RangeNotSupportedError(f"Expected 206 Partial Content, got {response.status_code}.")
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            if not chunk:  # Filter out keep-alive chunks
+                continue
+            chunk = chunk[:end + 1 - start]
+            os.pwrite(fd, chunk, start)
+            start += len(chunk)
+            byte_range['written'] += len(chunk)
+            if start > end:
+                break
+
+def _download_recording_ranges(download_url, headers, file_extension, file_size):
+    """
+    Downloads a recording as parallel byte ranges into a preallocated scratch file.
+    Failed ranges are retried from the last byte written, up to DOWNLOAD_MAX_ATTEMPTS times.
+    
+    Returns:
+        str or None: The path to the downloaded file, or None if it could not be completed.
+    
+    Raises:
+        RangeNotSupportedError: If the server does not honour Range requests.
+    """
+    ranges = [
+        {'start': start, 'end': min(start + DOWNLOAD_RANGE_BYTES, file_size) - 1, 'written': 0}
+        for start in range(0, file_size, DOWNLOAD_RANGE_BYTES)
+    ]
+    temp_file = open(scratch_space.create(f".{file_extension}", expected_bytes=file_size), 'r+b')
+    temp_file.truncate(file_size)
+    completed = False
+    try:
+        for attempt in range(1, DOWNLOAD_MAX_ATTEMPTS + 1):
+            pending = [r for r in ranges if r['start'] + r['written'] <= r['end']]
+            if not pending:
+                break
+            if attempt > 1:
+                metrics.RETRIES.labels('zoom_range_download').inc()
+                missing = sum(r['end'] + 1 - r['start'] - r['written'] for r in pending)
+                logger.warning(f"Retrying {len(pending)} incomplete range(s), {missing} bytes missing (attempt {attempt}).")
+                time.sleep(min(4 * 2 ** (attempt - 2), 10))
+            with ThreadPoolExecutor(max_workers=min(DOWNLOAD_MAX_WORKERS, len(pending))) as executor:
+                futures = [
+                    executor.submit(_fetch_range, download_url, headers, temp_file.fileno(), byte_range)
+                    for byte_range in pending
+                ]
+                for future in futures:
+                    try:
+                        future.result()
+                    except requests.exceptions.RequestException as req_err:
+                        logger.error(f"Network error occurred while downloading a recording range: {req_err}")
+
+        downloaded = sum(r['written'] for r in ranges)
+        if downloaded != file_size or os.fstat(temp_file.fileno()).st_size != file_size:
+            logger.error(f"Downloaded {downloaded} of {file_size} bytes after {DOWNLOAD_MAX_ATTEMPTS} attempts.")
+            return None
+        completed = True
+        logger.info(f"Downloaded recording to {temp_file.name} in {len(ranges)} ranges ({file_size} bytes verified).")
+        return temp_file.name
+    finally:
+        temp_file.close()
+        if not completed:
+            scratch_space.release(temp_file.name)
+
+def download_recording(download_url, download_token, file_extension=None, file_size=None):
     """
     Downloads a recording from the provided download URL using the download token.
-    Implements retry logic for transient network issues.
+    When the expected file size is known, the recording is fetched as parallel HTTP
+    byte ranges over pooled connections, retries resume only the missing bytes and
+    the result is checked against the expected size.
     
     Parameters:
         download_url (str): The URL to download the recording from.
         download_token (str): The token required for authorization.
+        file_extension (str, optional): The file extension to use, e.g. from the file type.
+            Defaults to the extension in the URL.
+        file_size (int, optional): The expected size in bytes, from the recording's 'file_size'.
     
     Returns:
         str: The path to the downloaded recording file, or None if download fails.
@@ -159,42 +690,200 @@ def download_recording(download_url, download_token):
         logger.error(f"Invalid download URL: {download_url}")
         return None
 
+    file_extension = resolve_file_extension(download_url, file_extension)
+    if not file_extension:
+        return None
+
+    if file_size and file_size > DOWNLOAD_RANGE_BYTES:
+        headers = {
+            "Authorization": f"Bearer {download_token}"
+        }
+        try:
+            return _download_recording_ranges(download_url, headers, file_extension, file_size)
+        except RangeNotSupportedError as e:
+            logger.warning(f"Range requests not supported ({e}); downloading the recording in one stream.")
+        except Exception as e:
+            logger.exception(f"Unexpected error downloading recording: {e}")
+            return None
+
+    file_path = _download_recording_whole(download_url, download_token, file_extension, file_size)
+    if file_path and file_size and os.path.getsize(file_path) != file_size:
+        logger.error(f"Downloaded {os.path.getsize(file_path)} bytes but expected {file_size}.")
+        scratch_space.release(file_path)
+        return None
+    return file_path
+
+@retry(
+    wait=wait_exponential(multiplier=1, min=4, max=10),
+    stop=stop_after_attempt(3),
+    retry=retry_if_exception_type(requests.exceptions.RequestException),
+    before_sleep=metrics.record_retry('zoom_download')
+)
+def _download_recording_whole(download_url, download_token, file_extension, file_size=None):
+    """
+    Downloads a recording in a single stream. Implements retry logic for transient network issues.
+    
+    Returns:
+        str: The path to the downloaded recording file, or None if download fails.
+    """
+    file_path = None
     try:
         headers = {
             "Authorization": f"Bearer {download_token}",
             "Content-Type": "application/json"
         }
-        response = requests.get(download_url, headers=headers, stream=True, timeout=30)
+        response = http_utils.request('GET', download_url, headers=headers, stream=True, timeout=30)
         response.raise_for_status()
         
-        # Safely determine the file extension from the URL
-        parsed_url = urlparse(download_url)
-        path = parsed_url.path  # e.g., /path/to/file.mp4
-        _, file_extension = os.path.splitext(path)
-        file_extension = file_extension.lstrip('.')  # Remove the leading dot
-        
-        # Fallback to a default extension if none found
-        if not file_extension:
-            file_extension = 'mp4'  # Default to mp4 or another appropriate format
-        
-        # Validate file extension against supported types
-        supported_extensions = ['mp4', 'm4a', 'mov']
-        if file_extension.lower() not in supported_extensions:
-            logger.warning(f"Unsupported file extension: .{file_extension}. Supported extensions are: {supported_extensions}.")
-            return None
-        
-        # Create a temporary file with the correct extension
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=f".{file_extension}")
-        with open(temp_file.name, 'wb') as f:
+        # Create a scratch file with the correct extension
+        file_path = scratch_space.create(f".{file_extension}", expected_bytes=file_size or 0)
+        with open(file_path, 'wb') as f:
             for chunk in response.iter_content(chunk_size=8192):
                 if chunk:  # Filter out keep-alive chunks
                     f.write(chunk)
         
-        logger.info(f"Downloaded recording to {temp_file.name}")
-        return temp_file.name
+        logger.info(f"Downloaded recording to {file_path}")
+        return file_path
     except requests.exceptions.RequestException as req_err:
+        if file_path:
+            scratch_space.release(file_path)
         logger.error(f"Network error occurred while downloading recording: {req_err}")
         raise  # Trigger retry
     except Exception as e:
+        if file_path:
+            scratch_space.release(file_path)
         logger.exception(f"Unexpected error downloading recording: {e}")
         return None
+
+@retry(
+    wait=wait_exponential(multiplier=1, min=4, max=10),
+    stop=stop_after_attempt(3),
+    retry=retry_if_exception_type(requests.exceptions.RequestException),
+    before_sleep=metrics.record_retry('zoom_download')
+)
+def stream_recording(download_url, download_token, file_extension=None, max_memory_bytes=RECORDING_SPOOL_MAX_BYTES):
+    """
+    Downloads a recording into a RecordingBuffer, keeping small recordings in memory
+    and hashing the content as it arrives. Implements retry logic for transient network issues.
+    
+    Parameters:
+        download_url (str): The URL to download the recording from.
+        download_token (str): The token required for authorization.
+        file_extension (str, optional): The file extension to use, e.g. from the file type.
+        max_memory_bytes (int): The size above which the recording spills to disk.
+    
+    Returns:
+        RecordingBuffer: The downloaded recording, or None if download fails. The caller must close it.
+    """
+    if not is_valid_download_url(download_url):
+        logger.error(f"Invalid download URL: {download_url}")
+        return None
+
+    file_extension = resolve_file_extension(download_url, file_extension)
+    if not file_extension:
+        return None
+
+    buffer = RecordingBuffer(file_extension, max_memory_bytes=max_memory_bytes)
+    try:
+        headers = {
+            "Authorization": f"Bearer {download_token}"
+        }
+        with http_utils.request('GET', download_url, headers=headers, stream=True, timeout=30) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                if chunk:  # Filter out keep-alive chunks
+                    buffer.write(chunk)
+        buffer.flush()
+        
+        location = buffer.path or "memory"
+        logger.info(f"Streamed {buffer.size} byte recording to {location} (sha256 {buffer.sha256}).")
+        return buffer
+    except requests.exceptions.RequestException as req_err:
+        buffer.close()
+        logger.error(f"Network error occurred while streaming recording: {req_err}")
+        raise  # Trigger retry
+    except Exception as e:
+        buffer.close()
+        logger.exception(f"Unexpected error streaming recording: {e}")
+        return None
+
+@retry(
+    wait=wait_exponential(multiplier=1, min=4, max=10),
+    stop=stop_after_attempt(3),
+    retry=retry_if_exception_type(requests.exceptions.RequestException),
+    before_sleep=metrics.record_retry('zoom_transcript_download')
+)
+def download_transcript(download_url, download_token):
+    """
+    Downloads a Zoom transcript or closed caption file. Implements retry logic for transient network issues.
+    
+    Parameters:
+        download_url (str): The URL to download the VTT file from.
+        download_token (str): The token required for authorization.
+    
+    Returns:
+        str: The VTT text, or None if download fails.
+    """
+    if not is_valid_download_url(download_url):
+        logger.error(f"Invalid download URL: {download_url}")
+        return None
+    try:
+        headers = {
+            "Authorization": f"Bearer {download_token}"
+        }
+        response = http_utils.request('GET', download_url, headers=headers, timeout=30)
+        response.raise_for_status()
+        response.encoding = 'utf-8'
+        logger.info(f"Downloaded {len(response.content)} byte Zoom transcript.")
+        return response.text
+    except requests.exceptions.RequestException as req_err:
+        logger.error(f"Network error occurred while downloading transcript: {req_err}")
+        raise  # Trigger retry
+    except Exception as e:
+        logger.exception(f"Unexpected error downloading transcript: {e}")
+        return None
+
+_VTT_TIMING = re.compile(r'((?:\d+:)?\d{1,2}:\d{2}[.,]\d{3})\s*-->\s*((?:\d+:)?\d{1,2}:\d{2}[.,]\d{3})')
+_VTT_VOICE = re.compile(r'<v(?:\.[^\s>]*)?\s+([^>]+)>')
+_VTT_TAG = re.compile(r'</?[^>]+>')
+# Zoom writes the speaker at the start of each cue, as 'Name: text'
+_VTT_SPEAKER = re.compile(r'^([^:\n]{1,80}):\s+(.+)$', re.DOTALL)
+
+def _vtt_seconds(timestamp):
+    parts = timestamp.replace(',', '.').split(':')
+    hours = int(parts[-3]) if len(parts) > 2 else 0
+    return hours * 3600 + int(parts[-2]) * 60 + float(parts[-1])
+
+def parse_vtt(text):
+    """
+    Parses a Zoom transcript or closed caption VTT file into transcript segments.
+    
+    Parameters:
+        text (str): The VTT content.
+    
+    Returns:
+        list of dict: Segments with 'start' and 'end' (seconds) and 'text', and
+            'speaker' where the cue names one.
+    """
+    segments = []
+    for block in re.split(r'\n\s*\n', text.replace('\r\n', '\n').strip()):
+        lines = [line.strip() for line in block.split('\n')]
+        timing_index = next((index for index, line in enumerate(lines) if _VTT_TIMING.search(line)), None)
+        if timing_index is None:
+            continue  # The WEBVTT header, NOTE and STYLE blocks
+        timing = _VTT_TIMING.search(lines[timing_index])
+        cue = ' '.join(line for line in lines[timing_index + 1:] if line)
+        voice = _VTT_VOICE.search(cue)
+        cue = _VTT_TAG.sub('', cue).strip()
+        if not cue:
+            continue
+        segment = {'start': _vtt_seconds(timing.group(1)), 'end': _vtt_seconds(timing.group(2)), 'text': cue}
+        if voice:
+            segment['speaker'] = voice.group(1).strip()
+        else:
+            speaker = _VTT_SPEAKER.match(cue)
+            if speaker:
+                segment['speaker'] = speaker.group(1).strip()
+                segment['text'] = speaker.group(2).strip()
+        segments.append(segment)
+    return segments